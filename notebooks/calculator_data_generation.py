@@ -106,10 +106,10 @@ matrix_templates = {
     ]
 }
 
-def generate_basic_sample(op: str) -> Dict[str, str]:
-    a = random.randint(1, 100)
-    b = random.randint(1, 100)
-    prompt_template = random.choice(basic_templates[op])
+def generate_basic_sample(op: str, rng=random) -> Dict[str, str]:
+    a = rng.randint(1, 100)
+    b = rng.randint(1, 100)
+    prompt_template = rng.choice(basic_templates[op])
 
     if op == "sqrt":
         prompt = prompt_template.format(a=a)
@@ -138,18 +138,18 @@ def generate_basic_sample(op: str) -> Dict[str, str]:
 </calc>""".strip()
     return {"prompt": prompt, "output": xml}
 
-def generate_matrix(rows=2, cols=2) -> List[List[int]]:
-    return [[random.randint(1, 9) for _ in range(cols)] for _ in range(rows)]
+def generate_matrix(rows=2, cols=2, rng=random) -> List[List[int]]:
+    return [[rng.randint(1, 9) for _ in range(cols)] for _ in range(rows)]
 
 def matrix_to_xml(matrix: List[List[int]]) -> str:
     return "\n".join(f"<row>{' '.join(map(str, row))}</row>" for row in matrix)
 
-def generate_matrix_sample(op: str) -> Dict[str, str]:
-    m1 = generate_matrix()
-    m2 = generate_matrix()
+def generate_matrix_sample(op: str, rng=random) -> Dict[str, str]:
+    m1 = generate_matrix(rng=rng)
+    m2 = generate_matrix(rng=rng)
     m1_str = f"{m1}"
     m2_str = f"{m2}"
-    prompt_template = random.choice(matrix_templates[op])
+    prompt_template = rng.choice(matrix_templates[op])
     prompt = prompt_template.format(m1=m1_str, m2=m2_str)
 
     xml = f"""
@@ -170,21 +170,13 @@ def generate_matrix_sample(op: str) -> Dict[str, str]:
 
     return {"prompt": prompt, "output": xml}
 
-def generate_dataset(n_samples=NUM_SAMPLES) -> List[Dict[str, str]]:
-    dataset = []
+def generate_sample(rng=random) -> Dict[str, str]:
+    if rng.random() < 0.85:  # 85% basic, 15% matrix
+        return generate_basic_sample(rng.choice(list(basic_templates.keys())), rng)
+    return generate_matrix_sample(rng.choice(list(matrix_templates.keys())), rng)
 
-    ops_basic = list(basic_templates.keys())
-    ops_matrix = list(matrix_templates.keys())
-
-    for _ in range(n_samples):
-        if random.random() < 0.85:  # 85% basic, 15% matrix
-            op = random.choice(ops_basic)
-            dataset.append(generate_basic_sample(op))
-        else:
-            op = random.choice(ops_matrix)
-            dataset.append(generate_matrix_sample(op))
-
-    return dataset
+def generate_dataset(n_samples=NUM_SAMPLES, rng=random) -> List[Dict[str, str]]:
+    return [generate_sample(rng) for _ in range(n_samples)]
 
 def save_to_csv(data: List[Dict[str, str]], filename: str):
     with open(filename, "w", newline="", encoding="utf-8") as csvfile:
@@ -1,12 +1,20 @@
 from .agent_stream import Agent
-from .tool_registry import TOOL_REG
+from .tool_registry import TOOL_REG, register_tool
 from .temp_control import TemperatureController
 from .json_utils import ToolCall, find_calls
+from .events import Event, TextDelta, ToolCallEvent, ToolResult, Final, Transcript
 
 __all__ = [
     "Agent",
     "TOOL_REG",
+    "register_tool",
     "TemperatureController",
     "ToolCall",
-    "find_calls"
+    "find_calls",
+    "Event",
+    "TextDelta",
+    "ToolCallEvent",
+    "ToolResult",
+    "Final",
+    "Transcript",
 ]
\ No newline at end of file
@@ -1,13 +1,71 @@
 # Revised Agent implementation (v2): ensures model is instructed to emit proper tool-call JSON
 
-import json, re
-from typing import Dict, Any, Generator, List
+import contextlib, json, re, logging, time
+from typing import Dict, Any, AsyncGenerator, Generator, List, NamedTuple, Optional, Tuple, Union
 
 # ── local imports ────────────────────────────────────────────────────────────
 from ..runner.slm_runner       import SLMRunner
-from ..agentic.tool_registry   import TOOL_REG, TOOL_SCHEMAS
+from ..runner.exceptions       import GenerationError, ErrorCode
+from ..agentic.tool_registry   import TOOL_REG, TOOL_SCHEMAS, call_tool, acall_tool
 from ..agentic.json_utils      import ToolCall, find_calls
 from ..agentic.temp_control    import TemperatureController
+from ..agentic.events          import Event, Final, TextDelta, ToolCallEvent, ToolResult, Transcript
+from ..utils.executors         import get_inference_executor, run_in_executor
+from ..utils.tracing           import span
+
+logger = logging.getLogger(__name__)
+
+
+class _Turn:
+    """Builds the events of one ``chat`` turn and keeps its ``Transcript``."""
+    __slots__ = ("agent", "transcript", "t0", "usage0")
+
+    def __init__(self, agent: "Agent"):
+        self.agent = agent
+        self.transcript = Transcript()
+        self.t0 = time.perf_counter()
+        self.usage0 = dict(agent.usage)
+
+    def text(self, text: str, step: int, tokens: int, start: float) -> TextDelta:
+        return self.transcript.add(TextDelta(text, step, tokens, time.perf_counter() - start, start - self.t0))
+
+    def calls(self, calls: List[ToolCall], step: int, starts: List[int]) -> List[ToolCallEvent]:
+        """One event per call, each with the tokens of its own JSON (``starts`` up to its ``end``)."""
+        events, prev = [], 0
+        for call in calls:
+            tokens = sum(1 for st in starts if prev <= st < call.end)
+            events.append(self.transcript.add(ToolCallEvent(call.name, call.args, call.raw, step, tokens,
+                                                            time.perf_counter() - self.t0)))
+            prev = call.end
+        return events
+
+    def result(self, name: str, output: str, ok: bool, step: int, start: float) -> ToolResult:
+        return self.transcript.add(ToolResult(name, output, ok, step, time.perf_counter() - start,
+                                              start - self.t0))
+
+    def final(self, steps: int, stopped: str) -> Final:
+        usage = {k: v - self.usage0.get(k, 0) for k, v in self.agent.usage.items()}
+        return self.transcript.add(Final(self.transcript.text, steps, usage, stopped,
+                                         time.perf_counter() - self.t0))
+
+
+# ── step requests ────────────────────────────────────────────────────────────
+# What ``Agent._steps`` asks its driver (``chat`` or ``achat``) to do.
+class _Feed(NamedTuple):
+    text: str           # append to the session (``Agent._feed``)
+
+
+class _Generate(NamedTuple):
+    tool: bool          # one pass; at tool temperature to finish a call's JSON
+
+
+class _Keep(NamedTuple):
+    n_chars: int        # ``session.keep_generated``
+
+
+class _Tool(NamedTuple):
+    call: ToolCall      # run the tool; the reply is (output, ok)
+
 
 class Agent:
     """Streaming tool-augmented chat agent (v2).
@@ -17,15 +75,27 @@ class Agent:
     • When no tool call is detected but the model *mentions* one (e.g. writes a pseudo-JSON block),
       we fall back to normal chat instead of hanging.
     • Otherwise identical to v1 (placeholder substitution, feedback injection, loop guard).
+
+    ``achat`` is the asyncio twin of ``chat``: generation runs on the shared
+    inference pool and tools are awaited, so one event loop can interleave
+    many sessions.  Pass ``runner=`` to share one loaded model between
+    per-session agents.
+
+    Both yield typed ``events`` instead of raw text; the tool-call JSON is
+    kept out of ``TextDelta`` and the turn ends with a ``Final`` holding the
+    aggregated answer.
     """
 
     # ── construction ──────────────────────────────────────────────────────────
-    def __init__(self, cfg):
-        self.runner   = SLMRunner(cfg)
+    def __init__(self, cfg, runner: Optional[SLMRunner] = None):
+        self.runner   = runner or SLMRunner(cfg)
         self._results : Dict[str, Any] = {}
         self._counter = 0
         self._last_calls : List[str] = []
         self._repeat_cap = 3
+        # decode accounting: tokens sampled vs. tokens thrown away per tool call
+        self.usage = {"generated_tokens": 0, "wasted_tokens": 0, "tool_calls": 0}
+        self.tool_call_waste : List[int] = []
 
     # ── helpers ──────────────────────────────────────────────────────────────
     def _stash(self, value: Any) -> str:
@@ -48,8 +118,8 @@ class Agent:
                 raise ValueError(f"'{key}' must be {typ.__name__} in {name}")
 
     # ── tool runner ──────────────────────────────────────────────────────────
-    def _run_tool(self, call: ToolCall) -> str:
-        # print("\n########CALL##########", call, "\n")
+    def _prepare_call(self, call: ToolCall) -> Union[Tuple[str, Dict[str, Any]], str]:
+        """Resolve $result refs and validate; returns (name, args) or an error string."""
         if call.name not in TOOL_REG:
             return f"[error: unknown tool {call.name}]"
 
@@ -61,125 +131,331 @@ class Agent:
             call_obj = json.loads(replaced_json)
             args     = call_obj.get("parameters") or call_obj.get("args") or {}
             self._validate_args(call.name, args)
-            val      = TOOL_REG[call.name](**args)
-            tag      = self._stash(val)
-            return f"[{call.name} → {val} | id {tag}]"
         except Exception as exc:
             return f"[{call.name} raised {exc}]"
+        return call.name, args
 
-    # ── generation helpers ───────────────────────────────────────────────────
-    def _generate(self, prompt: str, temperature: float) -> tuple[str, List[ToolCall]]:
-        buf = ""
-        stream = self.runner.generate(prompt, stream=True, temperature=temperature, max_tokens=2048)
-        for chunk in stream:
-            tk = chunk["choices"][0]["text"]
-            buf += tk
-            calls = find_calls(buf)
-            if calls:
-                return buf, calls
-        return buf, []
+    def _format_result(self, name: str, val: Any) -> str:
+        tag = self._stash(val)
+        return f"[{name} → {val} | id {tag}]"
 
-    # ── public chat API ──────────────────────────────────────────────────────
-    def chat(self, system: str, user: str) -> Generator[str, None, None]:
-        history: List[Dict[str, str]] = [
+    def _run_tool(self, call: ToolCall) -> Tuple[str, bool]:
+        """Run a call; returns the text fed back to the model and whether the tool succeeded."""
+        # print("\n########CALL##########", call, "\n")
+        prepared = self._prepare_call(call)
+        if isinstance(prepared, str):
+            return prepared, False
+        name, args = prepared
+        try:
+            with span(f"tool.{name}"):
+                result = call_tool(name, args)
+            return self._format_result(name, result), True
+        except Exception as exc:
+            return f"[{name} raised {exc}]", False
+
+    async def _arun_tool(self, call: ToolCall) -> Tuple[str, bool]:
+        prepared = self._prepare_call(call)
+        if isinstance(prepared, str):
+            return prepared, False
+        name, args = prepared
+        try:
+            with span(f"tool.{name}"):
+                result = await acall_tool(name, args)
+            return self._format_result(name, result), True
+        except Exception as exc:
+            return f"[{name} raised {exc}]", False
+
+    # ── history helpers ──────────────────────────────────────────────────────
+    @staticmethod
+    def _render(history: List[Dict[str, str]]) -> str:
+        return "\n".join(f"{m['role'].upper()}: {m['content']}" for m in history) + "\nASSISTANT:"
+
+    @staticmethod
+    def _render_prefix(system: str) -> str:
+        """Leading part of ``_render`` shared by every request with this system prompt."""
+        return f"SYSTEM: {system}\n"
+
+    @staticmethod
+    def _render_turns(msgs: List[Dict[str, str]]) -> str:
+        """Text appended after a tool step: tool results, an empty assistant turn, and the cue."""
+        turns = msgs + [{"role": "assistant", "content": ""}]
+        return "\n" + "\n".join(f"{m['role'].upper()}: {m['content']}" for m in turns) + "\nASSISTANT:"
+
+    @staticmethod
+    def _empty_args_warning(call: ToolCall) -> Optional[Dict[str, str]]:
+        if call.name != 'get_date' and call.args == {}:
+            logger.warning("skipping tool call %s with empty args", call.name)
+            return {"role": "assistant", "content": f"WARNING! You are calling [{call.name} with no args, please fix your JSON.]"}
+        return None
+
+    def _account(self, starts: List[int], kept: int) -> int:
+        """Record one pass; returns tokens decoded entirely past the ``kept`` text."""
+        wasted = sum(1 for st in starts if st >= kept)
+        self.usage["generated_tokens"] += len(starts)
+        self.usage["wasted_tokens"] += wasted
+        return wasted
+
+    def _record_tool_step(self, calls: List[ToolCall], wasted: int) -> None:
+        self.usage["tool_calls"] += len(calls)
+        self.tool_call_waste.append(wasted)
+        logger.info("tool step %s: %d wasted tokens", [c.name for c in calls], wasted)
+
+    # ── session helpers ──────────────────────────────────────────────────────
+    def _feed(self, session, text: str):
+        """Append ``text`` to the session, falling back to full-prompt re-eval on overflow."""
+        with span("llm.prompt_eval", chars=len(text)) as sp:
+            try:
+                session.eval(text)
+                return session
+            except GenerationError as exc:
+                if not session.incremental or exc.code != ErrorCode.CONTEXT_LENGTH_EXCEEDED:
+                    raise
+                logger.warning("incremental session overflowed (%s); re-submitting full prompt", exc.context)
+                sp.set(fallback="full_prompt")
+                fallback = self.runner.open_session(incremental=False)
+                try:
+                    fallback.eval(session.text + text)
+                except BaseException:
+                    fallback.close()
+                    raise
+                session.close()
+                return fallback
+
+    def _is_repeat(self, calls: List[ToolCall]) -> bool:
+        sig = "|".join(f"{c.name}:{json.dumps(c.args, sort_keys=True)}" for c in calls)
+        self._last_calls.append(sig)
+        self._last_calls = self._last_calls[-self._repeat_cap:]
+        if self._last_calls.count(sig) == self._repeat_cap:
+            logger.warning("aborting: identical tool call repeated %d times", self._repeat_cap)
+            return True
+        return False
+
+    # ── turn logic ───────────────────────────────────────────────────────────
+    def _steps(self, turn: _Turn, history: List[Dict[str, str]]) -> Generator[Any, Any, None]:
+        """The turn as a sequence of events and model/tool requests.
+
+        Events are passed on to the caller; requests (``_Feed``, ``_Generate``,
+        ``_Keep``, ``_Tool``) are carried out by ``chat`` (blocking) or
+        ``achat`` (awaited), which send the result back.
+        """
+        yield _Feed(self._render(history))
+        step = 0
+        while True:
+            step += 1
+            # one model pass (+ tool calls); includes the consumer's time between yields
+            with span("agent.step", step=step):
+                start = time.perf_counter()
+                buf, calls, starts = yield _Generate(tool=False)
+                if not calls:
+                    self._account(starts, len(buf))
+                    history.append({"role": "assistant", "content": buf.strip()})
+                    yield turn.text(buf, step, len(starts), start)
+                    yield turn.final(step, "done")
+                    return
+
+                buf = buf.split('{')[0]
+                wasted = self._account(starts, len(buf))
+                yield _Keep(len(buf))
+                if buf.strip():
+                    yield turn.text(buf, step, sum(1 for st in starts if st < len(buf)), start)
+
+                # Low-temp extension to finish JSON
+                buf2, calls, starts = yield _Generate(tool=True)
+                wasted += self._account(starts, len(buf2))
+                yield _Keep(len(buf2))
+                self._record_tool_step(calls, wasted)
+                full_json_chunk = buf + buf2
+                for event in turn.calls(calls, step, starts):
+                    yield event
+
+                tool_msgs:    List[Dict[str, str]] = []
+
+                for call in calls:
+                    logger.debug("processing tool call %s with args %s (raw %r)", call.name, call.args, call.raw)
+                    warning = self._empty_args_warning(call)
+                    if warning:
+                        tool_msgs.append(warning)
+                        yield turn.result(call.name, warning["content"], False, step, time.perf_counter())
+                        continue
+                    start = time.perf_counter()
+                    out, ok = yield _Tool(call)
+                    tool_msgs.append({"role": "assistant", "name": call.name, "content": out})
+                    yield turn.result(call.name, out, ok, step, start)
+
+                if self._is_repeat(calls):
+                    yield turn.final(step, "repeat")
+                    return
+
+                history.append({"role": "assistant", "content": full_json_chunk})
+                history.extend(tool_msgs)
+                history.append({"role": "assistant", "content": ""})
+                yield _Feed(self._render_turns(tool_msgs))
+
+    def _start(self, system: str, user: str) -> Tuple[_Turn, List[Dict[str, str]]]:
+        # The session keeps the transcript in the llama context: each step
+        # only evaluates what it appends (tool results, the next cue).  The
+        # system prompt's state is persisted across restarts by the runner.
+        self.runner.register_prefix(self._render_prefix(system))
+        return _Turn(self), [
             {"role": "system",  "content": system},
             {"role": "user",    "content": user},
         ]
-        i = 0
-        while True:
-            prompt = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in history) + "\nASSISTANT:"
-
-            buf, calls = self._generate(prompt, TemperatureController.for_chat(prompt))
-            if not calls:
-                history.append({"role": "assistant", "content": buf.strip()})
-                yield buf
-                return
-            
-            buf = buf.split('{')[0]
-
-            # Low-temp extension to finish JSON
-            brace_prompt = prompt + buf
-
-            # print("### START OF BUF ###")
-            # print(f"BUF {i}:\n\n", buf, "\n\n")
-
-            # print("### END OF BUF ###")
-
-            # print(f"PROMPT {i}:\n\n", prompt, "\n\n")
-            # i+=1
-
-            # print("### END OF BUF ###")
 
-            # print("### START OF BRACE PROMPT ###")
-            # print(f"BRACE PROMPT {i}:\n\n", brace_prompt, "\n\n")
-            # print("### END OF BRACE PROMPT ###")
+    @staticmethod
+    def _temperature(session, request: "_Generate") -> float:
+        return TemperatureController.for_tool() if request.tool else TemperatureController.for_chat(session.text)
+
+    def _serve(self, session, request) -> Tuple[Any, Any]:
+        """Carry out one ``_steps`` request; returns (reply, session)."""
+        if isinstance(request, _Feed):
+            return None, self._feed(session, request.text)
+        if isinstance(request, _Generate):
+            return self._generate(session, self._temperature(session, request)), session
+        if isinstance(request, _Keep):
+            session.keep_generated(request.n_chars)
+            return None, session
+        return self._run_tool(request.call), session
+
+    async def _aserve(self, session, request) -> Tuple[Any, Any]:
+        """``_serve`` without blocking the event loop."""
+        pool = get_inference_executor()
+        if isinstance(request, _Feed):
+            return None, await run_in_executor(pool, self._feed, session, request.text)
+        if isinstance(request, _Generate):
+            return await self._agenerate(session, self._temperature(session, request)), session
+        if isinstance(request, _Keep):
+            await run_in_executor(pool, session.keep_generated, request.n_chars)
+            return None, session
+        return await self._arun_tool(request.call), session
 
-            buf2, calls = self._generate(brace_prompt, TemperatureController.for_tool())
-            full_json_chunk = buf + buf2
-
-            # print("### START OF BUF2 ###")
-            # print(f"BUF2 {i}:\n\n", buf2, "\n\n")
-            # print(find_calls(buf2))
-            # print("### END OF BUF2 ###")
-
-
-            # print("BUF + BUF2:", buf, "\n\n", buf2)
-
-            yield buf
-            yield buf2
-
-            tool_outputs: List[str] = []
-            tool_msgs:    List[Dict[str, str]] = []
-            
-            for call in calls:
-                print(f"\n\nProcessing tool call: {call.name} with args {call.args}")
-                print(f"Raw call: {call.raw}")
-                if call.name != 'get_date' and call.args == {}:
-                    print(f"Skipping tool call {call.name} with empty args")
-                    tool_msgs.append({"role": "assistant", "content": f"WARNING! You are calling [{call.name} with no args, please fix your JSON.]"})
+    # ── public chat API ──────────────────────────────────────────────────────
+    def chat(self, system: str, user: str) -> Generator[Event, None, None]:
+        """Run one turn, yielding ``events`` (text, tool calls and results, then ``Final``)."""
+        turn, history = self._start(system, user)
+        steps = self._steps(turn, history)
+        session = self.runner.open_session()
+        try:
+            reply, error = None, None
+            while True:
+                try:
+                    request = steps.throw(error) if error else steps.send(reply)
+                except StopIteration:
+                    return
+                reply, error = None, None
+                if isinstance(request, Event):
+                    yield request
                     continue
-                out = self._run_tool(call)
-                tool_outputs.append(out)
-                tool_msgs.append({"role": "assistant", "name": call.name, "content": out})
-            yield "\n".join(tool_outputs)
-
-            sig = "|".join(f"{c.name}:{json.dumps(c.args, sort_keys=True)}" for c in calls)
-            self._last_calls.append(sig)
-            self._last_calls = self._last_calls[-self._repeat_cap:]
-            if self._last_calls.count(sig) == self._repeat_cap:
-                print("Aborting: identical tool call repeated", self._repeat_cap)
-                return
-
-            history.append({"role": "assistant", "content": full_json_chunk})
-            history.extend(tool_msgs)
-            history.append({"role": "assistant", "content": ""})
+                try:
+                    reply, session = self._serve(session, request)
+                except Exception as exc:
+                    error = exc  # raised inside the step, so its span records it
+        finally:
+            steps.close()
+            session.close()
+
+    async def achat(self, system: str, user: str) -> AsyncGenerator[Event, None]:
+        """Async ``chat``: same events, but never blocks the event loop.
+
+        Generation is pushed to the inference pool (serialised per runner by
+        ``runner.lock``) and tools are awaited, so while this session waits on
+        a tool another session can decode on the same model.  With the batch
+        scheduler enabled the session is decoded together with all others and
+        awaited directly, without holding a pool thread.
+        """
+        turn, history = self._start(system, user)
+        steps = self._steps(turn, history)
+        session = self.runner.open_session()
+        try:
+            reply, error = None, None
+            while True:
+                try:
+                    request = steps.throw(error) if error else steps.send(reply)
+                except StopIteration:
+                    return
+                reply, error = None, None
+                if isinstance(request, Event):
+                    yield request
+                    continue
+                try:
+                    reply, session = await self._aserve(session, request)
+                except Exception as exc:
+                    error = exc  # raised inside the step, so its span records it
+        finally:
+            steps.close()
+            session.close()
 
     # ── internal one-shot generator ───────────────────────────────
     def _generate(
-        self, prompt: str, temperature: float
-    ) -> tuple[str, List[ToolCall]]:
+        self, session, temperature: float
+    ) -> Tuple[str, List[ToolCall], List[int]]:
         """
-        One streaming pass.  
-        Returns (generated_text, detected_tool_calls)
+        One streaming pass from the end of ``session``.  
+        Returns (generated_text, detected_tool_calls, token_start_offsets)
+
+        Decoding stops at the token that closes the first complete tool call:
+        the stream is closed right there (nothing further is sampled) and the
+        text is cut at the closing brace; callers trim the session to match
+        with ``session.keep_generated``.
         """
-        buf = ""
-        stream = self.runner.generate(
-            prompt,
-            stream=True,
-            temperature=temperature,
-            max_tokens=2048,
-            stop=["USER"]
-        )
-
-        for chunk in stream:
-            tk = chunk["choices"][0]["text"]
-            buf += tk
-
-            # JSON fully closed?
-            calls = find_calls(buf)
-            if calls:
-                return buf, calls
-
-        return buf, []  # no tool call detected
+        # batched sessions are decoded by the scheduler's own loop, not on the shared context
+        lock = contextlib.nullcontext() if getattr(session, "batched", False) else self.runner.lock
+        with span("llm.decode", temperature=temperature) as sp:
+            waited = time.perf_counter()
+            with lock:
+                sp.set(lock_wait_ms=round((time.perf_counter() - waited) * 1e3, 2))
+                # pieces are joined only when a '}' may close a call, not once per token
+                pieces: List[str] = []
+                size = 0
+                starts: List[int] = []
+                stream = session.stream(
+                    temperature=temperature,
+                    max_tokens=2048,
+                    stop=["USER"]
+                )
+
+                try:
+                    for tk in stream:
+                        starts.append(size)
+                        pieces.append(tk)
+                        size += len(tk)
+
+                        # JSON fully closed?  Only a token carrying '}' can close it.
+                        if "}" not in tk:
+                            continue
+                        buf = "".join(pieces)
+                        calls = find_calls(buf)
+                        if calls:
+                            return buf[:calls[-1].end], calls, starts
+                finally:
+                    stream.close()
+                    sp.set(tokens=len(starts))
+
+                return "".join(pieces), [], starts  # no tool call detected
+
+    async def _agenerate(self, session, temperature: float) -> Tuple[str, List[ToolCall], List[int]]:
+        if not getattr(session, "batched", False):
+            return await run_in_executor(get_inference_executor(), self._generate, session, temperature)
+
+        # same pass as _generate, awaiting the batch scheduler
+        pieces: List[str] = []
+        size = 0
+        starts: List[int] = []
+        stream = session.astream(temperature=temperature, max_tokens=2048, stop=["USER"])
+        with span("llm.decode", temperature=temperature, batched=True) as sp:
+            try:
+                async for tk in stream:
+                    starts.append(size)
+                    pieces.append(tk)
+                    size += len(tk)
+                    if "}" not in tk:
+                        continue
+                    buf = "".join(pieces)
+                    calls = find_calls(buf)
+                    if calls:
+                        return buf[:calls[-1].end], calls, starts
+            finally:
+                await stream.aclose()
+                sp.set(tokens=len(starts))
+        return "".join(pieces), [], starts
 
 __all__ = ["Agent"]
\ No newline at end of file
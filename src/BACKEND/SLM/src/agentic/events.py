@@ -0,0 +1,136 @@
+"""Typed events yielded by ``Agent.chat`` / ``Agent.achat``.
+
+One turn yields, per step, a ``TextDelta`` (what the model said before a
+tool call), a ``ToolCallEvent`` per call and a ``ToolResult`` per call,
+then the answer's ``TextDelta`` and a closing ``Final``.  Tool-call JSON
+only ever appears in ``ToolCallEvent.raw``, so consumers that show text
+never see the markup.  ``at`` is the time since the turn started.
+
+``Transcript`` folds the events into the user-visible answer and a tool log
+(``to_response()`` is what ``ModelInterfacePhi4.infer`` returns); every
+event has ``to_dict()`` for SSE / JSON consumers.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+class Event:
+    __slots__ = ("at",)
+    kind = "event"
+
+    def to_dict(self) -> Dict[str, Any]:
+        fields = {"type": self.kind}
+        for cls in reversed(type(self).__mro__):
+            for name in getattr(cls, "__slots__", ()):
+                fields[name] = getattr(self, name)
+        return fields
+
+    def __repr__(self) -> str:
+        body = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items() if k != "type")
+        return f"{type(self).__name__}({body})"
+
+
+class TextDelta(Event):
+    """Model text meant for the user; ``tokens`` / ``seconds`` of the pass that produced it."""
+    __slots__ = ("text", "step", "tokens", "seconds")
+    kind = "text"
+
+    def __init__(self, text: str, step: int, tokens: int = 0, seconds: float = 0.0, at: float = 0.0):
+        self.text = text
+        self.step = step
+        self.tokens = tokens
+        self.seconds = seconds
+        self.at = at
+
+
+class ToolCallEvent(Event):
+    """A complete tool call parsed from the model output; ``raw`` is its JSON text."""
+    __slots__ = ("name", "args", "raw", "step", "tokens")
+    kind = "tool_call"
+
+    def __init__(self, name: str, args: Dict[str, Any], raw: str, step: int, tokens: int = 0, at: float = 0.0):
+        self.name = name
+        self.args = args
+        self.raw = raw
+        self.step = step
+        self.tokens = tokens
+        self.at = at
+
+
+class ToolResult(Event):
+    """Output of one tool call (``ok`` False for errors and skipped calls)."""
+    __slots__ = ("name", "output", "ok", "step", "seconds")
+    kind = "tool_result"
+
+    def __init__(self, name: str, output: str, ok: bool, step: int, seconds: float = 0.0, at: float = 0.0):
+        self.name = name
+        self.output = output
+        self.ok = ok
+        self.step = step
+        self.seconds = seconds
+        self.at = at
+
+
+class Final(Event):
+    """End of the turn: the aggregated answer, token usage and why it stopped ("done" / "repeat")."""
+    __slots__ = ("text", "steps", "usage", "stopped")
+    kind = "final"
+
+    def __init__(self, text: str, steps: int, usage: Dict[str, int], stopped: str = "done", at: float = 0.0):
+        self.text = text
+        self.steps = steps
+        self.usage = usage
+        self.stopped = stopped
+        self.at = at
+
+
+class Transcript:
+    """Accumulates the events of one turn."""
+    __slots__ = ("texts", "calls", "results", "final")
+
+    def __init__(self):
+        self.texts: List[TextDelta] = []
+        self.calls: List[ToolCallEvent] = []
+        self.results: List[ToolResult] = []
+        self.final: Optional[Final] = None
+
+    def add(self, event: Event) -> Event:
+        if isinstance(event, TextDelta):
+            self.texts.append(event)
+        elif isinstance(event, ToolCallEvent):
+            self.calls.append(event)
+        elif isinstance(event, ToolResult):
+            self.results.append(event)
+        elif isinstance(event, Final):
+            self.final = event
+        return event
+
+    @property
+    def text(self) -> str:
+        """User-visible answer: the text of every step, one paragraph per step."""
+        if self.final is not None:
+            return self.final.text
+        return "\n".join(t for t in (d.text.strip() for d in self.texts) if t)
+
+    def tools(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": c.name, "args": c.args, "output": r.output, "ok": r.ok, "seconds": round(r.seconds, 4)}
+            for c, r in zip(self.calls, self.results)
+        ]
+
+    def to_response(self) -> Dict[str, Any]:
+        response = {"response": self.text, "tools": self.tools()}
+        if self.final is not None:
+            response["usage"] = self.final.usage
+            response["steps"] = self.final.steps
+        return response
+
+
+__all__ = [
+    "Event",
+    "TextDelta",
+    "ToolCallEvent",
+    "ToolResult",
+    "Final",
+    "Transcript",
+]
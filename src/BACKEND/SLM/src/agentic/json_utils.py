@@ -8,6 +8,7 @@ class ToolCall:
     name: str
     args: Dict[str, Any]
     raw: str
+    end: int = -1  # offset just past the closing brace in the scanned text
 
 # Matches top-level {...} JSON objects lazily, even across lines
 JSON_RE = re.compile(r"\{.*?\}\}", re.DOTALL)
@@ -29,7 +30,7 @@ def find_calls(text):
         i += off
         if isinstance(obj, dict) and "name" in obj:
             args = obj.get("parameters") or obj.get("arguments") or {}
-            calls.append(ToolCall(name=obj["name"], args=args, raw=raw))
+            calls.append(ToolCall(name=obj["name"], args=args, raw=raw, end=i))
     return calls
 
 __all__ = ["ToolCall", "find_calls"]
\ No newline at end of file
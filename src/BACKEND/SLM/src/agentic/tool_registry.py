@@ -1,17 +1,29 @@
 import ast
+import asyncio
+import inspect
 import operator as op
 import io
-import requests
+import logging
+import threading
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable
 from contextlib import redirect_stdout, redirect_stderr
 
+from .weather import get_weather_provider
+from ..utils.executors import get_tool_executor, run_in_executor
+
 # safe math functions
 from math import (
     sin, cos, tan, log, exp, sqrt, floor, ceil,
     asin, acos, atan, degrees, radians, pi, e, pow
 )
 
+logger = logging.getLogger(__name__)
+
+# redirect_stdout/redirect_stderr swap the process-wide sys.stdout/sys.stderr,
+# so concurrent shell calls on the tool pool would capture each other's output
+_shell_lock = threading.Lock()
+
 class Tools:
     SAFE = {
         "sin": sin, "cos": cos, "tan": tan,
@@ -55,7 +67,7 @@ class Tools:
     # ── public API ────────────────────────────────────────────────
     @classmethod
     def calculator(cls, expression: str) -> float:
-        print(f"Calculating: {expression}")
+        logger.debug("calculating %s", expression)
         expr = expression.replace("^", "**")  # allow 2^3 style
         tree = ast.parse(expr, mode="eval").body
         return cls._eval_node(tree)
@@ -81,7 +93,7 @@ class Tools:
         stderr_buf = io.StringIO()
         local_vars: Dict[str, Any] = {}
         try:
-            with redirect_stdout(stdout_buf), redirect_stderr(stderr_buf):
+            with _shell_lock, redirect_stdout(stdout_buf), redirect_stderr(stderr_buf):
                 exec(code, {}, local_vars)
         except Exception as e:
             return f"Script error: {e}"
@@ -97,14 +109,7 @@ class Tools:
     @staticmethod
     def get_weather_details(location: str) -> Dict[str, Any]:
         try:
-            r = requests.get(f"https://wttr.in/{location}?format=j1", timeout=5)
-            r.raise_for_status()
-            cur = r.json()["current_condition"][0]
-            return {
-                "loc": location,
-                "temp_C": cur["temp_C"],
-                "weather": cur["weatherDesc"][0]["value"]
-            }
+            return get_weather_provider().fetch(location)
         except Exception as ex:
             return {"error": str(ex), "loc": location}
 
@@ -125,4 +130,33 @@ TOOL_SCHEMAS: Dict[str, Dict[str, type]] = {
     "get_weather_details": {"location": str},
 }
 
-__all__ = ["Tools", "TOOL_REG", "TOOL_SCHEMAS"]
\ No newline at end of file
+
+def register_tool(name: str, fn: Callable[..., Any], schema: Dict[str, type]) -> None:
+    """Expose ``fn`` to the agent as ``name``; ``schema`` lists its required arguments."""
+    TOOL_REG[name] = fn
+    TOOL_SCHEMAS[name] = schema
+
+
+# ── sync / async dispatch ────────────────────────────────────────────────────
+# TOOL_REG entries may be plain callables or ``async def`` coroutines.
+def is_async_tool(fn: Callable[..., Any]) -> bool:
+    return inspect.iscoroutinefunction(fn)
+
+
+def call_tool(name: str, args: Dict[str, Any]) -> Any:
+    """Run a tool from synchronous code (async tools get a private event loop)."""
+    fn = TOOL_REG[name]
+    if is_async_tool(fn):
+        return asyncio.run(fn(**args))
+    return fn(**args)
+
+
+async def acall_tool(name: str, args: Dict[str, Any]) -> Any:
+    """Run a tool from async code; sync tools go to the shared tool thread pool."""
+    fn = TOOL_REG[name]
+    if is_async_tool(fn):
+        return await fn(**args)
+    return await run_in_executor(get_tool_executor(), fn, **args)
+
+
+__all__ = ["Tools", "TOOL_REG", "TOOL_SCHEMAS", "register_tool", "call_tool", "acall_tool", "is_async_tool"]
\ No newline at end of file
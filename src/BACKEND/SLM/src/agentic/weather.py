@@ -0,0 +1,283 @@
+"""Weather providers for the ``get_weather_details`` tool.
+
+Providers share one tiny interface (``fetch(location) -> dict``) so the agent
+can talk to wttr.in in production and to a JSON fixture or a local HTTP stub
+when running offline or benchmarking.  ``CachedWeatherProvider`` wraps any of
+them with a TTL cache keyed by the normalised location.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+def normalize_location(location: str) -> str:
+    """Collapse case and whitespace so "  New  York" and "new york" share a key."""
+    return " ".join(location.split()).lower()
+
+
+class WeatherProvider:
+    """Base class: subclasses return ``{"loc", "temp_C", "weather"}`` dicts."""
+
+    def fetch(self, location: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+# ── wttr.in (or any wttr-compatible local stub) ─────────────────────────────
+class WttrWeatherProvider(WeatherProvider):
+    """wttr.in client backed by one pooled ``requests.Session``.
+
+    ``base_url`` can point at a local stub server that mimics the
+    ``?format=j1`` response, e.g. ``python -m SLM.src.agentic.weather serve``.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://wttr.in",
+        timeout: float = 5.0,
+        pool_size: int = 8,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, location: str) -> Dict[str, Any]:
+        r = self.session.get(
+            f"{self.base_url}/{location}",
+            params={"format": "j1"},
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        cur = r.json()["current_condition"][0]
+        return {
+            "loc": location,
+            "temp_C": cur["temp_C"],
+            "weather": cur["weatherDesc"][0]["value"],
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# ── offline fixture ─────────────────────────────────────────────────────────
+class FileWeatherProvider(WeatherProvider):
+    """Serves weather from a JSON file mapping location → ``{temp_C, weather}``.
+
+    Unknown locations fall back to the ``"*"`` entry when present, so a fixture
+    with a single wildcard is enough for load tests.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        self._data = {normalize_location(k): v for k, v in raw.items()}
+
+    def fetch(self, location: str) -> Dict[str, Any]:
+        entry = self._data.get(normalize_location(location)) or self._data.get("*")
+        if entry is None:
+            raise KeyError(f"no fixture weather for {location!r}")
+        return {"loc": location, "temp_C": entry["temp_C"], "weather": entry["weather"]}
+
+
+# ── TTL cache with stale-while-revalidate ───────────────────────────────────
+class CachedWeatherProvider(WeatherProvider):
+    """TTL cache in front of another provider.
+
+    * fresh entry (age < ``ttl``)          → served from memory
+    * stale entry (age < ``ttl + stale``)  → served from memory, refreshed in
+      the background (one refresh in flight per key)
+    * otherwise                            → fetched inline
+    """
+
+    def __init__(
+        self,
+        backend: WeatherProvider,
+        ttl: float = 600.0,
+        stale_ttl: float = 1800.0,
+        max_entries: int = 1024,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-swr")
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0}
+
+    def _store(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[key] = (time.monotonic(), value)
+
+    def _refresh(self, key: str, location: str) -> None:
+        try:
+            self._store(key, self.backend.fetch(location))
+        except Exception:
+            pass  # keep serving the stale value until it expires
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def fetch(self, location: str) -> Dict[str, Any]:
+        key = normalize_location(location)
+        now = time.monotonic()
+        schedule = False
+        with self._lock:
+            entry = self._entries.get(key)
+            age = now - entry[0] if entry is not None else None
+            if age is not None and age < self.ttl:
+                self.stats["hits"] += 1
+            elif age is not None and age < self.ttl + self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                schedule = key not in self._refreshing
+                self._refreshing.add(key)
+            else:
+                entry = None
+                self.stats["misses"] += 1
+        if schedule:
+            self._refresher.submit(self._refresh, key, location)
+        if entry is not None:
+            return dict(entry[1], loc=location)
+
+        value = self.backend.fetch(location)
+        self._store(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        self._refresher.shutdown(wait=False)
+        self.backend.close()
+
+
+# ── process-wide provider ───────────────────────────────────────────────────
+_provider: Optional[WeatherProvider] = None
+_provider_lock = threading.Lock()
+
+
+def provider_from_env() -> WeatherProvider:
+    """Build the provider described by ``SLAM_WEATHER_PROVIDER``.
+
+    * unset / ``wttr``      → wttr.in
+    * ``http://host:port``  → wttr-compatible local stub
+    * ``file:<path>``       → JSON fixture
+    Cache lifetimes come from ``SLAM_WEATHER_TTL`` / ``SLAM_WEATHER_STALE_TTL``.
+    """
+    spec = os.environ.get("SLAM_WEATHER_PROVIDER", "wttr")
+    if spec.startswith("file:"):
+        backend: WeatherProvider = FileWeatherProvider(spec[len("file:"):])
+    elif spec.startswith(("http://", "https://")):
+        backend = WttrWeatherProvider(base_url=spec)
+    else:
+        backend = WttrWeatherProvider()
+    return CachedWeatherProvider(
+        backend,
+        ttl=float(os.environ.get("SLAM_WEATHER_TTL", 600)),
+        stale_ttl=float(os.environ.get("SLAM_WEATHER_STALE_TTL", 1800)),
+    )
+
+
+def get_weather_provider() -> WeatherProvider:
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = provider_from_env()
+    return _provider
+
+
+def set_weather_provider(provider: Optional[WeatherProvider]) -> None:
+    """Swap the process-wide provider (``None`` rebuilds it from env on next use)."""
+    global _provider
+    with _provider_lock:
+        old, _provider = _provider, provider
+    if old is not None and old is not provider:
+        old.close()
+
+
+# ── local HTTP stub ─────────────────────────────────────────────────────────
+def serve_stub(host: str = "127.0.0.1", port: int = 8765,
+               fixture: Optional[str] = None, latency: float = 0.0) -> None:
+    """Serve a wttr.in-compatible ``?format=j1`` endpoint for offline runs."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import unquote, urlparse
+
+    source = FileWeatherProvider(fixture) if fixture else None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            location = unquote(urlparse(self.path).path.lstrip("/")) or "nowhere"
+            if latency:
+                time.sleep(latency)
+            try:
+                cur = source.fetch(location) if source else {"temp_C": "21", "weather": "Sunny"}
+            except KeyError:
+                self.send_error(404)
+                return
+            body = json.dumps({"current_condition": [{
+                "temp_C": str(cur["temp_C"]),
+                "weatherDesc": [{"value": cur["weather"]}],
+            }]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Weather stub listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+__all__ = [
+    "WeatherProvider",
+    "WttrWeatherProvider",
+    "FileWeatherProvider",
+    "CachedWeatherProvider",
+    "get_weather_provider",
+    "set_weather_provider",
+    "normalize_location",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="wttr.in-compatible weather stub")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--fixture", default=None, help="JSON file of location → {temp_C, weather}")
+    serve.add_argument("--latency", type=float, default=0.0, help="artificial delay in seconds")
+    args = parser.parse_args()
+    serve_stub(args.host, args.port, args.fixture, args.latency)
+
@@ -1,10 +1,15 @@
 """Default configurations for SLMEngine."""
 
+import os
 from pathlib import Path
 from .models.base_models import (
     SLMConfig,
     ModelConfig,
     HardwareConfig,
+    CacheConfig,
+    PreloadConfig,
+    SchedulerConfig,
+    ContextConfig,
     GenerationConfig,
     SystemRequirements,
     ModelSource,
@@ -28,7 +33,10 @@ DEFAULT_MODEL_CONFIG = ModelConfig(
 DEFAULT_HARDWARE_CONFIG = HardwareConfig(
     n_gpu_layers=4,  # Set to higher number to use GPU
     main_gpu=0,
-    n_threads=None  # Will be auto-detected
+    n_threads=None,  # Will be auto-detected
+    use_mlock=True if os.environ.get("SLAM_MLOCK") == "1" else None,  # only if SanityChecker finds room
+    # Tuned thread / batch settings written by `python -m SLM.src.runner.autotune`
+    profile_dir=Path(os.environ.get("SLAM_TUNING_DIR", MODELS_DIR / ".tuning")),
 )
 
 # Generation settings
@@ -48,6 +56,33 @@ DEFAULT_SYSTEM_REQUIREMENTS = SystemRequirements(
     default_threads=4
 )
 
+# Persisted prompt states (KV cache of the system prompt) survive restarts
+DEFAULT_CACHE_CONFIG = CacheConfig(
+    state_dir=Path(os.environ.get("SLAM_STATE_CACHE_DIR", MODELS_DIR / ".state_cache")),
+    max_bytes=int(os.environ.get("SLAM_STATE_CACHE_BYTES", 2 * 1024 ** 3)),
+)
+
+# Startup: page the GGUF in and run one short generation before serving
+DEFAULT_PRELOAD_CONFIG = PreloadConfig(
+    page_in=os.environ.get("SLAM_PAGE_IN", "1") == "1",
+    warmup_tokens=int(os.environ.get("SLAM_WARMUP_TOKENS", 4)),
+)
+
+# Continuous batching of concurrent agent sessions (SLAM_BATCHING=1 to enable)
+DEFAULT_SCHEDULER_CONFIG = SchedulerConfig(
+    enabled=os.environ.get("SLAM_BATCHING") == "1",
+    max_sessions=int(os.environ.get("SLAM_BATCH_SESSIONS", 16)),
+    n_ctx=int(os.environ.get("SLAM_BATCH_CTX", 8192)),
+)
+
+# Prompts longer than the context: bigger pooled context first, then trimmed history
+DEFAULT_CONTEXT_CONFIG = ContextConfig(
+    fallbacks=[f.strip() for f in os.environ.get("SLAM_CONTEXT_FALLBACKS", "larger_context,trim_history").split(",")
+               if f.strip()],
+    max_context_size=int(os.environ.get("SLAM_MAX_CONTEXT", 8192)),
+    deadline_s=float(os.environ.get("SLAM_CONTEXT_DEADLINE_S", 60)) or None,
+)
+
 # Default prompt template
 DEFAULT_PROMPT_TEMPLATE = """{instruction}
 
@@ -58,10 +93,14 @@ Response:"""
 def get_default_config() -> SLMConfig:
     """Get the default configuration."""
     return SLMConfig(
-        model=DEFAULT_MODEL_CONFIG,
-        hardware=DEFAULT_HARDWARE_CONFIG,
-        generation=DEFAULT_GENERATION_CONFIG,
-        system_requirements=DEFAULT_SYSTEM_REQUIREMENTS,
+        model=DEFAULT_MODEL_CONFIG.model_copy(deep=True),
+        hardware=DEFAULT_HARDWARE_CONFIG.model_copy(deep=True),
+        generation=DEFAULT_GENERATION_CONFIG.model_copy(deep=True),
+        system_requirements=DEFAULT_SYSTEM_REQUIREMENTS.model_copy(deep=True),
+        cache=DEFAULT_CACHE_CONFIG.model_copy(deep=True),
+        preload=DEFAULT_PRELOAD_CONFIG.model_copy(deep=True),
+        scheduler=DEFAULT_SCHEDULER_CONFIG.model_copy(deep=True),
+        context=DEFAULT_CONTEXT_CONFIG.model_copy(deep=True),
         prompt_template=DEFAULT_PROMPT_TEMPLATE,
     )
 
@@ -81,6 +120,16 @@ def get_cpu_config(model_path: Path = DEFAULT_MODEL_CONFIG.model_path) -> SLMCon
     config.model.model_path = model_path
     return config
 
+# Smaller / lower-bit GGUF the router sends simple queries to
+SMALL_MODEL_PATH = Path(os.environ.get("SLAM_SMALL_MODEL_PATH", MODELS_DIR / "Phi-4-mini-instruct-Q4_K_M.gguf"))
+
+def get_small_config(model_path: Path = SMALL_MODEL_PATH) -> SLMConfig:
+    """Get configuration for the small model used for simple queries."""
+    config = get_default_config()
+    config.model.model_path = model_path
+    config.generation.max_tokens = 128  # simple queries get short answers
+    return config
+
 def get_pretrained_config(
     repo_id: str,
     filename: str = None
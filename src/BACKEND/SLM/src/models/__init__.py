@@ -4,6 +4,10 @@ from .base_models import (
     GenerationConfig,
     ModelConfig,
     HardwareConfig,
+    CacheConfig,
+    PreloadConfig,
+    SchedulerConfig,
+    ContextConfig,
     SLMConfig,
     SystemRequirements,
     ModelSource,
@@ -16,6 +20,10 @@ __all__ = [
     'GenerationConfig',
     'ModelConfig',
     'HardwareConfig',
+    'CacheConfig',
+    'PreloadConfig',
+    'SchedulerConfig',
+    'ContextConfig',
     'SLMConfig',
     'SystemRequirements',
     'ModelSource',
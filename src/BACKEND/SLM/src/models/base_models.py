@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field # type: ignore
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Literal, Optional, Union
 from pathlib import Path
 from enum import Enum
 
@@ -42,6 +42,10 @@ class ModelConfig(BaseModel):
     context_size: int = Field(default=2048, ge=0)
     pretrained: Optional[PretrainedModelConfig] = None
     use_prompt: bool = Field(default=True, description="Enable prompt handler usage")
+    incremental_prompt: bool = Field(
+        default=True,
+        description="Agent sessions append to the live llama context instead of re-submitting the whole prompt"
+    )
     verbose: bool = Field(default=False, description="Enable verbose logging")
 
     @property
@@ -69,10 +73,88 @@ class ModelConfig(BaseModel):
             raise ValueError("repo_id is required in pretrained configuration")
 
 class HardwareConfig(BaseModel):
-    """Pydantic model for hardware settings."""
+    """Pydantic model for hardware settings.
+
+    Settings left at ``None`` are taken from the autotune profile for this
+    CPU and model if one exists, else from llama.cpp's defaults.
+    """
     n_gpu_layers: int = Field(default=0, ge=0)
     main_gpu: int = Field(default=0, ge=0)
-    n_threads: Optional[int] = None
+    n_threads: Optional[int] = Field(default=None, ge=1, description="Threads for single-token decode")
+    n_threads_batch: Optional[int] = Field(default=None, ge=1, description="Threads for prompt / batch eval")
+    n_batch: Optional[int] = Field(default=None, ge=1, description="Logical batch size for prompt eval")
+    n_ubatch: Optional[int] = Field(default=None, ge=1, description="Physical batch size")
+    use_mmap: Optional[bool] = None
+    use_mlock: Optional[bool] = None
+    profile_dir: Optional[Path] = Field(
+        default=None,
+        description="Directory of autotune profiles (None disables loading them)"
+    )
+
+class CacheConfig(BaseModel):
+    """Pydantic model for the persistent prompt-state cache."""
+    state_dir: Optional[Path] = Field(
+        default=None,
+        description="Directory for serialized llama.cpp prompt states (None disables the cache)"
+    )
+    max_bytes: int = Field(default=2 * 1024 ** 3, ge=0, description="Size cap of the state directory")
+    restore_on_startup: bool = Field(
+        default=True,
+        description="Load the most used state at startup instead of on first use"
+    )
+    min_prefix_tokens: int = Field(default=32, ge=1, description="Shorter prefixes are not worth persisting")
+
+class PreloadConfig(BaseModel):
+    """Pydantic model for preparing the model at startup instead of on the first request."""
+    page_in: bool = Field(
+        default=False,
+        description="Read the whole GGUF once so the first request takes no major page faults"
+    )
+    warmup_tokens: int = Field(
+        default=0, ge=0,
+        description="Tokens generated by a throw-away request at startup (0 disables the warm-up)"
+    )
+    warmup_prompt: str = "Hello"
+    mlock_headroom_gb: float = Field(
+        default=2.0, ge=0.0,
+        description="Memory that must stay available besides the model for use_mlock to be honoured"
+    )
+
+class SchedulerConfig(BaseModel):
+    """Pydantic model for continuous batching of concurrent sessions on one model."""
+    enabled: bool = Field(
+        default=False,
+        description="Decode all agent sessions in shared llama.cpp batches instead of one at a time"
+    )
+    max_sessions: int = Field(default=16, ge=1, description="KV sequences, i.e. sessions decoding at once")
+    n_ctx: int = Field(default=8192, ge=1, description="KV cells shared by all sessions")
+    n_batch: int = Field(default=512, ge=1, description="Tokens per llama_decode call")
+    prefill_chunk: int = Field(
+        default=256, ge=1,
+        description="Prompt tokens one session may add to a step, so prefill doesn't stall sampling sessions"
+    )
+
+class ContextConfig(BaseModel):
+    """Pydantic model for prompts that do not fit in ``ModelConfig.context_size``.
+
+    ``SLMRunner.generate`` counts the prompt's tokens before generating; a
+    prompt leaving less than ``reserve_tokens`` of room goes through the
+    ``fallbacks`` in order, or raises ``CONTEXT_LENGTH_EXCEEDED``.
+    """
+    fallbacks: List[Literal["larger_context", "rope_scaling", "trim_history"]] = Field(
+        default_factory=lambda: ["larger_context", "trim_history"],
+        description="larger_context: a pooled context up to max_context_size (within the trained length); "
+                    "rope_scaling: the same past the trained length with linear RoPE scaling; "
+                    "trim_history: drop the oldest turns between the system prompt and the latest turns"
+    )
+    reserve_tokens: int = Field(default=256, ge=1, description="Room for new tokens a prompt must leave")
+    max_context_size: int = Field(default=8192, ge=1, description="Largest n_ctx of a fallback context")
+    pool_size: int = Field(default=1, ge=0, description="Fallback contexts kept loaded (KV memory each)")
+    deadline_s: Optional[float] = Field(
+        default=60.0, gt=0.0,
+        description="Decoding on a fallback path stops this long after the request started (None: no limit)"
+    )
+    safety_tokens: int = Field(default=16, ge=0, description="Margin for the approximate pre-flight count")
 
 class SystemRequirements(BaseModel):
     """System requirements for running models."""
@@ -87,6 +169,10 @@ class SLMConfig(BaseModel):
     hardware: HardwareConfig
     generation: GenerationConfig
     system_requirements: SystemRequirements = Field(default_factory=SystemRequirements)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    preload: PreloadConfig = Field(default_factory=PreloadConfig)
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
+    context: ContextConfig = Field(default_factory=ContextConfig)
     prompt_template: str = "{instruction}\n\n{input}\n\nResponse:"
     model_kwargs: Dict[str, Any] = Field(default_factory=dict)
 
@@ -6,9 +6,15 @@ from .exceptions import (
     GenerationError
 )
 from .slm_runner import SLMRunner
+from .session import LlamaSession, TextSession
+from .batch_scheduler import BatchScheduler, BatchSession
 
 __all__ = [
     'SLMRunner',
+    'LlamaSession',
+    'TextSession',
+    'BatchScheduler',
+    'BatchSession',
     'SLMRunnerError',
     'ModelInitializationError',
     'GenerationError'
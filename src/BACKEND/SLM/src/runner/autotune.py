@@ -0,0 +1,332 @@
+"""Hardware auto-tuner for llama.cpp thread and batch settings.
+
+Benchmarks one GGUF on this host and stores the fastest settings as a
+profile that ``SLMRunner`` applies automatically to any ``HardwareConfig``
+field left at ``None``.  Profiles are keyed by the CPU (model name, usable
+CPUs, NUMA layout) and the model file fingerprint, so a profile is never
+applied to different hardware or a different quantization.
+
+The search is coordinate-wise, each step keeping the winners so far:
+  1. threads – one context, ``llama_set_n_threads`` per candidate count;
+     decode tok/s picks ``n_threads``, prompt-eval tok/s ``n_threads_batch``
+  2. batch   – a fresh context per ``(n_batch, n_ubatch)`` pair
+  3. memory  – a fresh model per mmap / no-mmap / mmap+mlock (if allowed)
+Steps 2 and 3 minimise the time of a reference request
+(``--prompt-tokens`` of prompt eval + ``--gen-tokens`` of decode).
+
+Run from ``src/BACKEND``:
+    python -m SLM.src.runner.autotune --model SLM/models/Phi-4-mini-instruct-Q5_K_M.gguf
+    python -m SLM.src.runner.autotune --model SLM/models/Phi-4-mini-instruct-Q5_K_M.gguf --threads 4 8 16
+    python -m SLM.src.runner.autotune --model SLM/models/Phi-4-mini-instruct-Q5_K_M.gguf --show
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import psutil
+import xxhash
+
+from ..utils.hashing import file_fingerprint
+from ..utils.lazy import lazy_import
+
+llama_cpp = lazy_import("llama_cpp")
+
+PROFILE_VERSION = 1
+TUNED_FIELDS = ("n_threads", "n_threads_batch", "n_batch", "n_ubatch", "use_mmap", "use_mlock")
+
+
+# ── host identity ─────────────────────────────────────────────────────────────
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _parse_cpulist(text: str) -> List[int]:
+    """``"0-3,8"`` -> ``[0, 1, 2, 3, 8]``"""
+    cpus = []
+    for part in text.strip().split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def usable_cpus() -> List[int]:
+    """CPUs this process may run on (cgroup / taskset restrictions included)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes() -> List[List[int]]:
+    """Usable CPUs per NUMA node (a single node where sysfs has no topology)."""
+    usable = set(usable_cpus())
+    nodes = []
+    for path in sorted(Path("/sys/devices/system/node").glob("node[0-9]*")):
+        try:
+            cpus = [c for c in _parse_cpulist((path / "cpulist").read_text()) if c in usable]
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [sorted(usable)]
+
+
+def host_id() -> Dict[str, Any]:
+    return {
+        "cpu": cpu_model(),
+        "usable_cpus": len(usable_cpus()),
+        "physical_cores": psutil.cpu_count(logical=False),
+        "numa_nodes": [len(node) for node in numa_nodes()],
+    }
+
+
+# ── profiles ──────────────────────────────────────────────────────────────────
+def profile_path(directory: Union[str, Path], model_path: Union[str, Path]) -> Path:
+    host = xxhash.xxh3_64_hexdigest(json.dumps(host_id(), sort_keys=True).encode("utf-8"))
+    return Path(directory) / f"{host}-{file_fingerprint(model_path)[:16]}.json"
+
+
+def load_profile(directory: Union[str, Path], model_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """The stored profile for this host and model, or ``None``."""
+    try:
+        with open(profile_path(directory, model_path), encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return profile if profile.get("version") == PROFILE_VERSION else None
+
+
+def save_profile(
+    directory: Union[str, Path],
+    model_path: Union[str, Path],
+    settings: Dict[str, Any],
+    measured: Dict[str, Any],
+    trials: List[Dict[str, Any]],
+) -> Path:
+    path = profile_path(directory, model_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile = {
+        "version": PROFILE_VERSION,
+        "host": host_id(),
+        "model": {"path": str(model_path), "fingerprint": file_fingerprint(model_path)},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": settings,
+        "measured": measured,
+        "trials": trials,
+    }
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def apply_profile(hardware, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy profile settings into the ``HardwareConfig`` fields left at ``None``; returns what was set."""
+    applied = {}
+    for field, value in profile.get("settings", {}).items():
+        if field in TUNED_FIELDS and getattr(hardware, field) is None:
+            setattr(hardware, field, value)
+            applied[field] = value
+    return applied
+
+
+# ── measurement ───────────────────────────────────────────────────────────────
+def thread_candidates(limit: Optional[int] = None) -> List[int]:
+    """Powers of two plus the core counts that usually matter (per node, physical, all usable)."""
+    usable = len(usable_cpus())
+    physical = min(psutil.cpu_count(logical=False) or usable, usable)
+    per_node = max(len(node) for node in numa_nodes())
+    candidates = {1 << i for i in range(usable.bit_length())}
+    candidates |= {usable, physical, per_node, max(1, int(physical * 0.8))}
+    return sorted(c for c in candidates if 1 <= c <= (limit or usable))
+
+
+def mlock_allowed(model_path: Union[str, Path]) -> bool:
+    if not llama_cpp.llama_supports_mlock():
+        return False
+    soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+    return soft == resource.RLIM_INFINITY or soft >= os.path.getsize(model_path)
+
+
+def load_model(model_path, n_ctx: int, n_gpu_layers: int, **settings) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    model = llama_cpp.Llama(
+        model_path=str(model_path),
+        n_ctx=n_ctx,
+        n_gpu_layers=n_gpu_layers,
+        verbose=False,
+        **{k: v for k, v in settings.items() if v is not None},
+    )
+    return model, time.perf_counter() - start
+
+
+def synthetic_tokens(model, n: int, seed: int = 0) -> List[int]:
+    """``n`` ordinary (non-control) token ids; the content does not affect speed."""
+    rng = random.Random(seed)
+    n_vocab = model.n_vocab()
+    low = min(256, n_vocab // 2)
+    return [rng.randrange(low, n_vocab) for _ in range(n)]
+
+
+def measure(model, n_threads: int, n_threads_batch: int, prompt: List[int], gen_tokens: int, repeat: int) -> Dict[str, float]:
+    """Best-of-``repeat`` prompt-eval and decode throughput in tokens/s."""
+    llama_cpp.llama_set_n_threads(model._ctx.ctx, n_threads, n_threads_batch)
+    prompt_s = decode_s = float("inf")
+    for _ in range(repeat):
+        model.reset()
+        start = time.perf_counter()
+        model.eval(prompt)
+        prompt_s = min(prompt_s, time.perf_counter() - start)
+
+        model.reset()
+        model.eval(prompt[:8])
+        start = time.perf_counter()
+        for token in prompt[8:8 + gen_tokens]:
+            model.eval([token])
+        decode_s = min(decode_s, time.perf_counter() - start)
+    return {
+        "prompt_tps": len(prompt) / prompt_s,
+        "decode_tps": min(gen_tokens, len(prompt) - 8) / decode_s,
+    }
+
+
+def request_seconds(result: Dict[str, float], prompt_tokens: int, gen_tokens: int) -> float:
+    return prompt_tokens / result["prompt_tps"] + gen_tokens / result["decode_tps"]
+
+
+# ── search ────────────────────────────────────────────────────────────────────
+def autotune(
+    model_path: Union[str, Path],
+    threads: Iterable[int],
+    batch_sizes: Iterable[int],
+    ubatch_sizes: Iterable[int],
+    prompt_tokens: int = 512,
+    gen_tokens: int = 64,
+    repeat: int = 2,
+    n_ctx: int = 2048,
+    n_gpu_layers: int = 0,
+    try_memory: bool = True,
+    log=print,
+) -> Tuple[Dict[str, Any], Dict[str, float], List[Dict[str, Any]]]:
+    """Run the three search steps; returns ``(settings, measured, trials)``."""
+    if prompt_tokens + gen_tokens + 8 > n_ctx:
+        raise ValueError(f"--ctx {n_ctx} is too small for {prompt_tokens} prompt + {gen_tokens} generated tokens")
+    trials: List[Dict[str, Any]] = []
+    settings: Dict[str, Any] = {"n_batch": 512, "n_ubatch": 512, "use_mmap": True, "use_mlock": False}
+
+    def record(step: str, trial: Dict[str, Any], result: Dict[str, float], load_s: Optional[float] = None):
+        entry = {"step": step, **trial, **result, "request_s": request_seconds(result, prompt_tokens, gen_tokens)}
+        if load_s is not None:
+            entry["load_s"] = load_s
+        trials.append(entry)
+        shown = ", ".join(f"{k}={v}" for k, v in trial.items())
+        log(f"[{step:<7}] {shown:<44} prompt {result['prompt_tps']:8.1f} tok/s   "
+            f"decode {result['decode_tps']:7.1f} tok/s" + (f"   load {load_s:.2f}s" if load_s is not None else ""))
+        return entry
+
+    # 1. threads
+    model, _ = load_model(model_path, n_ctx, n_gpu_layers, **settings)
+    prompt = synthetic_tokens(model, max(prompt_tokens, gen_tokens + 8))
+    try:
+        step = [record("threads", {"threads": t}, measure(model, t, t, prompt, gen_tokens, repeat)) for t in threads]
+    finally:
+        model.close()
+    settings["n_threads"] = max(step, key=lambda e: e["decode_tps"])["threads"]
+    settings["n_threads_batch"] = max(step, key=lambda e: e["prompt_tps"])["threads"]
+
+    def trial_run(step_name: str, trial: Dict[str, Any]) -> Dict[str, Any]:
+        model, load_s = load_model(model_path, n_ctx, n_gpu_layers, **{**settings, **trial})
+        try:
+            result = measure(model, settings["n_threads"], settings["n_threads_batch"], prompt, gen_tokens, repeat)
+        finally:
+            model.close()
+        return record(step_name, trial, result, load_s)
+
+    # 2. batch sizes
+    pairs = [(b, u) for b in batch_sizes for u in ubatch_sizes if u <= b <= n_ctx]
+    if pairs:
+        step = [trial_run("batch", {"n_batch": b, "n_ubatch": u}) for b, u in pairs]
+        best = min(step, key=lambda e: e["request_s"])
+        settings.update(n_batch=best["n_batch"], n_ubatch=best["n_ubatch"])
+
+    # 3. mmap / mlock
+    if try_memory:
+        options = [(True, False), (False, False)]
+        if mlock_allowed(model_path):
+            options.append((True, True))
+        else:
+            log("[memory ] mlock skipped: RLIMIT_MEMLOCK is below the model size")
+        step = [trial_run("memory", {"use_mmap": m, "use_mlock": l}) for m, l in options]
+        best = min(step, key=lambda e: e["request_s"])
+        settings.update(use_mmap=best["use_mmap"], use_mlock=best["use_mlock"])
+
+    final = [e for e in trials if e["step"] != "threads"]
+    winner = min(final, key=lambda e: e["request_s"]) if final else max(trials, key=lambda e: e["decode_tps"])
+    measured = {k: winner[k] for k in ("prompt_tps", "decode_tps", "request_s")}
+    return settings, measured, trials
+
+
+def parse_args(argv=None):
+    from ..config import DEFAULT_HARDWARE_CONFIG, DEFAULT_MODEL_CONFIG
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL_CONFIG.model_path, help="GGUF file to tune for")
+    parser.add_argument("--profile-dir", type=Path, default=DEFAULT_HARDWARE_CONFIG.profile_dir)
+    parser.add_argument("--threads", type=int, nargs="+", default=None, help="default: see thread_candidates()")
+    parser.add_argument("--max-threads", type=int, default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[256, 512, 1024])
+    parser.add_argument("--ubatch-sizes", type=int, nargs="*", default=[256, 512])
+    parser.add_argument("--prompt-tokens", type=int, default=512)
+    parser.add_argument("--gen-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=2, help="best of N per measurement")
+    parser.add_argument("--ctx", type=int, default=2048)
+    parser.add_argument("--gpu-layers", type=int, default=0)
+    parser.add_argument("--skip-memory", action="store_true", help="don't compare mmap / mlock")
+    parser.add_argument("--dry-run", action="store_true", help="print the winner without saving it")
+    parser.add_argument("--show", action="store_true", help="print the stored profile and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.show:
+        profile = load_profile(args.profile_dir, args.model)
+        print(json.dumps(profile, indent=2) if profile else f"No profile for {args.model} on this host")
+        return
+
+    host = host_id()
+    print(f"{host['cpu']}: {host['usable_cpus']} usable CPUs, {host['physical_cores']} physical cores, "
+          f"NUMA nodes {host['numa_nodes']}")
+    threads = args.threads or thread_candidates(args.max_threads)
+    settings, measured, trials = autotune(
+        args.model, threads, args.batch_sizes, args.ubatch_sizes,
+        prompt_tokens=args.prompt_tokens, gen_tokens=args.gen_tokens, repeat=args.repeat,
+        n_ctx=args.ctx, n_gpu_layers=args.gpu_layers, try_memory=not args.skip_memory,
+    )
+    print(f"\nbest: {settings}")
+    print(f"      prompt {measured['prompt_tps']:.1f} tok/s, decode {measured['decode_tps']:.1f} tok/s, "
+          f"{measured['request_s']:.2f}s per reference request")
+    if not args.dry_run:
+        path = save_profile(args.profile_dir, args.model, settings, measured, trials)
+        print(f"saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,626 @@
+"""Continuous batching: many sessions decoding on one llama.cpp context.
+
+A ``LlamaSession`` decodes alone: one ``llama_decode`` per token for one
+conversation, with the runner lock held, so sixteen agent sessions stream
+the weights from memory sixteen times per token.  ``BatchScheduler`` owns a
+second context on the same weights with one KV sequence per session, and a
+loop thread that every step builds a single ``llama_batch`` holding
+
+* the next token of every session that is sampling, and
+* chunks of the pending text (new turns, tool results) of the others,
+
+decodes it in one call and samples every sequence from its own row of
+logits.  A session waiting on a tool has no sampling request, so it drops
+out of the batch but keeps its KV slot; new sessions take free slots between
+steps.  The registered system prompt is decoded once into a reserved
+sequence and copied into each new session's sequence.
+
+If the shared KV cache fills up, the most recently admitted session is
+evicted (its tokens are re-decoded once another session closes).
+
+``BatchSession`` has the ``LlamaSession`` interface (``eval`` / ``stream`` /
+``keep_generated``) plus ``astream`` for event-loop consumers.  Measure with
+``python -m benchmarks.bench_batching``.
+"""
+
+import asyncio
+import codecs
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, Generator, List, Optional, Sequence, Tuple
+
+from ..models.base_models import SchedulerConfig
+from .exceptions import GenerationError, ErrorCode
+from .session import _held_back, _reserved
+from ..utils.lazy import lazy_import
+
+llama_cpp = lazy_import("llama_cpp")
+
+logger = logging.getLogger(__name__)
+
+PREFIX_SEQ = 0  # holds the shared system prompt; sessions use sequences 1..max_sessions
+_END = object()
+
+
+class _Request:
+    """One ``stream`` call: its sampler, token budget and where sampled tokens go."""
+
+    def __init__(self, sampler, budget: int, push: Callable[[Any], None]):
+        self.sampler = sampler
+        self.budget = budget
+        self.push = push
+        self.sampled = 0
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class _GeneratedText:
+    """Decoded text of one ``stream`` call, holding back a possible stop string."""
+
+    def __init__(self, model, stop: Sequence[str]):
+        self.model = model
+        self.stop = stop
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.text = ""
+        self.emitted = 0
+        self.cut: Optional[int] = None
+
+    def add(self, token: int) -> str:
+        """Append ``token``; returns the text that is now safe to yield."""
+        self.text += self.decoder.decode(self.model.detokenize([token]))
+        hit = [s for s in self.stop if s in self.text]
+        if hit:
+            self.cut = min(self.text.index(s) for s in hit)
+            return ""
+        safe = len(self.text) - _held_back(self.text, self.stop)
+        if safe <= self.emitted:
+            return ""
+        piece, self.emitted = self.text[self.emitted:safe], safe
+        return piece
+
+    def rest(self) -> str:
+        end = self.cut if self.cut is not None else len(self.text)
+        piece, self.emitted = self.text[self.emitted:end], max(self.emitted, end)
+        return piece
+
+
+class BatchSession:
+    """Session whose tokens are decoded by a ``BatchScheduler``.
+
+    ``tokens`` are in the session's KV sequence; ``_pending`` were appended
+    or sampled but not decoded yet.  While a ``stream`` is running both
+    belong to the scheduler's loop thread; otherwise to the caller.
+    """
+
+    incremental = True
+    batched = True
+
+    def __init__(self, scheduler: "BatchScheduler"):
+        self.scheduler = scheduler
+        self.runner = scheduler.runner
+        self.text = ""
+        self.tokens: List[int] = []
+        self._pending: List[int] = []
+        self._marks: List[Tuple[int, int]] = []  # (token count, generated chars) per sampled token
+        self._gen_text_start = 0
+        self.seq: Optional[int] = None
+        self._admitted = 0
+        self._request: Optional[_Request] = None
+        self._kv_keep: Optional[int] = None  # KV trim waiting for the loop thread
+        self._blocked = False
+        self._closed = False
+        self.stats = {"evaluated_tokens": 0, "reused_tokens": 0, "sampled_tokens": 0, "evictions": 0}
+
+    # ── bookkeeping ─────────────────────────────────────────────────────────
+    @property
+    def model(self):
+        return self.runner.model
+
+    @property
+    def n_ctx(self) -> int:
+        return self.scheduler.session_ctx
+
+    def __len__(self) -> int:
+        return len(self.tokens) + len(self._pending)
+
+    def _overflow(self, needed: int) -> GenerationError:
+        return GenerationError(
+            message="Session transcript does not fit in the context window",
+            code=ErrorCode.CONTEXT_LENGTH_EXCEEDED,
+            context={"session_tokens": len(self), "needed": needed, "n_ctx": self.n_ctx},
+        )
+
+    def _submit(self, temperature: float, max_tokens: int, kwargs: Dict[str, Any],
+                push: Callable[[Any], None]) -> _Request:
+        if len(self) == 0:
+            raise GenerationError("Nothing to continue: eval a prompt first", code=ErrorCode.INVALID_PROMPT)
+        budget = min(max_tokens, self.n_ctx - len(self) - 1)
+        if budget <= 0:
+            raise self._overflow(1)
+
+        params: Dict[str, Any] = {
+            k: v for k, v in self.runner.config.generation.model_dump().items()
+            if k in ("top_k", "top_p", "repeat_penalty") and v is not None
+        }
+        params.update({k: v for k, v in kwargs.items() if k in ("top_k", "top_p", "repeat_penalty", "min_p")})
+        # same sampler chain as Llama.generate, so batched and solo sessions sample alike
+        sampler = self.model._init_sampler(temp=temperature, **params)
+
+        self._gen_text_start = len(self.text)
+        self._marks = [(len(self), 0)]
+        request = _Request(sampler, budget, push)
+        self.scheduler.submit(self, request)
+        return request
+
+    def _receive(self, item, generated: _GeneratedText) -> str:
+        if isinstance(item, BaseException):
+            raise item
+        token, count = item
+        self.stats["sampled_tokens"] += 1
+        piece = generated.add(token)
+        self._marks.append((count, len(generated.text)))
+        return piece
+
+    # ── public API ──────────────────────────────────────────────────────────
+    def eval(self, text: str, reserve: bool = True) -> int:
+        """Append ``text`` to the transcript; it is decoded with the next ``stream``. Returns its token count.
+
+        With ``reserve``, fails unless ``_reserved`` tokens stay free for the reply.
+        """
+        toks = self.model.tokenize(text.encode("utf-8"), add_bos=len(self) == 0, special=True)
+        if len(self) + len(toks) + (_reserved(self.runner) if reserve else 0) >= self.n_ctx:
+            raise self._overflow(len(toks))
+        with self.scheduler.cond:
+            self._pending.extend(toks)
+        self.text += text
+        return len(toks)
+
+    def stream(self, temperature: float, max_tokens: int = 2048,
+               stop: Optional[List[str]] = None, **kwargs) -> Generator[str, None, None]:
+        """Sample from the end of the transcript, yielding decoded text pieces."""
+        items: "queue.Queue[Any]" = queue.Queue()
+        request = self._submit(temperature, max_tokens, kwargs, items.put)
+        generated = _GeneratedText(self.model, stop or [])
+        try:
+            while True:
+                item = items.get()
+                if item is _END:
+                    break
+                piece = self._receive(item, generated)
+                if piece:
+                    yield piece
+                if generated.cut is not None:
+                    break
+        finally:
+            if not request.done.is_set():
+                self.scheduler.cancel(self, request)
+                request.done.wait()
+            self.text = self.text[:self._gen_text_start] + generated.text
+
+        if generated.cut is not None:
+            self.keep_generated(generated.cut)
+        rest = generated.rest()
+        if rest:
+            yield rest
+
+    async def astream(self, temperature: float, max_tokens: int = 2048,
+                      stop: Optional[List[str]] = None, **kwargs) -> AsyncGenerator[str, None]:
+        """``stream`` for asyncio callers: waits on the scheduler without holding a thread."""
+        loop = asyncio.get_running_loop()
+        items: "asyncio.Queue[Any]" = asyncio.Queue()
+
+        def push(item):
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, item)
+            except RuntimeError:
+                pass  # event loop already closed; nobody is listening
+
+        request = self._submit(temperature, max_tokens, kwargs, push)
+        generated = _GeneratedText(self.model, stop or [])
+        ended = False
+        try:
+            while True:
+                item = await items.get()
+                if item is _END:
+                    ended = True
+                    break
+                piece = self._receive(item, generated)
+                if piece:
+                    yield piece
+                if generated.cut is not None:
+                    break
+        finally:
+            if not ended:
+                self.scheduler.cancel(self, request)
+                while await items.get() is not _END:
+                    pass
+            self.text = self.text[:self._gen_text_start] + generated.text
+
+        if generated.cut is not None:
+            self.keep_generated(generated.cut)
+        rest = generated.rest()
+        if rest:
+            yield rest
+
+    def keep_generated(self, n_chars: int) -> None:
+        """Trim the last generation to its first ``n_chars`` characters (see ``LlamaSession``)."""
+        generated = self.text[self._gen_text_start:]
+        n_tok, kept = self._marks[0] if self._marks else (len(self), 0)
+        for count, chars in self._marks:
+            if chars > n_chars:
+                break
+            n_tok, kept = count, chars
+        with self.scheduler.cond:
+            everything = self.tokens + self._pending
+            evaluated = min(n_tok, len(self.tokens))
+            if evaluated < len(self.tokens):
+                self._kv_keep = evaluated if self._kv_keep is None else min(self._kv_keep, evaluated)
+            self.tokens = everything[:evaluated]
+            self._pending = everything[evaluated:n_tok]
+        self.text = self.text[:self._gen_text_start] + generated[:kept]
+        self._marks = [m for m in self._marks if m[0] <= n_tok]
+        if n_chars > kept:
+            self.eval(generated[kept:n_chars], reserve=False)  # already generated, so it fits
+
+    def close(self) -> None:
+        """Give the KV slot back to the scheduler."""
+        self.scheduler.release(self)
+
+
+class BatchScheduler:
+    """Decodes every active ``BatchSession`` of one runner in shared batches.
+
+    All llama.cpp calls happen on the loop thread; sessions and the loop
+    meet under ``cond``.
+    """
+
+    def __init__(self, runner, config: Optional[SchedulerConfig] = None):
+        self.runner = runner
+        self.config = config or runner.config.scheduler
+        self.max_sessions = self.config.max_sessions
+        self.session_ctx = min(runner.config.model.context_size, self.config.n_ctx)
+        self.cond = threading.Condition()
+
+        self._free: Deque[int] = deque(range(PREFIX_SEQ + 1, PREFIX_SEQ + 1 + self.max_sessions))
+        self._waiting: Deque[BatchSession] = deque()
+        self._active: Dict[int, BatchSession] = {}
+        self._releases: List[int] = []
+        self._prefix: List[int] = []  # tokens held by PREFIX_SEQ
+        self._admissions = itertools.count(1)
+        self._rotation = 0
+        self._room = self.config.n_batch  # tokens per step; shrinks while the KV cache is full
+        self._stopped = False
+        self._counters = {"steps": 0, "batch_tokens": 0, "sampled_tokens": 0, "prefill_tokens": 0,
+                          "shared_prefix_tokens": 0, "evictions": 0, "decode_s": 0.0}
+
+        self._ctx = self._new_context()
+        self._batch = llama_cpp.llama_batch_init(self.config.n_batch, 0, 1)
+        self._thread = threading.Thread(target=self._loop, name="slam-batch", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Batch scheduler: {self.max_sessions} sessions, {self.config.n_ctx} KV cells, "
+            f"batch {self.config.n_batch}"
+        )
+
+    def _new_context(self):
+        """A context on the runner's weights with one KV sequence per session plus the prefix."""
+        model = self.runner.model
+        params = llama_cpp.llama_context_params.from_buffer_copy(model.context_params)
+        params.n_ctx = self.config.n_ctx
+        params.n_batch = self.config.n_batch
+        params.n_ubatch = min(params.n_ubatch, self.config.n_batch)
+        params.n_seq_max = self.max_sessions + 1
+        return llama_cpp._internals.LlamaContext(
+            model=model._model, params=params, verbose=self.runner.config.model.verbose
+        )
+
+    # ── session side ────────────────────────────────────────────────────────
+    def open_session(self) -> BatchSession:
+        return BatchSession(self)
+
+    def submit(self, session: BatchSession, request: _Request) -> None:
+        with self.cond:
+            if self._stopped or session._closed:
+                raise GenerationError("Batch scheduler is not accepting requests", code=ErrorCode.UNKNOWN_ERROR)
+            if not session._pending:
+                # the last token must be decoded again to get fresh logits
+                session._pending = [session.tokens.pop()]
+                keep = len(session.tokens)
+                session._kv_keep = keep if session._kv_keep is None else min(session._kv_keep, keep)
+            session._request = request
+            if session.seq is None and session not in self._waiting:
+                self._waiting.append(session)
+            self.cond.notify()
+
+    def cancel(self, session: BatchSession, request: _Request) -> None:
+        with self.cond:
+            request.cancelled = True
+            if session.seq is None and session._request is request:
+                # never admitted: nothing of it is in flight
+                self._waiting.remove(session)
+                self._finish(session)
+            self.cond.notify()
+
+    def release(self, session: BatchSession) -> None:
+        with self.cond:
+            if session._closed:
+                return
+            session._closed = True
+            if session._request is not None:
+                session._request.cancelled = True
+            if session.seq is None:
+                if session in self._waiting:
+                    self._waiting.remove(session)
+                if session._request is not None:
+                    self._finish(session)
+            else:
+                self._releases.append(session.seq)
+            self.cond.notify()
+
+    # ── loop thread ─────────────────────────────────────────────────────────
+    def _runnable(self) -> bool:
+        if self._releases or (self._waiting and self._free):
+            return True
+        return any(s._request is not None and (s._request.cancelled or not s._blocked)
+                   for s in self._active.values())
+
+    def _finish(self, session: BatchSession, error: Optional[BaseException] = None) -> None:
+        request, session._request = session._request, None
+        request.sampler.close()
+        if error is not None:
+            request.push(error)
+        request.push(_END)
+        request.done.set()
+
+    def _release_slots(self) -> None:
+        for seq in self._releases:
+            session = self._active.pop(seq)
+            if session._request is not None:
+                self._finish(session)
+            llama_cpp.llama_kv_cache_seq_rm(self._ctx.ctx, seq, -1, -1)
+            session.seq = None
+            self._free.append(seq)
+        if self._releases:
+            for session in self._active.values():
+                session._blocked = False
+            self._room = self.config.n_batch
+        self._releases = []
+
+    def _admit(self) -> None:
+        while self._waiting and self._free:
+            session = self._waiting.popleft()
+            session.seq = self._free.popleft()
+            session._admitted = next(self._admissions)
+            self._active[session.seq] = session
+
+    def _apply_trims(self, session: BatchSession) -> None:
+        if session._kv_keep is not None:
+            llama_cpp.llama_kv_cache_seq_rm(self._ctx.ctx, session.seq, session._kv_keep, -1)
+            session._kv_keep = None
+        if not session.tokens:
+            self._share_prefix(session)
+
+    def _share_prefix(self, session: BatchSession) -> None:
+        """Start an empty sequence from the stashed system prompt instead of decoding it again."""
+        n = len(self._prefix)
+        if not n or len(session._pending) <= n or session._pending[:n] != self._prefix:
+            return
+        llama_cpp.llama_kv_cache_seq_cp(self._ctx.ctx, PREFIX_SEQ, session.seq, 0, n)
+        session.tokens = session._pending[:n]
+        del session._pending[:n]
+        session.stats["reused_tokens"] += n
+        self._counters["shared_prefix_tokens"] += n
+
+    def _stash_prefix(self, session: BatchSession) -> None:
+        """Copy a registered prefix the session just decoded into ``PREFIX_SEQ``."""
+        for prefix in list(self.runner._prefixes.values()):
+            # the last prefix token may merge with the text that follows it
+            n = len(prefix) - 1
+            if (n < self.runner.config.cache.min_prefix_tokens or len(session.tokens) < n
+                    or self._prefix == prefix[:n] or session.tokens[:n] != prefix[:n]):
+                continue
+            llama_cpp.llama_kv_cache_seq_rm(self._ctx.ctx, PREFIX_SEQ, -1, -1)
+            llama_cpp.llama_kv_cache_seq_cp(self._ctx.ctx, session.seq, PREFIX_SEQ, 0, n)
+            self._prefix = prefix[:n]
+            return
+
+    def _plan(self) -> List[Tuple[BatchSession, List[int], bool]]:
+        """Rows of the next batch: ``(session, tokens, sample after the last one)``.
+
+        Sessions that are sampling go first with one token each; the rest of
+        ``n_batch`` goes to pending prompt text in chunks of ``prefill_chunk``,
+        starting from a different session every step.
+        """
+        ready = []
+        for session in list(self._active.values()):
+            request = session._request
+            if request is None:
+                continue
+            if request.cancelled:
+                self._finish(session)
+                continue
+            if session._blocked:
+                continue
+            self._apply_trims(session)
+            ready.append(session)
+
+        rows, room = [], self._room
+        for session in ready:
+            if len(session._pending) == 1:
+                rows.append((session, session._pending[:1], True))
+                room -= 1
+        prefilling = [s for s in ready if len(s._pending) > 1]
+        if prefilling:
+            self._rotation = (self._rotation + 1) % len(prefilling)
+            for session in prefilling[self._rotation:] + prefilling[:self._rotation]:
+                take = min(len(session._pending), self.config.prefill_chunk, room)
+                if take <= 0:
+                    break
+                rows.append((session, session._pending[:take], take == len(session._pending)))
+                room -= take
+        return rows
+
+    def _fill_batch(self, rows) -> List[Optional[int]]:
+        """Write ``rows`` into the llama batch; returns each row's logits index (None if not sampling)."""
+        batch = self._batch
+        n = 0
+        outputs = []
+        for session, toks, sample in rows:
+            pos = len(session.tokens)
+            for j, token in enumerate(toks):
+                batch.token[n] = token
+                batch.pos[n] = pos + j
+                batch.n_seq_id[n] = 1
+                batch.seq_id[n][0] = session.seq
+                batch.logits[n] = False
+                n += 1
+            if sample:
+                batch.logits[n - 1] = True
+            outputs.append(n - 1 if sample else None)
+        batch.n_tokens = n
+        return outputs
+
+    def _make_room(self, rows) -> None:
+        """The KV cache is full: drop the stashed prefix, evict the newest session or shrink the batch."""
+        for session, _, _ in rows:
+            # drop whatever part of the failed batch made it into the cache
+            llama_cpp.llama_kv_cache_seq_rm(self._ctx.ctx, session.seq, len(session.tokens), -1)
+        if self._prefix:
+            llama_cpp.llama_kv_cache_seq_rm(self._ctx.ctx, PREFIX_SEQ, -1, -1)
+            self._prefix = []
+            return
+        holders = [s for s in self._active.values() if s.tokens]
+        if len(holders) <= 1:
+            if self._batch.n_tokens > 1:
+                self._room = max(1, self._batch.n_tokens // 2)
+                return
+            session = rows[0][0]
+            if session._request is not None:
+                self._finish(session, session._overflow(len(session._pending)))
+            return
+        victim = max(holders, key=lambda s: s._admitted)
+        llama_cpp.llama_kv_cache_seq_rm(self._ctx.ctx, victim.seq, -1, -1)
+        victim._pending = victim.tokens + victim._pending
+        victim.tokens = []
+        victim._kv_keep = None
+        victim._blocked = True
+        victim.stats["evictions"] += 1
+        self._counters["evictions"] += 1
+        logger.warning(f"KV cache full: evicted session in sequence {victim.seq} until a slot frees up")
+
+    def _commit(self, rows, outputs, sampled) -> None:
+        for (session, toks, _), index, token in zip(rows, outputs, sampled):
+            session.tokens.extend(toks)
+            del session._pending[:len(toks)]
+            session.stats["evaluated_tokens"] += len(toks)
+            if len(toks) > 1:
+                self._counters["prefill_tokens"] += len(toks)
+                self._stash_prefix(session)
+            request = session._request
+            if index is None or request is None:
+                continue
+            if request.cancelled:
+                self._finish(session)
+                continue
+            if llama_cpp.llama_token_is_eog(self.runner.model._model.vocab, token):
+                self._finish(session)
+                continue
+            session._pending.append(token)
+            request.sampled += 1
+            self._counters["sampled_tokens"] += 1
+            request.push((token, len(session)))
+            if request.sampled >= request.budget:
+                self._finish(session)
+
+    def _step(self) -> bool:
+        with self.cond:
+            while not self._stopped and not self._runnable():
+                self.cond.wait()
+            if self._stopped:
+                return False
+            self._release_slots()
+            self._admit()
+            rows = self._plan()
+            if not rows:
+                return True
+            outputs = self._fill_batch(rows)
+            samplers = [s._request.sampler for s, _, _ in rows]
+
+        start = time.perf_counter()
+        status = llama_cpp.llama_decode(self._ctx.ctx, self._batch)
+        sampled = [None] * len(rows)
+        if status == 0:
+            for i, index in enumerate(outputs):
+                if index is not None:
+                    sampled[i] = samplers[i].sample(self._ctx, index)
+        elapsed = time.perf_counter() - start
+
+        with self.cond:
+            self._counters["steps"] += 1
+            self._counters["decode_s"] += elapsed
+            self._counters["batch_tokens"] += self._batch.n_tokens
+            if status == 0:
+                self._commit(rows, outputs, sampled)
+            elif status == 1:
+                self._make_room(rows)
+            else:
+                error = GenerationError(
+                    message=f"llama_decode failed with status {status}",
+                    code=ErrorCode.UNKNOWN_ERROR,
+                    context={"batch_tokens": self._batch.n_tokens},
+                )
+                for session, _, _ in rows:
+                    if session._request is not None:
+                        self._finish(session, error)
+        return True
+
+    def _loop(self) -> None:
+        try:
+            while self._step():
+                pass
+        except Exception as e:
+            logger.exception("Batch scheduler stopped")
+            with self.cond:
+                self._stopped = True
+                self._fail_all(GenerationError(f"Batch scheduler failed: {str(e)}", code=ErrorCode.UNKNOWN_ERROR))
+
+    def _fail_all(self, error: GenerationError) -> None:
+        for session in list(self._active.values()) + list(self._waiting):
+            if session._request is not None:
+                self._finish(session, error)
+        self._waiting.clear()
+
+    # ── lifecycle / reporting ───────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            c = dict(self._counters)
+            c.update(
+                active_sessions=len(self._active),
+                waiting_sessions=len(self._waiting),
+                sampling_sessions=sum(s._request is not None for s in self._active.values()),
+                mean_batch_tokens=round(c["batch_tokens"] / max(c["steps"], 1), 1),
+                decode_tokens_per_s=round(c["batch_tokens"] / max(c["decode_s"], 1e-9), 1),
+            )
+        c["decode_s"] = round(c["decode_s"], 3)
+        return c
+
+    def stop(self) -> None:
+        """Fail outstanding requests, stop the loop thread and free the context."""
+        with self.cond:
+            if self._ctx is None:
+                return
+            self._stopped = True
+            self.cond.notify_all()
+        self._thread.join()
+        with self.cond:
+            self._fail_all(GenerationError("Batch scheduler stopped", code=ErrorCode.UNKNOWN_ERROR))
+        llama_cpp.llama_batch_free(self._batch)
+        self._ctx.close()
+        self._ctx = None
+
+
+__all__ = ["BatchScheduler", "BatchSession"]
@@ -0,0 +1,292 @@
+"""Pre-flight context checks for ``SLMRunner.generate``.
+
+llama.cpp rejects a prompt longer than the context and silently clamps
+``max_tokens`` to whatever room is left, so a long multi-tool transcript
+either fails or gets a truncated answer.  ``ContextGuard.fit`` counts the
+prompt's tokens first (``TokenCounter``, cached) and, when it leaves less
+than ``ContextConfig.reserve_tokens`` of room, applies the configured
+fallbacks in order:
+
+* ``larger_context`` – generate on a pooled context with a larger ``n_ctx``
+  on the same GGUF (``ContextPool``; the weights are shared through mmap,
+  each context costs its KV cache), up to ``max_context_size`` and within
+  the model's trained context length;
+* ``rope_scaling``   – the same, also past the trained length with linear RoPE
+  scaling (quality degrades with the scale factor);
+* ``trim_history``   – keep the system prompt, the first user turn and as
+  many of the latest lines as fit, dropping the oldest tool steps.
+
+A fallback request gets a deadline (``deadline_s``) after which decoding
+stops, so requests that used to fail finish in bounded time.  If nothing
+fits, ``GenerationError(CONTEXT_LENGTH_EXCEEDED)`` is raised with the token
+counts.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .exceptions import GenerationError, ErrorCode
+
+logger = logging.getLogger(__name__)
+
+TRIM_MARKER = "[... earlier turns trimmed to fit the context ...]"
+
+
+class TokenCounter:
+    """Prompt token counts with an LRU cache.
+
+    Agent transcripts only grow, so a prompt extending a cached one is
+    counted as the cached count plus the tokens of the new tail.  The seam
+    may be off by a token; after ``max_seams`` extensions the prompt is
+    tokenized in full again.
+    """
+
+    def __init__(self, model, size: int = 256, max_seams: int = 8):
+        self.model = model
+        self.size = size
+        self.max_seams = max_seams
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, bool], Tuple[int, int]]" = OrderedDict()
+        self.stats = {"hits": 0, "extended": 0, "tokenized": 0}
+
+    def _tokenize(self, text: str, add_bos: bool) -> int:
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True))
+
+    def count(self, text: str, add_bos: bool = True) -> int:
+        key = (text, add_bos)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[0]
+            base = next((k for k in reversed(self._cache)
+                         if k[1] == add_bos and k[0] and text.startswith(k[0])), None)
+            base_count, seams = self._cache[base] if base else (0, 0)
+        if base and seams < self.max_seams:
+            entry = (base_count + self._tokenize(text[len(base[0]):], add_bos=False), seams + 1)
+            self.stats["extended"] += 1
+        else:
+            entry = (self._tokenize(text, add_bos), 0)
+            self.stats["tokenized"] += 1
+        with self._lock:
+            self._cache[key] = entry
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return entry[0]
+
+
+def trim_history(prompt: str, budget: int, count: Callable[[str], int]) -> Optional[str]:
+    """
+    ``prompt`` cut down to ``budget`` tokens by dropping its oldest turns.
+
+    Keeps the head (everything up to the first ``USER:`` line: the system
+    prompt and the question) and the longest run of trailing lines that
+    fits; a last line that alone is too long keeps its end.  Returns None if
+    even the head does not fit.
+    """
+    lines = prompt.split("\n")
+    head_n = next((i + 1 for i, line in enumerate(lines) if line.startswith("USER:")), 1)
+    head = "\n".join(lines[:head_n])
+    used = count(head) + count("\n" + TRIM_MARKER) + 1
+    if used >= budget or head_n == len(lines):
+        return None
+    tail: List[str] = []
+    for line in reversed(lines[head_n:]):
+        cost = count("\n" + line)
+        if used + cost > budget:
+            break
+        tail.append(line)
+        used += cost
+    if not tail:
+        line = lines[-1]
+        room = budget - used
+        keep = len(line) * room // max(count(line), 1)
+        while keep > 0 and count("\n" + line[-keep:]) > room:
+            keep = keep * 9 // 10
+        if keep <= 0:
+            return None
+        tail.append(line[-keep:])
+    tail.reverse()
+    return "\n".join([head, TRIM_MARKER] + tail)
+
+
+class ContextPool:
+    """Extra llama contexts with a larger ``n_ctx``, least recently used evicted beyond ``size``.
+
+    Contexts are opened outside the pool lock: requests that fit an open
+    context are not held up by a load, and concurrent requests for the size
+    being opened wait for that one load instead of starting their own.
+    """
+
+    def __init__(self, factory: Callable[[int, float], Any], size: int):
+        self.factory = factory
+        self.size = size
+        self._lock = threading.Lock()
+        self._contexts: "OrderedDict[Tuple[int, float], Tuple[Any, threading.Lock]]" = OrderedDict()
+        self._opening: Dict[Tuple[int, float], threading.Event] = {}
+
+    def _find(self, n_ctx: int, rope_freq_scale: float) -> Optional[Tuple[Any, threading.Lock]]:
+        for key in self._contexts:
+            if key[0] >= n_ctx and key[1] == rope_freq_scale:
+                self._contexts.move_to_end(key)
+                return self._contexts[key]
+        return None
+
+    def get(self, n_ctx: int, rope_freq_scale: float = 0.0) -> Tuple[Any, threading.Lock]:
+        """A context holding at least ``n_ctx`` tokens and the lock to decode on it."""
+        key = (n_ctx, rope_freq_scale)
+        while True:
+            with self._lock:
+                entry = self._find(n_ctx, rope_freq_scale)
+                if entry is not None:
+                    return entry
+                if self.size == 0:
+                    raise RuntimeError("context pool is disabled (pool_size=0)")
+                opening = self._opening.get(key)
+                if opening is None:
+                    opening = self._opening[key] = threading.Event()
+                    break
+            opening.wait()  # then look again: the load may have failed
+        try:
+            start = time.perf_counter()
+            entry = (self.factory(n_ctx, rope_freq_scale), threading.Lock())
+            logger.info("opened a %d-token fallback context in %.2fs", n_ctx, time.perf_counter() - start)
+            with self._lock:
+                while len(self._contexts) >= self.size:
+                    # a stream still decoding on it keeps its own reference
+                    self._contexts.popitem(last=False)
+                self._contexts[key] = entry
+            return entry
+        finally:
+            with self._lock:
+                del self._opening[key]
+            opening.set()
+
+    def sizes(self) -> List[int]:
+        with self._lock:
+            return [key[0] for key in self._contexts]
+
+
+class Fit:
+    """How a prompt will be generated: on which context, with which text and until when."""
+
+    __slots__ = ("prompt", "model", "lock", "strategy", "prompt_tokens", "n_ctx", "deadline")
+
+    def __init__(self, prompt: str, model, lock, strategy: Optional[str], prompt_tokens: int, n_ctx: int,
+                 deadline: Optional[float] = None):
+        self.prompt = prompt
+        self.model = model
+        self.lock = lock
+        self.strategy = strategy
+        self.prompt_tokens = prompt_tokens
+        self.n_ctx = n_ctx
+        self.deadline = deadline
+
+    def expired(self, *_) -> bool:
+        """Stopping criterion for llama.cpp (called with input ids and logits)."""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+class ContextGuard:
+    """Checks prompts against the runner's context and applies ``ContextConfig.fallbacks``."""
+
+    def __init__(self, runner, factory: Callable[[int, float], Any]):
+        self.runner = runner
+        self.config = runner.config.context
+        self.counter = TokenCounter(runner.model)
+        self.pool = ContextPool(factory, self.config.pool_size)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"checked": 0, "overflows": 0, "failed": 0, "deadline_stops": 0}
+        self._stats.update({name: 0 for name in ("larger_context", "rope_scaling", "trim_history")})
+
+    @property
+    def n_ctx(self) -> int:
+        return self.runner.model.n_ctx()
+
+    @property
+    def n_ctx_train(self) -> int:
+        try:
+            return int(self.runner.model._model.n_ctx_train())
+        except Exception:
+            return self.n_ctx
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _larger(self, prompt: str, tokens: int, max_tokens: int, need: int, rope: bool) -> Optional[Fit]:
+        limit = self.config.max_context_size if rope else min(self.config.max_context_size, self.n_ctx_train)
+        want = tokens + max_tokens + self.config.safety_tokens
+        n_ctx = min(limit, -(-want // 1024) * 1024)  # whole KiB-tokens, so one context serves many sizes
+        if n_ctx < need or n_ctx <= self.n_ctx:
+            return None
+        scale = self.n_ctx_train / n_ctx if rope and n_ctx > self.n_ctx_train else 0.0
+        model, lock = self.pool.get(n_ctx, scale)
+        return Fit(prompt, model, lock, "rope_scaling" if rope else "larger_context", tokens, model.n_ctx())
+
+    def _trimmed(self, prompt: str, max_tokens: int) -> Optional[Fit]:
+        budget = self.n_ctx - min(max_tokens, self.config.reserve_tokens) - self.config.safety_tokens
+        text = trim_history(prompt, budget, lambda t: self.counter.count(t, add_bos=False))
+        if text is None:
+            return None
+        return Fit(text, self.runner.model, None, "trim_history", self.counter.count(text), self.n_ctx)
+
+    def fit(self, prompt: str, max_tokens: Optional[int]) -> Fit:
+        """
+        Where and how to generate ``prompt``.
+
+        Raises:
+            GenerationError: ``CONTEXT_LENGTH_EXCEEDED`` if no fallback makes it fit
+        """
+        self._count("checked")
+        max_tokens = max_tokens if max_tokens and max_tokens > 0 else self.config.reserve_tokens
+        tokens = self.counter.count(prompt)
+        need = tokens + min(max_tokens, self.config.reserve_tokens) + self.config.safety_tokens
+        if need <= self.n_ctx:
+            return Fit(prompt, self.runner.model, None, None, tokens, self.n_ctx)
+
+        self._count("overflows")
+        tried: Dict[str, str] = {}
+        for strategy in self.config.fallbacks:
+            try:
+                if strategy == "trim_history":
+                    fit = self._trimmed(prompt, max_tokens)
+                else:
+                    fit = self._larger(prompt, tokens, max_tokens, need, rope=strategy == "rope_scaling")
+            except Exception as exc:  # e.g. no memory for the larger KV cache
+                logger.warning("context fallback %s failed: %s", strategy, exc)
+                tried[strategy] = str(exc)
+                continue
+            if fit is None:
+                tried[strategy] = "does not fit"
+                continue
+            if self.config.deadline_s:
+                fit.deadline = time.monotonic() + self.config.deadline_s
+            self._count(strategy)
+            logger.info("prompt of %d tokens does not fit n_ctx=%d; using %s (n_ctx=%d, %d prompt tokens)",
+                        tokens, self.n_ctx, strategy, fit.n_ctx, fit.prompt_tokens)
+            return fit
+
+        self._count("failed")
+        raise GenerationError(
+            message="Prompt does not fit in the context window",
+            code=ErrorCode.CONTEXT_LENGTH_EXCEEDED,
+            context={"prompt_tokens": tokens, "reserve_tokens": min(max_tokens, self.config.reserve_tokens),
+                     "n_ctx": self.n_ctx, "fallbacks": tried or "none configured"},
+        )
+
+    def deadline_hit(self) -> None:
+        self._count("deadline_stops")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {**stats, "n_ctx": self.n_ctx, "pool": self.pool.sizes(), "tokenizer_cache": dict(self.counter.stats),
+                "config": self.config.model_dump()}
+
+
+__all__ = ["ContextGuard", "ContextPool", "Fit", "TokenCounter", "trim_history", "TRIM_MARKER"]
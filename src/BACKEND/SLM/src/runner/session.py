@@ -0,0 +1,283 @@
+"""Stateful generation sessions on top of an :class:`SLMRunner`.
+
+A session owns the transcript of one conversation and feeds it to the model
+incrementally: ``eval(text)`` appends text, ``stream(...)`` samples from the
+current end, and ``keep_generated(n)`` trims what was just sampled back to the
+first ``n`` characters (e.g. at a tool call's closing brace).
+
+* ``LlamaSession`` works on tokens against the live llama.cpp context, so every
+  agent step costs O(new tokens).  If another session used the context in the
+  meantime, the diverged tail of the KV cache is re-evaluated before sampling.
+  A fresh session first asks the runner for a registered prefix (the agent
+  system prompt), which may come from the on-disk prompt-state cache.
+* ``TextSession`` is the fallback: it re-submits the full transcript through
+  ``SLMRunner.generate`` and relies on llama.cpp's prompt-prefix matching.
+"""
+
+import codecs
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple
+
+from .exceptions import GenerationError, ErrorCode
+
+
+def _longest_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _reserved(runner) -> int:
+    """Tokens ``eval`` keeps free for the reply (``ContextConfig``).
+
+    A transcript that leaves less is refused up front, so the agent falls back
+    to ``TextSession`` and ``ContextGuard`` instead of getting an answer cut
+    short by the end of the context.
+    """
+    context = runner.config.context
+    return context.reserve_tokens + context.safety_tokens
+
+
+def _held_back(text: str, stop: Sequence[str]) -> int:
+    """Length of the longest suffix of ``text`` that could still grow into a stop string."""
+    hold = 0
+    for s in stop:
+        for i in range(min(len(s) - 1, len(text)), 0, -1):
+            if text.endswith(s[:i]):
+                hold = max(hold, i)
+                break
+    return hold
+
+
+class TextSession:
+    """Full-prompt fallback: each ``stream`` sends the whole transcript again."""
+
+    incremental = False
+
+    def __init__(self, runner, text: str = ""):
+        self.runner = runner
+        self.text = text
+        self._gen_start = len(text)
+
+    def eval(self, text: str) -> None:
+        self.text += text
+
+    def stream(self, temperature: float, max_tokens: int = 2048,
+               stop: Optional[List[str]] = None, **kwargs) -> Generator[str, None, None]:
+        self._gen_start = len(self.text)
+        stream = self.runner.generate(
+            self.text,
+            raw_prompt=True,
+            stream=True,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stop=stop or [],
+            **kwargs
+        )
+        try:
+            for chunk in stream:
+                piece = chunk["choices"][0]["text"]
+                self.text += piece
+                yield piece
+        finally:
+            stream.close()
+
+    def keep_generated(self, n_chars: int) -> None:
+        self.text = self.text[:self._gen_start + n_chars]
+
+    def close(self) -> None:
+        pass
+
+
+class LlamaSession:
+    """Token-level session bound to the runner's llama.cpp context.
+
+    ``tokens`` are the tokens this session expects to be in the KV cache;
+    ``_pending`` were appended or sampled but not evaluated yet (the last
+    sampled token is only evaluated when decoding resumes).
+    """
+
+    incremental = True
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.text = ""
+        self.tokens: List[int] = []
+        self._pending: List[int] = []
+        self._marks: List[Tuple[int, int]] = []  # (token count, generated chars) per sampled token
+        self._gen_text_start = 0
+        self.stats = {"evaluated_tokens": 0, "reevaluated_tokens": 0, "resyncs": 0,
+                      "reused_tokens": 0, "sampled_tokens": 0}
+
+    # ── bookkeeping ─────────────────────────────────────────────────────────
+    @property
+    def model(self):
+        return self.runner.model
+
+    @property
+    def n_ctx(self) -> int:
+        return self.model.n_ctx()
+
+    def __len__(self) -> int:
+        return len(self.tokens) + len(self._pending)
+
+    def _overflow(self, needed: int) -> GenerationError:
+        return GenerationError(
+            message="Session transcript does not fit in the context window",
+            code=ErrorCode.CONTEXT_LENGTH_EXCEEDED,
+            context={"session_tokens": len(self), "needed": needed, "n_ctx": self.n_ctx},
+        )
+
+    def _is_eog(self, token: int) -> bool:
+        try:
+            import llama_cpp
+            return bool(llama_cpp.llama_token_is_eog(self.model._model.vocab, token))
+        except Exception:
+            return token == self.model.token_eos()
+
+    def _sync(self, extra: Sequence[int] = ()) -> None:
+        """Line the llama context up with this session and queue ``extra``.
+
+        Whatever prefix of the session the context already holds is reused:
+        our own earlier evaluation, a prefix restored from the state cache, or
+        a system prompt another session evaluated.  Another session (or a plain
+        ``generate`` call) may have overwritten the rest, in which case only
+        the diverged tail is re-evaluated.  At least one token is always left
+        pending so that sampling has fresh logits.
+        """
+        model = self.model
+        want = self.tokens + self._pending + list(extra)
+        reuse = _longest_prefix(model.input_ids[:model.n_tokens], want[:len(want) - 1])
+        if reuse < len(self.tokens):
+            self.stats["resyncs"] += 1
+            self.stats["reevaluated_tokens"] += len(self.tokens) - reuse
+        else:
+            self.stats["reused_tokens"] += reuse - len(self.tokens)
+        model.n_tokens = reuse  # drop anything another caller appended after us
+        self.tokens, self._pending = want[:reuse], want[reuse:]
+
+    def _flush(self, keep_last: bool) -> None:
+        """Evaluate pending tokens (optionally leaving the last one for sampling)."""
+        upto = len(self._pending) - 1 if keep_last else len(self._pending)
+        if upto <= 0:
+            return
+        batch = self._pending[:upto]
+        self.model.eval(batch)
+        self.tokens.extend(batch)
+        self._pending = self._pending[upto:]
+        self.stats["evaluated_tokens"] += len(batch)
+
+    # ── public API ──────────────────────────────────────────────────────────
+    def eval(self, text: str, reserve: bool = True) -> int:
+        """Append ``text`` to the transcript and evaluate it; returns its token count.
+
+        With ``reserve``, fails unless ``_reserved`` tokens stay free for the reply.
+        """
+        toks = self.model.tokenize(text.encode("utf-8"), add_bos=len(self) == 0, special=True)
+        if len(self) + len(toks) + (_reserved(self.runner) if reserve else 0) >= self.n_ctx:
+            raise self._overflow(len(toks))
+        with self.runner.lock:
+            if len(self) == 0:
+                self.runner.ensure_prefix(toks)
+            self._sync(toks)
+            self._flush(keep_last=True)
+        self.text += text
+        return len(toks)
+
+    def stream(self, temperature: float, max_tokens: int = 2048,
+               stop: Optional[List[str]] = None, **kwargs) -> Generator[str, None, None]:
+        """Sample from the end of the transcript, yielding decoded text pieces."""
+        stop = stop or []
+        if len(self) == 0:
+            raise GenerationError("Nothing to continue: eval a prompt first", code=ErrorCode.INVALID_PROMPT)
+        budget = min(max_tokens, self.n_ctx - len(self) - 1)
+        if budget <= 0:
+            raise self._overflow(1)
+
+        params: Dict[str, Any] = {
+            k: v for k, v in self.runner.config.generation.model_dump().items()
+            if k in ("top_k", "top_p", "repeat_penalty") and v is not None
+        }
+        params.update({k: v for k, v in kwargs.items() if k in ("top_k", "top_p", "repeat_penalty", "min_p")})
+
+        with self.runner.lock:
+            self._sync()
+            self._flush(keep_last=True)
+
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            self._gen_text_start = len(self.text)
+            self._marks = [(len(self), 0)]
+            generated = ""
+            emitted = 0
+            cut = None
+            gen = self.model.generate(list(self._pending), temp=temperature, reset=False, **params)
+            # model.generate evaluates what we hand it before sampling
+            self.tokens.extend(self._pending)
+            self.stats["evaluated_tokens"] += len(self._pending)
+            self._pending = []
+            try:
+                for i, token in enumerate(gen):
+                    if i > 0:
+                        # the previous sampled token was evaluated to produce this one
+                        self.tokens.append(self._pending.pop())
+                    if self._is_eog(token):
+                        break
+                    self._pending.append(token)
+                    self.stats["sampled_tokens"] += 1
+                    generated += decoder.decode(self.model.detokenize([token]))
+                    self._marks.append((len(self), len(generated)))
+
+                    hit = [s for s in stop if s in generated]
+                    if hit:
+                        cut = min(generated.index(s) for s in hit)
+                        break
+
+                    safe = len(generated) - _held_back(generated, stop)
+                    if safe > emitted:
+                        yield generated[emitted:safe]
+                        emitted = safe
+                    if i + 1 >= budget:
+                        break
+            finally:
+                gen.close()
+                self.text = self.text[:self._gen_text_start] + generated
+
+            if cut is not None:
+                self.keep_generated(cut)
+                generated = generated[:cut]
+            if len(generated) > emitted:
+                yield generated[emitted:]
+
+    def keep_generated(self, n_chars: int) -> None:
+        """Trim the last generation to its first ``n_chars`` characters.
+
+        Rewinds to the last token boundary at or before ``n_chars`` and
+        evaluates the remaining characters as text, so the transcript ends
+        exactly where the caller cut it.
+        """
+        generated = self.text[self._gen_text_start:]
+        n_tok, kept = self._marks[0] if self._marks else (len(self), 0)
+        for count, chars in self._marks:
+            if chars > n_chars:
+                break
+            n_tok, kept = count, chars
+        everything = self.tokens + self._pending
+        evaluated = len(self.tokens)
+        self.tokens = everything[:min(n_tok, evaluated)]
+        self._pending = everything[min(n_tok, evaluated):n_tok]
+        self.text = self.text[:self._gen_text_start] + generated[:kept]
+        self._marks = [m for m in self._marks if m[0] <= n_tok]
+        if n_chars > kept:
+            self.eval(generated[kept:n_chars], reserve=False)  # already generated, so it fits
+
+    def reset(self) -> None:
+        self.text = ""
+        self.tokens, self._pending, self._marks = [], [], []
+
+    def close(self) -> None:
+        self.reset()
+
+
+__all__ = ["LlamaSession", "TextSession"]
@@ -1,13 +1,26 @@
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Iterator, List, Sequence, Union
 from pathlib import Path
+import contextlib
 import logging
-from llama_cpp import Llama
+import os
+import threading
+import time
 
 from ..models.base_models import SLMConfig
 from .exceptions import ModelInitializationError, GenerationError, ErrorCode
+from .session import LlamaSession, TextSession, _longest_prefix
+from .batch_scheduler import BatchScheduler, BatchSession
+from .state_cache import PromptStateCache, apply_state, capture_state
+from .context_guard import ContextGuard
+from ..utils.hashing import file_fingerprint
+from ..utils.lazy import lazy_import
 from ..utils.sanity_checker import SanityChecker
+from ..utils.tracing import span
 from ..prompt_handling import PromptHandler
 
+# imported when the first model is loaded, not when the package is
+llama_cpp = lazy_import("llama_cpp")
+
 model_path_phi4="src/SLM/models/Phi-4-mini-instruct-Q5_K_M.gguf"
 
 class SLMRunner:
@@ -26,6 +39,9 @@ class SLMRunner:
             else SLMConfig.parse_obj(config)
         )
         
+        # One llama context can only decode for one caller at a time
+        self.lock = threading.RLock()
+
         # Set up logging
         self.logger = logging.getLogger(__name__)
         if not self.logger.handlers:
@@ -39,11 +55,29 @@ class SLMRunner:
                 tools_path=current_dir / "prompt_handling/tools.json"
             )
         
-        # Run sanity checks
+        # Timings and memory residency of the startup steps
+        self.startup_report: Dict[str, Any] = {}
+
+        # Tuned thread / batch settings for this host, then sanity checks
+        self._apply_tuning_profile()
         self._run_sanity_checks()
         
-        # Initialize model
+        # Initialize model, then page it in and warm it up
         self._initialize_model()
+        self._preload()
+
+        # Prefixes whose evaluated state is persisted across restarts
+        self._prefixes: Dict[str, List[int]] = {}
+        self.state_cache: Optional[PromptStateCache] = None
+        self._init_state_cache()
+
+        # Prompts longer than the context fall back to a larger one / trimming
+        self.context_guard = ContextGuard(self, self._open_context)
+
+        # Concurrent sessions share llama.cpp batches on a second context
+        self.scheduler: Optional[BatchScheduler] = None
+        if self.config.scheduler.enabled:
+            self.scheduler = BatchScheduler(self)
     
     def _run_sanity_checks(self) -> None:
         """
@@ -69,6 +103,15 @@ class SLMRunner:
                     "This might affect performance."
                 )
             
+            if self.config.hardware.use_mlock:
+                safe, reason = SanityChecker.check_mlock(
+                    self.config.model.model_path, self.config.preload.mlock_headroom_gb
+                )
+                self.startup_report["mlock"] = {"requested": True, "applied": safe, "reason": reason}
+                if not safe:
+                    self.logger.warning(f"Not locking the model in RAM: {reason}")
+                    self.config.hardware.use_mlock = False
+            
             # Update config based on checks
             if self.config.hardware.n_threads is None:
                 self.config.hardware.n_threads = checks["optimal_threads"]
@@ -79,6 +122,37 @@ class SLMRunner:
                     f"(recommended: {checks['recommended_gpu_layers']})."
                 )
     
+    def _apply_tuning_profile(self) -> None:
+        """Fill unset hardware settings from the autotune profile for this CPU and model, if any."""
+        # imported here so `python -m SLM.src.runner.autotune` doesn't find itself preloaded
+        from .autotune import apply_profile, load_profile
+
+        hardware = self.config.hardware
+        model_path = self.config.model.model_path
+        if hardware.profile_dir is None or not self.config.model.is_local or not model_path:
+            return
+        try:
+            profile = load_profile(hardware.profile_dir, model_path)
+        except OSError:
+            return  # missing model; reported by the sanity checks
+        if profile is None:
+            self.logger.info("No autotune profile for this host and model (python -m SLM.src.runner.autotune)")
+            return
+        applied = apply_profile(hardware, profile)
+        if applied:
+            self.logger.info(f"Applied autotune profile from {profile['created']}: {applied}")
+
+    def _llama_kwargs(self) -> Dict[str, Any]:
+        """Hardware arguments for ``Llama``; settings left at None keep llama.cpp's defaults."""
+        hardware = self.config.hardware
+        kwargs = {"n_threads": hardware.n_threads, "n_gpu_layers": hardware.n_gpu_layers}
+        for field in ("n_threads_batch", "n_batch", "n_ubatch", "use_mmap", "use_mlock"):
+            value = getattr(hardware, field)
+            if value is not None:
+                kwargs[field] = value
+        kwargs.update(self.config.model_kwargs)
+        return kwargs
+
     def _initialize_model(self):
         """
         Initialize the llama.cpp model with current configuration.
@@ -88,6 +162,7 @@ class SLMRunner:
             ModelInitializationError: If model initialization fails
             ValueError: If configuration is invalid
         """
+        start = time.perf_counter()
         try:
             # Validate configuration
             self.config.model.validate_configuration()
@@ -105,24 +180,21 @@ class SLMRunner:
                 #     verbose = self.config.model.verbose,
                 #     **self.config.model_kwargs
                 # )
-                self.model = Llama(
+                self.model = llama_cpp.Llama(
                     model_path=model_path_phi4,
                     n_ctx=self.config.model.context_size,
-                    n_threads=self.config.hardware.n_threads,
-                    n_gpu_layers=self.config.hardware.n_gpu_layers,
                     verbose = self.config.model.verbose,
-                    **self.config.model_kwargs
+                    **self._llama_kwargs()
                 )
             else:
                 print(f"Loading local model from {self.config.model.model_path}")
                 self.logger.info(f"Loading model from local path: {self.config.model.model_path}")
-                self.model = Llama(
+                self.model = llama_cpp.Llama(
                     model_path=str(self.config.model.model_path),
                     n_ctx=self.config.model.context_size,
-                    n_threads=self.config.hardware.n_threads,
-                    n_gpu_layers=self.config.hardware.n_gpu_layers,
-                    **self.config.model_kwargs
+                    **self._llama_kwargs()
                 )
+            self.startup_report["load_s"] = round(time.perf_counter() - start, 3)
             self.logger.info("Model initialized successfully")
         except FileNotFoundError as e:
             self.logger.error(f"Model file not found: {str(e)}")
@@ -143,9 +215,144 @@ class SLMRunner:
                 }
             )
 
+    def _open_context(self, n_ctx: int, rope_freq_scale: float = 0.0):
+        """Another context on the same GGUF (weights shared through mmap) for ``ContextGuard``."""
+        kwargs = self._llama_kwargs()
+        if rope_freq_scale:
+            kwargs.update(rope_freq_scale=rope_freq_scale,
+                          rope_scaling_type=llama_cpp.LLAMA_ROPE_SCALING_TYPE_LINEAR)
+        return llama_cpp.Llama(
+            model_path=self.model.model_path,
+            n_ctx=n_ctx,
+            verbose=self.config.model.verbose,
+            **kwargs
+        )
+
+    def _preload(self) -> None:
+        """
+        Page the model file in and run a warm-up generation, per ``config.preload``.
+        
+        Without this the first request pays for page faults across the whole
+        GGUF and for llama.cpp's first-use allocations. Fills ``startup_report``
+        with the time of each step, process RSS and model residency.
+        """
+        preload = self.config.preload
+        model_path = Path(self.model.model_path)
+        mmapped = self.config.hardware.use_mmap is not False
+
+        if preload.page_in and mmapped:
+            start = time.perf_counter()
+            size = self._page_in(model_path)
+            elapsed = time.perf_counter() - start
+            self.startup_report["page_in_s"] = round(elapsed, 3)
+            self.startup_report["page_in_gb_s"] = round(size / (1024**3) / max(elapsed, 1e-9), 2)
+
+        if preload.warmup_tokens:
+            start = time.perf_counter()
+            with self.lock:
+                tokens = self.model.tokenize(preload.warmup_prompt.encode("utf-8"), add_bos=True)
+                for i, _ in enumerate(self.model.generate(tokens, temp=0.0, reset=True)):
+                    if i + 1 >= preload.warmup_tokens:
+                        break
+                self.model.reset()
+            self.startup_report["warmup_s"] = round(time.perf_counter() - start, 3)
+
+        self.startup_report["rss_mb"] = round(SanityChecker.process_rss_mb(), 1)
+        residency = SanityChecker.model_residency(model_path) if mmapped else None
+        # without mmap the weights are read into anonymous memory at load
+        self.startup_report["residency"] = residency or {"fully_resident": not mmapped}
+        self.logger.info(f"Startup report: {self.startup_report}")
+
+    @staticmethod
+    def _page_in(path: Path, chunk: int = 16 << 20) -> int:
+        """Read ``path`` once so its pages are in the page cache llama.cpp maps from; returns its size."""
+        buf = bytearray(chunk)
+        view = memoryview(buf)
+        total = 0
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                n = f.readinto(view)
+                if not n:
+                    return total
+                total += n
+
+    def _init_state_cache(self) -> None:
+        """Open the on-disk prompt-state cache and, if configured, restore the most used state."""
+        cache_cfg = self.config.cache
+        if cache_cfg.state_dir is None:
+            return
+        try:
+            model_key = file_fingerprint(self.model.model_path)
+            self.state_cache = PromptStateCache(cache_cfg.state_dir, model_key, cache_cfg.max_bytes)
+        except OSError as e:
+            self.logger.warning(f"Prompt-state cache disabled: {str(e)}")
+            return
+        if cache_cfg.restore_on_startup:
+            start = time.perf_counter()
+            payload = self.state_cache.load_most_used()
+            if payload is not None:
+                with self.lock:
+                    n = apply_state(self.model, payload)
+                self.logger.info(
+                    f"Restored {n} prompt tokens from {cache_cfg.state_dir} "
+                    f"in {time.perf_counter() - start:.3f}s"
+                )
+
+    def register_prefix(self, text: str) -> int:
+        """
+        Mark ``text`` as a prompt prefix worth persisting (e.g. the agent's
+        system prompt). Sessions starting with it get its state from the
+        cache, or evaluate it once and store it.
+
+        Returns:
+            int: Number of tokens in the prefix
+        """
+        tokens = self._prefixes.get(text)
+        if tokens is None:
+            tokens = self.model.tokenize(text.encode("utf-8"), add_bos=True, special=True)
+            self._prefixes[text] = tokens
+        return len(tokens)
+
+    def ensure_prefix(self, tokens: Sequence[int]) -> int:
+        """
+        Make the llama context hold the registered prefix of ``tokens``, if any.
+
+        Called by sessions before their first evaluation. Loads the prefix
+        state from disk on a cold context; on a cache miss evaluates the
+        prefix alone and persists it.
+
+        Returns:
+            int: Number of prefix tokens now in the context (0 if none matched)
+        """
+        if self.state_cache is None:
+            return 0
+        with self.lock:
+            for prefix in self._prefixes.values():
+                # the last prefix token may merge with the text that follows it
+                n = len(prefix) - 1
+                if n < self.config.cache.min_prefix_tokens or list(tokens[:n]) != prefix[:n]:
+                    continue
+                held = _longest_prefix(self.model.input_ids[:self.model.n_tokens], prefix)
+                if held >= n and prefix in self.state_cache:
+                    return held
+                if held < n:
+                    payload = self.state_cache.load(prefix)
+                    if payload is not None:
+                        return apply_state(self.model, payload)
+                # Evaluate whatever the context lacks; eval() also drops the KV
+                # cells past the prefix so the stored state holds the prefix only
+                self.model.n_tokens = held
+                self.model.eval(prefix[held:])
+                self.state_cache.store(capture_state(self.model))
+                return len(prefix)
+        return 0
+
     def generate(self, 
                 user_query: str,
                 system_behavior: Optional[str] = None,
+                raw_prompt: bool = False,
                 **kwargs) -> Dict[str, Any]:
         """
         Generate text using the model with structured prompts and tools.
@@ -153,13 +360,18 @@ class SLMRunner:
         Args:
             user_query (str): The user's query or instruction
             system_behavior (str, optional): Override default system behavior
+            raw_prompt (bool): Send ``user_query`` verbatim, skipping the prompt
+                handler / template. Callers that extend the previous prompt
+                (the agent loop) need this so llama.cpp can reuse the KV cache.
             **kwargs: Override default generation parameters
             
         Returns:
             Dict[str, Any]: Generation results including generated text and metadata
         """
         # Construct prompt based on configuration
-        if self.config.model.use_prompt and self.prompt_handler:
+        if raw_prompt:
+            prompt = user_query
+        elif self.config.model.use_prompt and self.prompt_handler:
             if system_behavior:
                 self.prompt_handler.system_behavior = system_behavior
             prompt = self.prompt_handler.construct_prompt(user_query)
@@ -189,10 +401,19 @@ class SLMRunner:
             #     response += chunk["choices"][0]["text"]
             #     print(chunk["choices"][0]["text"], end="", flush=True)
 
-            response = self.model(
-                prompt,
-                **params
-            )
+            with span("runner.generate", prompt_chars=len(prompt), max_tokens=params.get("max_tokens")) as sp:
+                fit = self.context_guard.fit(prompt, params.get("max_tokens"))
+                if fit.strategy is not None:
+                    sp.set(context_fallback=fit.strategy, prompt_tokens=fit.prompt_tokens, n_ctx=fit.n_ctx)
+                    params["stopping_criteria"] = llama_cpp.StoppingCriteriaList(
+                        [*(params.get("stopping_criteria") or ()), fit.expired])
+                    if params.get("stream"):
+                        return self._fallback_stream(fit, params)
+                with fit.lock or contextlib.nullcontext():
+                    response = fit.model(fit.prompt, **params)
+                if isinstance(response, dict):
+                    sp.set(**response.get("usage", {}))
+                    self._check_deadline(fit)
 
             return response
             # return {
@@ -204,13 +425,20 @@ class SLMRunner:
             #     "status": "success"
             # }
         
+        except GenerationError:
+            raise
         except Exception as e:
             error_msg = f"Generation failed: {str(e)}"
             self.logger.error(error_msg)
+            if "context window" in str(e):
+                code = ErrorCode.CONTEXT_LENGTH_EXCEEDED
+            elif "parameter" in str(e).lower():
+                code = ErrorCode.INVALID_PARAMETERS
+            else:
+                code = ErrorCode.UNKNOWN_ERROR
             raise GenerationError(
                 message=error_msg,
-                code=ErrorCode.INVALID_PARAMETERS if "parameter" in str(e).lower() 
-                     else ErrorCode.UNKNOWN_ERROR,
+                code=code,
                 context={
                     "query_length": len(user_query),
                     "params": params,
@@ -218,11 +446,46 @@ class SLMRunner:
                 }
             )
     
+    def _fallback_stream(self, fit, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Stream on ``fit``'s context, holding its lock (pooled contexts) while decoding."""
+        with fit.lock or contextlib.nullcontext():
+            stream = fit.model(fit.prompt, **params)
+            try:
+                yield from stream
+            finally:
+                stream.close()
+                self._check_deadline(fit)
+
+    def _check_deadline(self, fit) -> None:
+        if fit.expired():
+            self.logger.warning("generation stopped at the %.0fs deadline for %s", self.config.context.deadline_s,
+                                fit.strategy)
+            self.context_guard.deadline_hit()
+
+    def open_session(self, incremental: Optional[bool] = None) -> Union[LlamaSession, BatchSession, TextSession]:
+        """
+        Open a stateful generation session for one conversation.
+
+        Args:
+            incremental: Token-level session (default from
+                ``config.model.incremental_prompt``); decoded by the batch
+                scheduler if it is enabled, else on the live llama context.
+                ``False`` gives a session that re-submits the full transcript
+                every step.
+        """
+        if incremental is None:
+            incremental = self.config.model.incremental_prompt
+        if not incremental:
+            return TextSession(self)
+        return self.scheduler.open_session() if self.scheduler is not None else LlamaSession(self)
+
     def __del__(self):
         """
         Cleanup when the instance is deleted.
         The Llama instance and its resources will be automatically cleaned up.
         """
+        if getattr(self, 'scheduler', None) is not None:
+            self.scheduler.stop()
         if hasattr(self, 'model'):
             try:
                 del self.model
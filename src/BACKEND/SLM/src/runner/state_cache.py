@@ -0,0 +1,197 @@
+"""On-disk cache of evaluated llama.cpp prompt states.
+
+Evaluating the long agent system prompt dominates time-to-first-token after a
+restart.  ``PromptStateCache`` keeps the serialized context state (KV cache +
+token ids) of registered prefixes in a local directory so a fresh process can
+load it instead of re-evaluating.
+
+Layout::
+
+    <directory>/index.json                       # key -> metadata (size, hits, last use)
+    <directory>/<model fingerprint>/<prefix>.kv  # pickled state blob
+
+Keys are ``<model fingerprint>/<prefix token hash>``: a changed GGUF file never
+matches old states.  The directory is capped at ``max_bytes``; the least
+recently used states are evicted first.
+"""
+
+import ctypes
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from ..utils.hashing import tokens_hash
+
+logger = logging.getLogger(__name__)
+
+
+# ── llama context <-> bytes ─────────────────────────────────────────────────
+def capture_state(model) -> Dict[str, Any]:
+    """Serialize the live context of ``model`` (a ``llama_cpp.Llama``).
+
+    Unlike ``Llama.save_state`` this skips the Python-side logits copy, which
+    is ``n_batch x n_vocab`` floats (hundreds of MB for a 200k vocabulary).
+    """
+    import llama_cpp
+
+    ctx = model._ctx.ctx
+    size = llama_cpp.llama_state_get_size(ctx)
+    buf = (ctypes.c_uint8 * size)()
+    n = llama_cpp.llama_state_get_data(ctx, buf, size)
+    return {
+        "tokens": [int(t) for t in model.input_ids[:model.n_tokens]],
+        "state": ctypes.string_at(buf, n),
+    }
+
+
+def apply_state(model, payload: Dict[str, Any]) -> int:
+    """Load a ``capture_state`` payload into ``model``; returns the restored token count."""
+    import llama_cpp
+
+    data = payload["state"]
+    buf = (ctypes.c_uint8 * len(data)).from_buffer_copy(data)
+    if llama_cpp.llama_state_set_data(model._ctx.ctx, buf, len(data)) != len(data):
+        raise RuntimeError("Failed to set llama state data")
+    tokens = payload["tokens"]
+    model.input_ids[:len(tokens)] = tokens
+    model.n_tokens = len(tokens)
+    return len(tokens)
+
+
+# ── cache ───────────────────────────────────────────────────────────────────
+class PromptStateCache:
+    """Size-capped LRU directory of prompt states for one model."""
+
+    INDEX = "index.json"
+
+    def __init__(self, directory: Union[str, Path], model_key: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.model_key = model_key
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        (self.directory / model_key).mkdir(parents=True, exist_ok=True)
+        self._index = self._read_index()
+
+    # ── index ───────────────────────────────────────────────────────────────
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.directory / self.INDEX) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # drop entries whose blob disappeared
+        return {k: v for k, v in index.items() if (self.directory / f"{k}.kv").exists()}
+
+    def _write_index(self) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".index-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.directory / self.INDEX)
+
+    def _key(self, tokens: Sequence[int]) -> str:
+        return f"{self.model_key}/{tokens_hash(tokens)}"
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._index.values())
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Metadata of this model's states, most used first."""
+        mine = [dict(e, key=k) for k, e in self._index.items() if e["model"] == self.model_key]
+        return sorted(mine, key=lambda e: (e["hits"], e["last_used"]), reverse=True)
+
+    # ── public API ──────────────────────────────────────────────────────────
+    def __contains__(self, tokens: Sequence[int]) -> bool:
+        return self._key(tokens) in self._index
+
+    def load(self, tokens: Sequence[int]) -> Optional[Dict[str, Any]]:
+        """Payload stored for exactly ``tokens``, or ``None``."""
+        return self._load_key(self._key(tokens))
+
+    def load_most_used(self) -> Optional[Dict[str, Any]]:
+        for entry in self.entries():
+            payload = self._load_key(entry["key"])
+            if payload is not None:
+                return payload
+        return None
+
+    def _load_key(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            try:
+                with open(self.directory / f"{key}.kv", "rb") as f:
+                    payload = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as exc:
+                logger.warning("dropping unreadable prompt state %s: %s", key, exc)
+                self._remove(key)
+                self._write_index()
+                self.stats["misses"] += 1
+                return None
+            entry["hits"] += 1
+            entry["last_used"] = time.time()
+            self._write_index()
+            self.stats["hits"] += 1
+            return payload
+
+    def store(self, payload: Dict[str, Any]) -> Optional[str]:
+        """Persist a ``capture_state`` payload; returns its key (``None`` if it exceeds the cap)."""
+        blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            logger.warning("prompt state of %d bytes exceeds the %d byte cache cap", len(blob), self.max_bytes)
+            return None
+        key = self._key(payload["tokens"])
+        path = self.directory / f"{key}.kv"
+        with self._lock:
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".kv-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+            now = time.time()
+            old = self._index.get(key, {})
+            self._index[key] = {
+                "model": self.model_key,
+                "n_tokens": len(payload["tokens"]),
+                "bytes": len(blob),
+                "hits": old.get("hits", 0),
+                "created": now,
+                "last_used": now,
+            }
+            self._evict()
+            self._write_index()
+            self.stats["stores"] += 1
+        return key
+
+    def _evict(self) -> None:
+        total = self.total_bytes
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key]["bytes"]
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        self._index.pop(key, None)
+        try:
+            os.remove(self.directory / f"{key}.kv")
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in [k for k, e in self._index.items() if e["model"] == self.model_key]:
+                self._remove(key)
+            self._write_index()
+
+
+__all__ = ["PromptStateCache", "capture_state", "apply_state"]
@@ -0,0 +1,89 @@
+"""Shared thread pools for the backend.
+
+* tool executor      – synchronous (mostly I/O-bound) tools called from async code
+* inference executor – blocking llama.cpp calls kept off the event loop
+* T5 executor        – seq2seq calls (``/infer_t5``, query rewrite, translation),
+  so they never queue behind a long Phi generation
+
+Pool sizes come from ``SLAM_TOOL_WORKERS``, ``SLAM_INFERENCE_WORKERS`` and ``SLAM_T5_WORKERS``.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .profiling import bind as _profiled
+
+_tool_executor: Optional[ThreadPoolExecutor] = None
+_inference_executor: Optional[ThreadPoolExecutor] = None
+_t5_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    global _tool_executor
+    if _tool_executor is None:
+        with _lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("SLAM_TOOL_WORKERS", 8)),
+                    thread_name_prefix="slam-tool",
+                )
+    return _tool_executor
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    global _inference_executor
+    if _inference_executor is None:
+        with _lock:
+            if _inference_executor is None:
+                _inference_executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("SLAM_INFERENCE_WORKERS", 2)),
+                    thread_name_prefix="slam-infer",
+                )
+    return _inference_executor
+
+
+def get_t5_executor() -> ThreadPoolExecutor:
+    global _t5_executor
+    if _t5_executor is None:
+        with _lock:
+            if _t5_executor is None:
+                _t5_executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("SLAM_T5_WORKERS", 1)),
+                    thread_name_prefix="slam-t5",
+                )
+    return _t5_executor
+
+
+async def run_in_executor(executor: ThreadPoolExecutor, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """``loop.run_in_executor`` that also carries kwargs and the caller's contextvars.
+
+    Under a per-request profile (``profiling``) the call is profiled in the worker thread too.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, _profiled(fn), *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    global _tool_executor, _inference_executor, _t5_executor
+    with _lock:
+        for pool in (_tool_executor, _inference_executor, _t5_executor):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        _tool_executor = _inference_executor = _t5_executor = None
+
+
+__all__ = [
+    "get_tool_executor",
+    "get_inference_executor",
+    "get_t5_executor",
+    "run_in_executor",
+    "shutdown_executors",
+]
@@ -0,0 +1,39 @@
+"""Cheap content fingerprints used as cache keys.
+
+``file_fingerprint`` samples a handful of fixed windows instead of reading the
+whole file, so fingerprinting a multi-GB GGUF costs a few MB of I/O.
+"""
+
+import os
+from array import array
+from pathlib import Path
+from typing import Iterable, Union
+
+import xxhash
+
+_WINDOW = 1 << 20  # 1 MiB
+_N_WINDOWS = 8
+
+
+def file_fingerprint(path: Union[str, Path], window: int = _WINDOW, n_windows: int = _N_WINDOWS) -> str:
+    """xxh3-128 over the file size and ``n_windows`` evenly spaced windows (head and tail included)."""
+    size = os.path.getsize(path)
+    h = xxhash.xxh3_128()
+    h.update(size.to_bytes(8, "little"))
+    with open(path, "rb") as f:
+        if size <= window * n_windows:
+            h.update(f.read())
+        else:
+            step = (size - window) // (n_windows - 1)
+            for i in range(n_windows):
+                f.seek(i * step)
+                h.update(f.read(window))
+    return h.hexdigest()
+
+
+def tokens_hash(tokens: Iterable[int]) -> str:
+    """Stable hash of a token id sequence."""
+    return xxhash.xxh3_128_hexdigest(array("i", tokens).tobytes())
+
+
+__all__ = ["file_fingerprint", "tokens_hash"]
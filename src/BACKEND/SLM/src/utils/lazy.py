@@ -0,0 +1,63 @@
+"""Deferred imports for heavy optional dependencies.
+
+``torch``, ``transformers``, ``peft`` and ``llama_cpp`` each take from
+hundreds of milliseconds to seconds to import.  Modules that only need them
+on some code paths bind them with ``lazy_import`` instead:
+
+    torch = lazy_import("torch")
+    ...
+    torch.cuda.is_available()   # first attribute access performs the import
+
+so importing the module itself stays cheap.  Measure with
+``python -m benchmarks.bench_import``.
+"""
+
+import importlib
+import sys
+import threading
+import types
+from typing import Any
+
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """The module ``name`` if it is already imported, otherwise a ``LazyModule`` for it."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    """Whether ``name`` has actually been imported (not just bound lazily)."""
+    return name in sys.modules
+
+
+__all__ = ["LazyModule", "lazy_import", "is_loaded"]
@@ -0,0 +1,358 @@
+"""Opt-in per-request profiling.
+
+A request to a profiled path (``/slam``, ``/infer_t5``, ``/OCR``) sent with
+``X-SLAM-Profile: cprofile|sample`` (or ``?profile=cprofile|sample``; ``1``
+means ``cprofile``) runs under a profiler:
+
+* ``cprofile`` – deterministic; one ``cProfile.Profile`` on the event-loop
+  thread plus one per executor call of the request (``run_in_executor``
+  binds them), merged into a ``.prof`` file for pstats / snakeviz;
+* ``sample``   – a thread records the stacks of the threads working on the
+  request every ``SLAM_PROFILE_INTERVAL_MS`` (5 ms) as collapsed stacks
+  (``.folded``, for flamegraph.pl / speedscope).
+
+Event-loop numbers also include other requests' coroutines that ran in the
+meantime.  One capture runs at a time and at most ``SLAM_PROFILE_PER_MIN``
+(6) start per minute; a request over the cap runs unprofiled and gets
+``x-profile: skipped``.  The last ``SLAM_PROFILE_KEEP`` (32) profiles are
+kept in ``SLAM_PROFILE_DIR`` and served by ``GET /admin/profiles``.
+
+Without the flag the cost is a header lookup on the profiled paths and one
+``ContextVar.get`` per executor call.
+"""
+
+import contextlib
+import contextvars
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs
+
+MODES = ("cprofile", "sample")
+PROFILE_DIR = Path(os.environ.get("SLAM_PROFILE_DIR", Path(__file__).parents[3] / "output" / "profiles"))
+PER_MINUTE = float(os.environ.get("SLAM_PROFILE_PER_MIN", 6))
+KEEP = int(os.environ.get("SLAM_PROFILE_KEEP", 32))
+INTERVAL_S = float(os.environ.get("SLAM_PROFILE_INTERVAL_MS", 5)) / 1e3
+
+_SUFFIX = {"cprofile": ".prof", "sample": ".folded"}
+_active: contextvars.ContextVar[Optional["Capture"]] = contextvars.ContextVar("slam_profile", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Capture:
+    """Profile of one request, collected across the threads that work on it."""
+
+    def __init__(self, mode: str, name: str, trace_id: Optional[str] = None, interval: float = INTERVAL_S):
+        self.id = uuid.uuid4().hex[:16]
+        self.mode = mode
+        self.name = name
+        self.trace_id = trace_id
+        self.interval = interval
+        self.started = time.time()
+        self.seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._profiles: List[Any] = []
+        self._threads: Counter = Counter()
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._loop_profile = None
+        self._t0 = 0.0
+
+    # ── collection ───────────────────────────────────────────────────────────
+    def start(self) -> None:
+        self._t0 = time.perf_counter()
+        if self.mode == "cprofile":
+            self._loop_profile = self._enable()
+        else:
+            self._threads[threading.get_ident()] += 1
+            self._sampler = threading.Thread(target=self._sample, name="slam-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._loop_profile is not None:
+            self._loop_profile.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        self.seconds = time.perf_counter() - self._t0
+
+    def _enable(self):
+        import cProfile
+
+        if sys.getprofile() is not None:  # the thread is already profiled (another tool)
+            return None
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+        return profile
+
+    @contextlib.contextmanager
+    def thread(self):
+        """Profile the calling thread while it works on the request."""
+        if self.mode == "cprofile":
+            profile = self._enable()
+            try:
+                yield
+            finally:
+                if profile is not None:
+                    profile.disable()
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if self._threads[ident] <= 0:
+                    del self._threads[ident]
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                idents = [i for i in self._threads if i != own]
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    # ── output ───────────────────────────────────────────────────────────────
+    def save(self, directory: Path) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.id}{_SUFFIX[self.mode]}"
+        if self.mode == "cprofile":
+            import pstats
+
+            profiles = [p for p in self._profiles if p.getstats()]
+            if profiles:
+                stats = pstats.Stats(profiles[0])
+                for p in profiles[1:]:
+                    stats.add(p)
+                stats.dump_stats(path)
+            else:
+                path.write_bytes(b"")
+        else:
+            path.write_text("".join(f"{stack} {n}\n" for stack, n in self._stacks.most_common()), encoding="utf-8")
+        return path
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "started": self.started,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "threads": len(self._profiles) if self.mode == "cprofile" else None,
+            "samples": self._samples if self.mode == "sample" else None,
+        }
+
+
+def bind(fn: Callable) -> Callable:
+    """``fn`` profiled under the caller's capture, if any (used by ``run_in_executor``)."""
+    capture = _active.get()
+    if capture is None:
+        return fn
+
+    @functools.wraps(fn)
+    def profiled(*args, **kwargs):
+        with capture.thread():
+            return fn(*args, **kwargs)
+    return profiled
+
+
+# ── captures and storage ──────────────────────────────────────────────────────
+class Profiler:
+    """Rate-capped captures, kept on disk with an index of the last ``keep``."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, per_minute: float = PER_MINUTE, keep: int = KEEP):
+        self.directory = Path(directory)
+        self.per_minute = per_minute
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._tokens = per_minute
+        self._refilled = time.monotonic()
+        self._running = False
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._counters = {"captured": 0, "skipped": 0}
+        for meta_path in sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime):
+            try:
+                meta = json.loads(meta_path.read_text())
+                self._index[meta["id"]] = meta
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def begin(self, mode: str, name: str, trace_id: Optional[str] = None) -> Optional[Capture]:
+        """A started capture, or None if one is running or the rate cap is reached."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.per_minute, self._tokens + (now - self._refilled) * self.per_minute / 60)
+            self._refilled = now
+            if self._running or self._tokens < 1:
+                self._counters["skipped"] += 1
+                return None
+            self._tokens -= 1
+            self._running = True
+        capture = Capture(mode, name, trace_id)
+        capture.start()
+        return capture
+
+    def end(self, capture: Capture) -> Dict[str, Any]:
+        try:
+            capture.stop()
+            path = capture.save(self.directory)
+            meta = {**capture.meta(), "file": path.name, "bytes": path.stat().st_size}
+            (self.directory / f"{capture.id}.json").write_text(json.dumps(meta))
+        finally:
+            with self._lock:
+                self._running = False
+        with self._lock:
+            self._counters["captured"] += 1
+            self._index[capture.id] = meta
+            evicted = []
+            while len(self._index) > self.keep:
+                evicted.append(self._index.popitem(last=False)[1])
+        for old in evicted:
+            for name in (old.get("file"), f"{old['id']}.json"):
+                if name:
+                    (self.directory / name).unlink(missing_ok=True)
+        return meta
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._index.values()))
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        with self._lock:
+            meta = self._index.get(profile_id)
+        return self.directory / meta["file"] if meta else None
+
+    def summary(self, profile_id: str, limit: int = 40) -> Optional[str]:
+        """Readable top functions: cumulative time (cprofile) or self samples (sample)."""
+        path = self.path(profile_id)
+        if path is None or not path.exists():
+            return None
+        if path.suffix == ".prof":
+            import pstats
+
+            if path.stat().st_size == 0:
+                return "empty profile\n"
+            out = io.StringIO()
+            pstats.Stats(str(path), stream=out).sort_stats("cumulative").print_stats(limit)
+            return out.getvalue()
+        leaves: Counter = Counter()
+        total = 0
+        for line in path.read_text(encoding="utf-8").splitlines():
+            stack, _, n = line.rpartition(" ")
+            leaves[stack.rsplit(";", 1)[-1]] += int(n)
+            total += int(n)
+        rows = [f"{n:>8}{n / max(total, 1):>8.1%}  {frame}" for frame, n in leaves.most_common(limit)]
+        return f"{total} samples, self time by frame\n" + "\n".join(rows) + "\n"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "stored": len(self._index), "running": self._running,
+                    "per_minute": self.per_minute, "tokens": round(self._tokens, 2)}
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
+
+
+def requested_mode(scope) -> Optional[str]:
+    """Profile mode asked for by an ASGI request (header first, then query), or None."""
+    value = None
+    for key, raw in scope.get("headers") or ():
+        if key == b"x-slam-profile":
+            value = raw.decode("latin-1")
+            break
+    if value is None and b"profile=" in scope.get("query_string", b""):
+        value = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [None])[0]
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes"):
+        return "cprofile"
+    return value if value in MODES else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware capturing a profile for flagged requests to ``paths``.
+
+    The response carries ``x-profile-id`` (download from
+    ``/admin/profiles/<id>``) or ``x-profile: skipped`` when capped.
+    """
+
+    def __init__(self, app, paths: Iterable[str] = ("/slam", "/infer_t5", "/OCR")):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") not in self.paths:
+            return await self.app(scope, receive, send)
+        mode = requested_mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        from .tracing import current_span
+
+        profiler = get_profiler()
+        capture = profiler.begin(mode, f"{scope['method']} {scope['path']}", current_span().trace_id)
+        header = (b"x-profile-id", capture.id.encode()) if capture else (b"x-profile", b"skipped")
+
+        async def send_profiled(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), header]}
+            await send(message)
+
+        if capture is None:
+            return await self.app(scope, receive, send_profiled)
+        token = _active.set(capture)
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            _active.reset(token)
+            profiler.end(capture)
+
+
+__all__ = [
+    "Capture",
+    "Profiler",
+    "ProfilingMiddleware",
+    "bind",
+    "get_profiler",
+    "requested_mode",
+    "MODES",
+]
@@ -1,7 +1,13 @@
+import os
+import resource
 import psutil
-import torch
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
+
+from .lazy import lazy_import
+
+# only needed for the GPU probe; importing it costs seconds
+torch = lazy_import("torch")
 
 class SanityChecker:
     """Utility class for performing system checks and optimizations."""
@@ -62,20 +68,97 @@ class SanityChecker:
         return True, gpu_name, recommended_layers
     
     @staticmethod
-    def check_system_memory() -> Tuple[float, bool]:
+    def check_system_memory(required_gb: float = 8.0) -> Tuple[float, bool]:
         """
         Check available system memory.
         
+        Args:
+            required_gb (float): Memory that must be available
+            
         Returns:
             Tuple[float, bool]:
                 - Available memory in GB
-                - Whether there's enough memory (>8GB)
+                - Whether there's enough memory (> required_gb, 8GB by default)
         """
         memory = psutil.virtual_memory()
         available_gb = memory.available / (1024**3)
         
-        # Consider system has enough memory if >8GB available
-        return available_gb, available_gb > 8
+        return available_gb, available_gb > required_gb
+    
+    @classmethod
+    def check_mlock(cls, model_path: Path, headroom_gb: float = 2.0) -> Tuple[bool, str]:
+        """
+        Decide whether the model can be locked in RAM with ``use_mlock``.
+        
+        Locking fails (or starves everything else) unless the whole file fits
+        in available memory with ``headroom_gb`` to spare and RLIMIT_MEMLOCK
+        allows it.
+        
+        Args:
+            model_path (Path): Path to the model file
+            headroom_gb (float): Memory that must stay available besides the model
+            
+        Returns:
+            Tuple[bool, str]: Whether mlock is safe, and why not if it isn't
+        """
+        model_gb = model_path.stat().st_size / (1024**3)
+        available_gb, enough = cls.check_system_memory(model_gb + headroom_gb)
+        if not enough:
+            return False, (
+                f"model needs {model_gb:.2f}GB + {headroom_gb:.2f}GB headroom, "
+                f"{available_gb:.2f}GB available"
+            )
+        soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+        if soft != resource.RLIM_INFINITY and soft < model_path.stat().st_size:
+            return False, (
+                f"RLIMIT_MEMLOCK is {soft / (1024**2):.0f}MB "
+                "(raise it with `ulimit -l unlimited` or the container's memlock ulimit)"
+            )
+        return True, ""
+    
+    @staticmethod
+    def model_residency(model_path: Path) -> Optional[Dict[str, Any]]:
+        """
+        How much of a memory-mapped model file this process holds in RAM.
+        
+        Sums the ``/proc/self/smaps`` entries that map ``model_path``.
+        
+        Returns:
+            Optional[dict]: ``mapped_mb``, ``resident_mb``, ``locked_mb`` and
+            ``fully_resident``; None if the file is not mapped (e.g. loaded
+            without mmap) or smaps is unavailable
+        """
+        target = str(Path(model_path).resolve())
+        totals = {"Size": 0, "Rss": 0, "Locked": 0}
+        matched = False
+        try:
+            with open("/proc/self/smaps") as f:
+                current = False
+                for line in f:
+                    key, _, rest = line.partition(":")
+                    if key in totals:
+                        if current:
+                            totals[key] += int(rest.split()[0])
+                    elif " " in key or "-" in key:
+                        # mapping header: address perms offset dev inode [path]
+                        fields = line.split(None, 5)
+                        current = len(fields) == 6 and fields[5].strip() == target
+                        matched |= current
+        except OSError:
+            return None
+        if not matched:
+            return None
+        return {
+            "mapped_mb": round(totals["Size"] / 1024, 1),
+            "resident_mb": round(totals["Rss"] / 1024, 1),
+            "locked_mb": round(totals["Locked"] / 1024, 1),
+            "fully_resident": totals["Rss"] >= totals["Size"],
+        }
+    
+    @staticmethod
+    def process_rss_mb() -> float:
+        """Resident set size of this process in MB."""
+        return psutil.Process(os.getpid()).memory_info().rss / (1024**2)
     
     @classmethod
     def run_all_checks(cls, model_path: Path) -> dict:
@@ -0,0 +1,405 @@
+"""Lightweight request tracing.
+
+A trace is the tree of spans of one chat turn: the UI starts it in
+``BackendInterface.get_agent_response`` and sends a W3C ``traceparent``
+header with each call; the backend middleware opens a server span under it
+and everything below - router, T5 rewrite, agent steps, prompt eval,
+decode, tools - nests through a ``contextvars`` variable, so spans follow
+the request into executor threads (``run_in_executor`` copies the context).
+
+Outside a trace ``span()`` is a no-op, so instrumented code costs one
+``ContextVar.get`` when nothing is traced.  Finished spans are appended as
+JSON lines (OTLP field names) to ``SLAM_TRACE_FILE`` (``output/traces.jsonl``,
+rotated at ``SLAM_TRACE_MAX_MB``); ``SLAM_TRACING=0`` turns tracing off.
+
+Breakdown per request, from ``src/BACKEND``:
+    python -m SLM.src.utils.tracing                 # last trace
+    python -m SLM.src.utils.tracing --last 5
+    python -m SLM.src.utils.tracing --trace <trace id>
+    python -m SLM.src.utils.tracing --otlp traces.json   # OTLP/JSON export
+"""
+
+import argparse
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ENABLED = os.environ.get("SLAM_TRACING", "1").lower() not in ("0", "false", "no", "off")
+TRACE_FILE = Path(os.environ.get("SLAM_TRACE_FILE", Path(__file__).parents[3] / "output" / "traces.jsonl"))
+MAX_BYTES = int(float(os.environ.get("SLAM_TRACE_MAX_MB", 64)) * (1 << 20))
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    """One timed operation; ``parent_id`` is None for a root started without a ``traceparent``."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def traceparent(self) -> str:
+        """W3C header value making this span the parent of the callee's spans."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span outside a trace."""
+
+    __slots__ = ()
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("slam_span", default=None)
+
+
+# ── export ────────────────────────────────────────────────────────────────────
+class SpanExporter:
+    """Appends finished spans to a JSON-lines file; flushed at the end of each trace."""
+
+    def __init__(self, path: Path = TRACE_FILE, max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self.exported = 0
+
+    def export(self, spans: Iterable[Dict[str, Any]], flush: bool = False) -> None:
+        lines = "".join(json.dumps(s, default=str) + "\n" for s in spans)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(lines)
+            self.exported += lines.count("\n")
+            if flush:
+                self._file.flush()
+                if self._file.tell() > self.max_bytes:
+                    self._file.close()
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+                    self._file = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = SpanExporter()
+    return _exporter
+
+
+def _finish(span: Span, token: contextvars.Token, error: Optional[BaseException], flush: bool = False) -> None:
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.status = "error"
+        span.attributes["error"] = repr(error)
+    try:
+        _current.reset(token)
+    except ValueError:  # ended in another context (e.g. a generator closed elsewhere)
+        pass
+    get_exporter().export([span.to_dict()], flush=flush)
+
+
+# ── instrumentation API ───────────────────────────────────────────────────────
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace id, parent span id) from a ``traceparent`` header, or None if absent / malformed."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    return match.groups() if match else None
+
+
+def current_span():
+    """The active span, or ``NOOP_SPAN`` outside a trace."""
+    return _current.get() or NOOP_SPAN
+
+
+@contextlib.contextmanager
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Iterator[Any]:
+    """
+    Open the root span of this process for a request.
+
+    Args:
+        name: span name, e.g. "POST /slam"
+        traceparent: the caller's header; the span joins that trace (else a new one starts)
+        **attributes: recorded on the span
+    """
+    if not ENABLED:
+        yield NOOP_SPAN
+        return
+    parent = parse_traceparent(traceparent)
+    trace_id, parent_id = parent if parent else (secrets.token_hex(16), None)
+    root = Span(trace_id, parent_id, name, attributes)
+    token = _current.set(root)
+    error = None
+    try:
+        yield root
+    except GeneratorExit:  # an instrumented generator closed early
+        raise
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        _finish(root, token, error, flush=True)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """Child span of the active one; a no-op yielding ``NOOP_SPAN`` outside a trace."""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(parent.trace_id, parent.span_id, name, attributes)
+    token = _current.set(child)
+    error = None
+    try:
+        yield child
+    except GeneratorExit:
+        raise
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        _finish(child, token, error)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator running each call of a function or coroutine function in a ``span``."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with span(label):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def ingest(spans: List[Dict[str, Any]]) -> int:
+    """Store spans recorded by another process (the UI); returns how many were kept."""
+    kept = [
+        {key: s.get(key) for key in ("traceId", "spanId", "parentSpanId", "name",
+                                     "startTimeUnixNano", "endTimeUnixNano", "attributes", "status")}
+        for s in spans
+        if isinstance(s, dict) and re.fullmatch(r"[0-9a-f]{32}", str(s.get("traceId", "")))
+        and re.fullmatch(r"[0-9a-f]{16}", str(s.get("spanId", "")))
+        and isinstance(s.get("startTimeUnixNano"), int) and isinstance(s.get("endTimeUnixNano"), int)
+    ]
+    if ENABLED and kept:
+        get_exporter().export(kept, flush=True)
+    return len(kept)
+
+
+class TracingMiddleware:
+    """ASGI middleware: one root span per HTTP request, joining the caller's ``traceparent``.
+
+    The span lasts until the response body is sent, so streamed responses
+    are timed in full; the trace id is returned in ``x-trace-id``.
+    """
+
+    def __init__(self, app, skip: Iterable[str] = ("/ping", "/traces")):
+        self.app = app
+        self.skip = frozenset(skip)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not ENABLED or path in self.skip or path.endswith("_stats"):
+            return await self.app(scope, receive, send)
+        header = dict(scope.get("headers") or ()).get(b"traceparent", b"").decode("latin-1")
+        with start_trace(f"{scope['method']} {path}", header) as root:
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    root.set(status_code=message["status"])
+                    if message["status"] >= 500:
+                        root.status = "error"
+                    message = {**message, "headers": [*message.get("headers", ()),
+                                                      (b"x-trace-id", root.trace_id.encode())]}
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
+
+
+# ── reading / CLI ─────────────────────────────────────────────────────────────
+def load_traces(paths: Iterable[Path]) -> Dict[str, List[Dict[str, Any]]]:
+    """Spans grouped by trace id, traces in order of first appearance."""
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    s = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash
+                traces.setdefault(s["traceId"], []).append(s)
+    return traces
+
+
+def _ms(ns: int) -> float:
+    return ns / 1e6
+
+
+def render_trace(spans: List[Dict[str, Any]], width: int = 40) -> str:
+    """Indented span tree with durations, self times and a timeline bar per span."""
+    ids = {s["spanId"] for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        children[s["parentSpanId"] if s["parentSpanId"] in ids else None].append(s)
+    for group in children.values():
+        group.sort(key=lambda s: s["startTimeUnixNano"])
+
+    t0 = min(s["startTimeUnixNano"] for s in spans)
+    t1 = max(s["endTimeUnixNano"] for s in spans)
+    scale = width / max(t1 - t0, 1)
+    roots = children[None]
+    lines = [f"trace {spans[0]['traceId']}  {roots[0]['name']}  {_ms(t1 - t0):.1f} ms  ({len(spans)} spans)",
+             f"{'span':<44}{'total ms':>10}{'self ms':>10}  timeline"]
+    self_time: Dict[str, float] = defaultdict(float)
+
+    def walk(s: Dict[str, Any], depth: int) -> None:
+        total = s["endTimeUnixNano"] - s["startTimeUnixNano"]
+        own = total - sum(c["endTimeUnixNano"] - c["startTimeUnixNano"] for c in children[s["spanId"]])
+        self_time[s["name"]] += _ms(max(own, 0))
+        offset = int((s["startTimeUnixNano"] - t0) * scale)
+        bar = " " * offset + "█" * max(1, int(total * scale))
+        label = ("  " * depth + s["name"] + (" !" if s.get("status") == "error" else ""))[:43]
+        lines.append(f"{label:<44}{_ms(total):>10.1f}{_ms(max(own, 0)):>10.1f}  {bar}")
+        for c in children[s["spanId"]]:
+            walk(c, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    lines.append("self time by span:")
+    for name, ms in sorted(self_time.items(), key=lambda kv: -kv[1])[:10]:
+        lines.append(f"  {name:<42}{ms:>10.1f}  {ms / max(_ms(t1 - t0), 1e-9):>6.1%}")
+    return "\n".join(lines)
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Spans as an OTLP/JSON ``ExportTraceServiceRequest`` (ids hex, times as strings)."""
+    def value(v):
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "slam"}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": [{
+            "traceId": s["traceId"],
+            "spanId": s["spanId"],
+            "parentSpanId": s["parentSpanId"] or "",
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(s["startTimeUnixNano"]),
+            "endTimeUnixNano": str(s["endTimeUnixNano"]),
+            "attributes": [{"key": k, "value": value(v)} for k, v in (s.get("attributes") or {}).items()],
+            "status": {"code": 2 if s.get("status") == "error" else 1},
+        } for s in spans]}],
+    }]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", nargs="+", type=Path, default=None,
+                        help=f"span files (default: {TRACE_FILE} and its rotated .1)")
+    parser.add_argument("--trace", default=None, help="trace id (prefix) to show")
+    parser.add_argument("--last", type=int, default=1, help="show the last N traces")
+    parser.add_argument("--width", type=int, default=40, help="timeline width in characters")
+    parser.add_argument("--otlp", type=Path, default=None, help="write the selected traces as OTLP/JSON")
+    args = parser.parse_args(argv)
+
+    files = args.file or [TRACE_FILE.with_name(TRACE_FILE.name + ".1"), TRACE_FILE]
+    traces = load_traces(files)
+    if args.trace:
+        selected = [spans for trace_id, spans in traces.items() if trace_id.startswith(args.trace)]
+    else:
+        selected = list(traces.values())[-args.last:]
+    if not selected:
+        parser.exit(1, "no traces found\n")
+    if args.otlp:
+        args.otlp.write_text(json.dumps(to_otlp([s for spans in selected for s in spans])))
+        print(f"wrote {sum(map(len, selected))} spans to {args.otlp}")
+        return
+    print("\n\n".join(render_trace(spans, args.width) for spans in selected))
+
+
+__all__ = [
+    "Span",
+    "SpanExporter",
+    "TracingMiddleware",
+    "NOOP_SPAN",
+    "current_span",
+    "get_exporter",
+    "ingest",
+    "load_traces",
+    "parse_traceparent",
+    "render_trace",
+    "span",
+    "start_trace",
+    "to_otlp",
+    "traced",
+]
+
+
+if __name__ == "__main__":
+    main()
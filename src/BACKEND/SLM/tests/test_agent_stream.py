@@ -1 +1,119 @@
 # pytest for agent_stream
+import asyncio
+import threading
+
+import pytest
+
+from SLM.src.agentic import Agent, Final, TextDelta, ToolCallEvent, ToolResult, Transcript
+from SLM.src.runner.exceptions import ErrorCode, GenerationError
+
+CALL = '{"name": "calculator", "parameters": {"expression": "%s"}}'
+
+
+class ScriptedSession:
+    """Plays one list of tokens per ``stream`` call."""
+
+    batched = False
+
+    def __init__(self, script, incremental=True, overflow=False):
+        self.script = iter(script)
+        self.incremental = incremental
+        self.overflow = overflow
+        self.closed = False
+        self.text = ""
+
+    def eval(self, text):
+        if self.overflow:
+            raise GenerationError("prompt too long", ErrorCode.CONTEXT_LENGTH_EXCEEDED)
+        self.text += text
+
+    def stream(self, temperature, max_tokens, stop):
+        return (token for token in next(self.script))
+
+    def keep_generated(self, n_chars):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ScriptedRunner:
+    lock = threading.Lock()
+
+    def __init__(self, script, overflow=False):
+        self.script = script
+        self.overflow = overflow
+        self.sessions = []
+
+    def register_prefix(self, text):
+        return 0
+
+    def open_session(self, incremental=None):
+        self.sessions.append(ScriptedSession(self.script, incremental is not False, self.overflow))
+        return self.sessions[-1]
+
+
+def run(script):
+    return list(Agent(None, runner=ScriptedRunner(script)).chat("system", "question"))
+
+
+def test_tool_step_events():
+    events = run([
+        ["Let me ", "compute. ", CALL[:23], CALL[23:] % "6*7"],
+        [CALL[:23], CALL[23:] % "6*7"],
+        ["The answer ", "is 42"],
+    ])
+    assert [type(e) for e in events] == [TextDelta, ToolCallEvent, ToolResult, TextDelta, Final]
+    assert events[0].text == "Let me compute. "
+    assert events[1].args == {"expression": "6*7"} and "{" not in events[0].text
+    assert events[2].ok and "42" in events[2].output
+    assert events[-1].text == "Let me compute.\nThe answer is 42"
+    assert events[-1].usage["tool_calls"] == 1
+
+
+def test_calls_in_one_step_do_not_share_tokens():
+    first, second = CALL % "1+1", CALL % "2+2"
+    events = run([
+        [first[:-2], "}}" + second],  # the second token closes both calls
+        [first[:-2], "}}" + second],
+        ["done"],
+    ])
+    calls = [e for e in events if isinstance(e, ToolCallEvent)]
+    assert [c.args["expression"] for c in calls] == ["1+1", "2+2"]
+    assert [c.tokens for c in calls] == [2, 0]  # 2 tokens in the pass, counted once
+
+
+def test_achat_yields_the_same_events():
+    script = [[CALL % "6*7"], [CALL % "6*7"], ["42"]]
+
+    async def collect():
+        transcript = Transcript()
+        async for event in Agent(None, runner=ScriptedRunner(script)).achat("system", "question"):
+            transcript.add(event)
+        return transcript
+
+    transcript = asyncio.run(collect())
+    sync = Transcript()
+    for event in run(script):
+        sync.add(event)
+    assert transcript.to_response()["response"] == sync.to_response()["response"] == "42"
+    assert [c.tokens for c in transcript.calls] == [c.tokens for c in sync.calls] == [1]
+
+
+def test_sessions_closed_when_the_prompt_does_not_fit():
+    runner = ScriptedRunner([], overflow=True)
+    with pytest.raises(GenerationError):
+        list(Agent(None, runner=runner).chat("system", "question"))
+    assert len(runner.sessions) == 2  # the incremental session and its full-prompt fallback
+    assert all(s.closed for s in runner.sessions)
+
+    runner = ScriptedRunner([], overflow=True)
+
+    async def consume():
+        async for _ in Agent(None, runner=runner).achat("system", "question"):
+            pass
+
+    with pytest.raises(GenerationError):
+        asyncio.run(consume())
+    assert len(runner.sessions) == 2
+    assert all(s.closed for s in runner.sessions)
@@ -0,0 +1,117 @@
+# pytest for batch_scheduler
+import threading
+from collections import deque
+
+import pytest
+
+from SLM.src.config import get_default_config
+from SLM.src.models import SchedulerConfig
+from SLM.src.runner.batch_scheduler import BatchScheduler, BatchSession, _GeneratedText, _Request
+from SLM.src.runner.exceptions import ErrorCode, GenerationError
+
+
+class CharModel:
+    """One token per character."""
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return [1] * add_bos + [ord(c) for c in text.decode("utf-8")]
+
+    def detokenize(self, tokens):
+        return "".join(chr(t) for t in tokens).encode("utf-8")
+
+
+class Runner:
+    def __init__(self):
+        self.config = get_default_config()
+        self.config.context.reserve_tokens = 8
+        self.config.context.safety_tokens = 0
+        self.model = CharModel()
+
+
+def scheduler(n_batch=16, prefill_chunk=4, session_ctx=64):
+    """A scheduler without its llama context or loop thread: enough for planning."""
+    sched = BatchScheduler.__new__(BatchScheduler)
+    sched.runner = Runner()
+    sched.config = SchedulerConfig(n_batch=n_batch, prefill_chunk=prefill_chunk)
+    sched.session_ctx = session_ctx
+    sched.cond = threading.Condition()
+    sched._active, sched._waiting, sched._prefix = {}, deque(), []
+    sched._room, sched._rotation = n_batch, 0
+    return sched
+
+
+def session(sched, seq, pending, sampling=True):
+    s = BatchSession(sched)
+    s.seq = seq
+    s.tokens = [1]
+    s._pending = list(pending)
+    if sampling:
+        s._request = _Request(sampler=None, budget=10, push=lambda item: None)
+    sched._active[seq] = s
+    return s
+
+
+# ── stop strings ──────────────────────────────────────────────────────────────
+def test_generated_text_holds_back_a_possible_stop_string():
+    text = _GeneratedText(CharModel(), stop=["</tool>"])
+    pieces = [text.add(ord(c)) for c in "ok </to"]
+    assert "".join(pieces) == "ok "
+    assert text.add(ord("p")) == "</top"
+    assert text.cut is None
+
+
+def test_generated_text_cuts_at_stop_string():
+    text = _GeneratedText(CharModel(), stop=["}"])
+    out = "".join(text.add(ord(c)) for c in '{"a": 1}')
+    assert text.cut == len('{"a": 1')
+    assert out + text.rest() == '{"a": 1'
+
+
+# ── batch planning ────────────────────────────────────────────────────────────
+def test_plan_puts_sampling_sessions_first_and_chunks_prefill():
+    sched = scheduler(n_batch=8, prefill_chunk=4)
+    sampler = session(sched, 1, [65])
+    prefill = session(sched, 2, list(range(100, 110)))
+    idle = session(sched, 3, [66], sampling=False)
+    rows = sched._plan()
+    assert rows[0] == (sampler, [65], True)
+    assert rows[1] == (prefill, list(range(100, 104)), False)  # a chunk, no sampling yet
+    assert all(row[0] is not idle for row in rows)
+    assert sum(len(row[1]) for row in rows) <= 8
+
+
+def test_plan_respects_batch_room():
+    sched = scheduler(n_batch=6, prefill_chunk=4)
+    for seq in (1, 2, 3):
+        session(sched, seq, list(range(10)))
+    rows = sched._plan()
+    assert [len(tokens) for _, tokens, _ in rows] == [4, 2]
+
+
+def test_plan_rotates_prefill_between_sessions():
+    sched = scheduler(n_batch=4, prefill_chunk=4)
+    first, second = session(sched, 1, list(range(10))), session(sched, 2, list(range(10)))
+    assert {sched._plan()[0][0], sched._plan()[0][0]} == {first, second}
+
+
+def test_plan_drops_cancelled_and_blocked_sessions():
+    sched = scheduler()
+    cancelled = session(sched, 1, [65])
+    cancelled._request.sampler = type("Sampler", (), {"close": lambda self: None})()
+    cancelled._request.cancelled = True
+    blocked = session(sched, 2, [66])
+    blocked._blocked = True
+    assert sched._plan() == []
+    assert cancelled._request is None
+    assert blocked._request is not None
+
+
+# ── session side ──────────────────────────────────────────────────────────────
+def test_batch_session_eval_keeps_room_for_the_reply():
+    sched = scheduler(session_ctx=32)
+    s = BatchSession(sched)
+    assert s.eval("a" * 20) == 21
+    with pytest.raises(GenerationError) as info:
+        s.eval("b" * 4)  # 21 + 4 + 8 reserved > 32
+    assert info.value.code == ErrorCode.CONTEXT_LENGTH_EXCEEDED
+    assert s.text == "a" * 20
@@ -0,0 +1,38 @@
+# pytest for config
+from SLM.src.config import (
+    DEFAULT_GENERATION_CONFIG,
+    DEFAULT_MODEL_CONFIG,
+    get_default_config,
+    get_small_config,
+)
+
+
+def test_small_config_leaves_defaults_unchanged():
+    model_path = DEFAULT_MODEL_CONFIG.model_path
+    max_tokens = DEFAULT_GENERATION_CONFIG.max_tokens
+
+    small = get_small_config("small.gguf")
+    assert str(small.model.model_path) == "small.gguf"
+    assert small.generation.max_tokens == 128
+
+    assert DEFAULT_MODEL_CONFIG.model_path == model_path
+    assert DEFAULT_GENERATION_CONFIG.max_tokens == max_tokens
+    default = get_default_config()
+    assert default.model.model_path == model_path
+    assert default.generation.max_tokens == max_tokens
+
+
+def test_default_configs_are_independent():
+    first, second = get_default_config(), get_default_config()
+    first.model.context_size = 1
+    first.system_requirements.default_threads = 1
+    first.context.reserve_tokens = 1
+    assert second.model.context_size != 1
+    assert second.system_requirements.default_threads != 1
+    assert second.context.reserve_tokens != 1
+
+
+def test_default_configs_do_not_share_nested_lists():
+    first, second = get_default_config(), get_default_config()
+    first.context.fallbacks.clear()
+    assert second.context.fallbacks
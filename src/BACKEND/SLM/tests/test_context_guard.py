@@ -0,0 +1,230 @@
+# pytest for context_guard
+import threading
+import time
+
+import pytest
+
+from SLM.src.config import get_default_config
+from SLM.src.runner.context_guard import TRIM_MARKER, ContextGuard, ContextPool, TokenCounter, trim_history
+from SLM.src.runner.exceptions import ErrorCode, GenerationError
+from SLM.src.runner.session import LlamaSession
+
+
+class FakeModel:
+    """One token per whitespace-separated word, plus BOS."""
+
+    def __init__(self, n_ctx=64, n_ctx_train=4096):
+        self._n_ctx = n_ctx
+        self.calls = 0
+        self._model = self
+        self._train = n_ctx_train
+
+    def tokenize(self, text, add_bos=True, special=False):
+        self.calls += 1
+        return [0] * (len(text.decode("utf-8").split()) + add_bos)
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def n_ctx_train(self):
+        return self._train
+
+
+class FakeRunner:
+    def __init__(self, n_ctx=64, n_ctx_train=4096, **context):
+        self.config = get_default_config()
+        self.config.context = self.config.context.model_copy(update={"reserve_tokens": 8, "safety_tokens": 0, **context})
+        self.model = FakeModel(n_ctx, n_ctx_train)
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def transcript(steps):
+    return "\n".join(["SYSTEM: be brief", "USER: question"]
+                     + [f"TOOL: {words(5, f's{i}_')}" for i in range(steps)] + ["ASSISTANT:"])
+
+
+def word_count(text):
+    return len(text.split())
+
+
+# ── TokenCounter ──────────────────────────────────────────────────────────────
+def test_counter_caches_exact_prompts():
+    model = FakeModel()
+    counter = TokenCounter(model)
+    assert counter.count("a b c") == 4
+    assert counter.count("a b c") == 4
+    assert model.calls == 1
+    assert counter.stats["hits"] == 1
+
+
+def test_counter_extends_cached_prefix():
+    model = FakeModel()
+    counter = TokenCounter(model)
+    counter.count("a b c")
+    assert counter.count("a b c d e") == 6
+    assert counter.stats["extended"] == 1
+    assert counter.count("a b c d e", add_bos=False) == 5  # separate cache per add_bos
+
+
+def test_counter_retokenizes_after_max_seams():
+    counter = TokenCounter(FakeModel(), max_seams=2)
+    text = "a"
+    counter.count(text)
+    for word in "bcd":
+        text += f" {word}"
+        assert counter.count(text) == word_count(text) + 1
+    assert counter.stats == {"hits": 0, "extended": 2, "tokenized": 2}
+
+
+# ── trim_history ──────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("budget", [16, 24, 40])
+def test_trim_history_respects_budget(budget):
+    prompt = transcript(10)
+    trimmed = trim_history(prompt, budget, word_count)
+    assert trimmed is not None
+    assert word_count(trimmed) <= budget
+    lines = trimmed.split("\n")
+    assert lines[:3] == ["SYSTEM: be brief", "USER: question", TRIM_MARKER]
+    assert lines[-1] == "ASSISTANT:"
+
+
+def test_trim_history_keeps_latest_lines():
+    prompt = transcript(10)
+    trimmed = trim_history(prompt, 20, word_count)
+    kept = [line for line in trimmed.split("\n") if line.startswith("TOOL:")]
+    assert kept == prompt.split("\n")[-1 - len(kept):-1]
+
+
+def test_trim_history_clips_long_last_line_from_the_left():
+    prompt = "\n".join(["SYSTEM: s", "USER: q", words(50)])
+    trimmed = trim_history(prompt, 20, word_count)
+    assert word_count(trimmed) <= 20
+    assert trimmed.endswith("w49")
+
+
+def test_trim_history_gives_up_when_head_does_not_fit():
+    assert trim_history(transcript(3), 5, word_count) is None
+
+
+# ── ContextGuard.fit ──────────────────────────────────────────────────────────
+def make_guard(**kwargs):
+    opened = []
+
+    def factory(n_ctx, rope_freq_scale):
+        opened.append((n_ctx, rope_freq_scale))
+        return FakeModel(n_ctx)
+
+    runner = FakeRunner(**kwargs)
+    return ContextGuard(runner, factory), runner, opened
+
+
+def test_fit_passes_short_prompts_through():
+    guard, runner, opened = make_guard()
+    fit = guard.fit("SYSTEM: hi\nUSER: q", max_tokens=100)
+    assert fit.strategy is None and fit.model is runner.model and fit.deadline is None
+    assert not opened
+
+
+def test_fit_requires_reserve_tokens_of_room():
+    guard, _, _ = make_guard(fallbacks=[])
+    fit = guard.fit(words(55), max_tokens=100)  # 56 tokens + 8 reserved = 64
+    assert fit.strategy is None
+    with pytest.raises(GenerationError):
+        guard.fit(words(56), max_tokens=100)
+
+
+@pytest.mark.parametrize("fallbacks, strategy", [
+    (["larger_context", "trim_history"], "larger_context"),
+    (["trim_history", "larger_context"], "trim_history"),
+    (["rope_scaling"], "rope_scaling"),
+])
+def test_fit_tries_fallbacks_in_order(fallbacks, strategy):
+    guard, runner, opened = make_guard(fallbacks=fallbacks)
+    prompt = transcript(20)
+    fit = guard.fit(prompt, max_tokens=50)
+    assert fit.strategy == strategy
+    assert fit.deadline is not None
+    if strategy == "trim_history":
+        assert fit.model is runner.model and fit.lock is None
+        assert fit.prompt_tokens + 8 <= 64
+    else:
+        assert fit.prompt == prompt and fit.lock is not None
+        assert opened == [(1024, 0.0)] and fit.n_ctx == 1024
+    assert guard.stats()[strategy] == 1
+
+
+def test_larger_context_stays_within_trained_length():
+    guard, _, opened = make_guard(fallbacks=["larger_context", "trim_history"], n_ctx_train=512)
+    assert guard.fit(transcript(20), max_tokens=50).n_ctx == 512  # rounded up to 1024, capped
+    assert guard.fit(transcript(100), max_tokens=50).strategy == "trim_history"
+    assert opened == [(512, 0.0)]
+
+
+def test_rope_scaling_past_trained_length():
+    guard, _, opened = make_guard(fallbacks=["rope_scaling"], n_ctx_train=512)
+    assert guard.fit(transcript(100), max_tokens=50).strategy == "rope_scaling"
+    assert opened == [(1024, 0.5)]
+
+
+def test_pool_reuses_a_large_enough_context():
+    guard, _, opened = make_guard(fallbacks=["larger_context"])
+    first = guard.fit(transcript(20), max_tokens=50)
+    second = guard.fit(transcript(15), max_tokens=50)
+    assert second.model is first.model and len(opened) == 1
+
+
+def test_failed_fallback_moves_on():
+    runner = FakeRunner(fallbacks=["larger_context", "trim_history"])
+
+    def factory(n_ctx, rope_freq_scale):
+        raise MemoryError("no room for the KV cache")
+
+    guard = ContextGuard(runner, factory)
+    assert guard.fit(transcript(20), max_tokens=50).strategy == "trim_history"
+
+
+def test_fit_raises_structured_error_when_nothing_fits():
+    guard, _, _ = make_guard(fallbacks=["trim_history"])
+    with pytest.raises(GenerationError) as info:
+        guard.fit(words(200), max_tokens=50)
+    assert info.value.code == ErrorCode.CONTEXT_LENGTH_EXCEEDED
+    assert info.value.context["prompt_tokens"] == 201
+    assert info.value.context["n_ctx"] == 64
+    assert info.value.context["fallbacks"] == {"trim_history": "does not fit"}
+    assert guard.stats()["failed"] == 1
+
+
+# ── ContextPool ───────────────────────────────────────────────────────────────
+def test_pool_serves_open_contexts_while_another_loads():
+    loading, release = threading.Event(), threading.Event()
+
+    def factory(n_ctx, rope_freq_scale):
+        if n_ctx > 1024:
+            loading.set()
+            release.wait(5)
+        return FakeModel(n_ctx)
+
+    pool = ContextPool(factory, size=2)
+    small = pool.get(1024)
+    loader = threading.Thread(target=pool.get, args=(4096,))
+    loader.start()
+    assert loading.wait(5)
+    start = time.monotonic()
+    assert pool.get(512) is small  # not blocked by the 4096-token load
+    assert time.monotonic() - start < 1
+    release.set()
+    loader.join(5)
+    assert sorted(pool.sizes()) == [1024, 4096]
+
+
+# ── session headroom ──────────────────────────────────────────────────────────
+def test_llama_session_refuses_prompt_without_room_to_reply():
+    runner = FakeRunner()
+    session = LlamaSession(runner)
+    with pytest.raises(GenerationError) as info:
+        session.eval(words(60))  # 61 tokens fit n_ctx=64, but not with 8 reserved
+    assert info.value.code == ErrorCode.CONTEXT_LENGTH_EXCEEDED
+    assert session.text == ""
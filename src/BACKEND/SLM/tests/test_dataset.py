@@ -0,0 +1,44 @@
+# pytest for dataset generation
+from dataset.generate import BloomFilter
+
+
+def test_bloom_add_reports_duplicates():
+    bloom = BloomFilter(*BloomFilter.size_for(100, 0.01))
+    assert bloom.add("what is 2 plus 2")
+    assert not bloom.add("what is 2 plus 2")
+    assert bloom.add("what is 2 plus 3")
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(*BloomFilter.size_for(5000, 0.01))
+    keys = [f"row {i}" for i in range(5000)]
+    for key in keys:
+        bloom.add(key)
+    assert not any(bloom.add(key) for key in keys)
+
+
+def test_bloom_false_positive_rate_near_target():
+    bloom = BloomFilter(*BloomFilter.size_for(5000, 0.01))
+    for i in range(5000):
+        bloom.add(f"seen {i}")
+    snapshot = bloom.slots.copy()
+    false_positives = 0
+    for i in range(5000):
+        false_positives += not bloom.add(f"new {i}")
+        bloom.slots[:] = snapshot  # probe without filling the filter further
+    assert false_positives < 5000 * 0.02
+
+
+def test_bloom_filters_share_a_buffer():
+    n_slots, n_hashes = BloomFilter.size_for(100, 0.01)
+    buf = bytearray(n_slots)
+    first, second = BloomFilter(n_slots, n_hashes, buf), BloomFilter(n_slots, n_hashes, buf)
+    assert first.add("shared key")
+    assert not second.add("shared key")
+
+
+def test_bloom_size_for():
+    n_slots, n_hashes = BloomFilter.size_for(1000, 0.01)
+    assert 9000 < n_slots < 10000  # ~9.6 slots per item at 1%
+    assert n_hashes == 7
+    assert BloomFilter.size_for(1, 0.5)[0] == 64
@@ -0,0 +1,116 @@
+# pytest for retrieval
+import io
+import zipfile
+
+import numpy as np
+import pytest
+
+from TOOLS.retrieval import DocumentIndex, chunk_text, extract_text
+
+SOLAR = "Solar panels convert sunlight into electricity for the house."
+GARDEN = "The garden needs water every morning and compost in spring."
+BREAD = "Knead the bread dough and let it rise before baking."
+
+
+def words(n):
+    return " ".join(f"w{i}" for i in range(n))
+
+
+# ── chunking ──────────────────────────────────────────────────────────────────
+def test_chunk_text_edge_cases():
+    assert chunk_text("") == []
+    assert chunk_text("   \n ") == []
+    assert chunk_text("just a few words", chunk_words=10, overlap=3) == ["just a few words"]
+    assert chunk_text(words(10), chunk_words=10, overlap=3) == [words(10)]  # no trailing overlap-only window
+
+
+def test_chunk_text_windows_overlap_and_cover_the_text():
+    chunks = chunk_text(words(25), chunk_words=10, overlap=3)
+    assert [c.split()[0] for c in chunks] == ["w0", "w7", "w14", "w21"]
+    assert chunks[-1].split()[-1] == "w24"
+    assert chunks[0].split()[-3:] == chunks[1].split()[:3]
+
+
+def test_chunk_text_keeps_line_breaks_and_survives_large_overlap():
+    assert chunk_text("one two\nthree four", chunk_words=3, overlap=1) == ["one two\nthree", "three four"]
+    assert len(chunk_text(words(5), chunk_words=2, overlap=5)) == 4  # step never drops below one word
+
+
+# ── extraction ────────────────────────────────────────────────────────────────
+def test_docx_character_references_decoded():
+    xml = ('<w:document><w:body>'
+           '<w:p><w:r><w:t>It&#8217;s R&amp;D</w:t></w:r></w:p>'
+           '<w:p><w:r><w:t xml:space="preserve">a &lt; b &#x2019;</w:t></w:r></w:p>'
+           '</w:body></w:document>')
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("word/document.xml", xml)
+    assert extract_text("notes.docx", buf.getvalue()) == "It’s R&D\na < b ’"
+
+
+# ── index ─────────────────────────────────────────────────────────────────────
+@pytest.fixture
+def index(tmp_path):
+    idx = DocumentIndex(tmp_path, embeddings=False)
+    yield idx
+    idx.close()
+
+
+@pytest.fixture
+def fused(tmp_path):
+    idx = DocumentIndex(tmp_path, embeddings=True, dim=1024)
+    yield idx
+    idx.close()
+
+
+def test_identical_text_indexed_once(index):
+    first = index.add_document("a.txt", SOLAR)
+    second = index.add_document("copy.txt", SOLAR)
+    assert second["duplicate"] and second["doc_id"] == first["doc_id"]
+    assert index.stats()["documents"] == 1
+    assert [d["name"] for d in index.documents()] == ["a.txt"]
+
+
+def test_bm25_search_ranks_matching_chunks(index):
+    for name, text in (("solar.txt", SOLAR), ("garden.txt", GARDEN), ("bread.txt", BREAD)):
+        index.add_document(name, text)
+    results = index.search("solar panel electricity", k=3)  # "panel" matches "panels" by stemming
+    assert [r["document"] for r in results] == ["solar.txt"]
+    assert index.search("the", k=3) and len(index.search("the", k=2)) == 2
+    assert index.search("?!") == []
+
+
+def test_fused_search_is_reciprocal_rank_fusion(fused):
+    for name, text in (("solar.txt", SOLAR), ("garden.txt", GARDEN), ("bread.txt", BREAD)):
+        fused.add_document(name, text)
+    query, k = "water the garden in the morning", 2
+    scores = {}
+    for ranking in (fused._bm25(query.split(), 10 * k),
+                    fused._nearest(query, 10 * k)):
+        for rank, rowid in enumerate(ranking):
+            scores[rowid] = scores.get(rowid, 0.0) + 1.0 / (60 + rank)
+    expected = sorted(scores, key=scores.get, reverse=True)[:k]
+    names = {1: "solar.txt", 2: "garden.txt", 3: "bread.txt"}  # one chunk per document
+    assert [r["document"] for r in fused.search(query, k=k)] == [names[r] for r in expected]
+    assert fused.search(query, k=k)[0]["document"] == "garden.txt"
+
+
+def test_fused_search_keeps_bm25_only_matches(fused):
+    fused.add_document("solar.txt", SOLAR)
+    fused.add_document("garden.txt", GARDEN)
+    assert fused._nearest("panel", 10) == []  # no shared term for the hashing vectors
+    assert [r["document"] for r in fused.search("panel")] == ["solar.txt"]
+
+
+def test_remove_document_zeroes_its_embedding_rows(fused):
+    keep = fused.add_document("garden.txt", GARDEN)["doc_id"]
+    gone = fused.add_document("solar.txt", " ".join([SOLAR] * 40))
+    rows = [r for (r,) in fused._db.execute("SELECT rowid FROM chunks WHERE doc_id = ?", (gone["doc_id"],))]
+    assert len(rows) == gone["chunks"] > 1
+    assert np.abs(fused._matrix[rows]).sum() > 0
+
+    assert fused.remove_document(gone["doc_id"])
+    assert not np.abs(fused._matrix[rows]).any()
+    assert fused.search("solar electricity") == []
+    assert fused.stats()["documents"] == 1 and fused.documents()[0]["doc_id"] == keep
+    assert not fused.remove_document(gone["doc_id"])
@@ -0,0 +1,71 @@
+# pytest for router
+import pytest
+
+from router import RouterConfig, _mentions_operator, calculation_confidence, numbers_in
+
+THRESHOLD = RouterConfig().tool_threshold
+
+
+def test_numbers_in_words_and_digits():
+    assert numbers_in("what is sixty eight plus 4") == [68.0, 4.0]
+    assert numbers_in("one hundred and five minus seven") == [105.0, 7.0]
+
+
+@pytest.mark.parametrize("raw, rewrite", [
+    ("what is 3 minus 5", "Calculate 3 - 5"),
+    ("divide ten by two", "Calculate 10 / 2"),
+    ("what is 5 plus 3", "Calculate 5 + 3"),
+])
+def test_faithful_rewrite_goes_to_tool(raw, rewrite):
+    confidence, tool_input, _ = calculation_confidence(raw, rewrite)
+    assert confidence >= THRESHOLD
+    assert tool_input == rewrite.lower()
+
+
+@pytest.mark.parametrize("raw, rewrite", [
+    ("what is 3 minus 5", "Calculate 5 - 3"),
+    ("divide two by ten", "Calculate 10 / 2"),
+])
+def test_reordered_operands_stay_below_threshold(raw, rewrite):
+    confidence, _, reason = calculation_confidence(raw, rewrite)
+    assert confidence < THRESHOLD
+    assert "reordered" in reason
+
+
+def test_commutative_operands_may_be_reordered():
+    confidence, _, _ = calculation_confidence("what is 3 plus 5", "Calculate 5 + 3")
+    assert confidence >= THRESHOLD
+
+
+def test_other_numbers_rejected():
+    confidence, _, _ = calculation_confidence("what is 3 minus 5", "Calculate 3 - 6")
+    assert confidence < THRESHOLD
+
+
+@pytest.mark.parametrize("raw, rewrite", [
+    ("what is 2 and 3", "Calculate 2 ^ 3"),  # no query word for the power
+    ("what is 3 times 4 plus 2", "Calculate 3 * (4 + 2)"),  # grouping the query doesn't have
+    ("what is the difference between 8 and 3 squared", "Calculate 8 - 3"),  # "squared" dropped
+])
+def test_unfaithful_rewrite_stays_below_threshold(raw, rewrite):
+    confidence, _, _ = calculation_confidence(raw, rewrite)
+    assert confidence < THRESHOLD
+
+
+@pytest.mark.parametrize("raw, rewrite", [
+    ("what is 2 to the power of 3", "Calculate 2 ^ 3"),
+    ("what is 2 to the power of 3", "Calculate 2 ** 3"),
+    ("what is 3 times 4 plus 2", "Calculate 3 * 4 + 2"),
+])
+def test_power_and_mixed_operators_go_to_tool(raw, rewrite):
+    confidence, _, _ = calculation_confidence(raw, rewrite)
+    assert confidence >= THRESHOLD
+
+
+@pytest.mark.parametrize("text, operator", [
+    ("plans for the summer", "+"),
+    ("unless it rains", "-"),
+    ("twenty-one", "-"),
+])
+def test_operator_words_match_whole_words_only(text, operator):
+    assert not _mentions_operator(text, operator)
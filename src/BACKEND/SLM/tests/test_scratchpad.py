@@ -0,0 +1,133 @@
+# pytest for scratchpad
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from model_interface import ModelInterfacePhi4
+from TOOLS.scratchpad import ScratchpadService
+
+
+class QueueExecutor:
+    """Holds submitted refreshes until ``run`` is called."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run(self):
+        while self.jobs:
+            fn, args = self.jobs.pop(0)
+            fn(*args)
+
+
+def joining(summary, notes):
+    return " | ".join([summary, *notes]) if summary else " | ".join(notes)
+
+
+# ── caps and eviction ─────────────────────────────────────────────────────────
+def test_notes_past_the_cap_count_as_dropped_until_summarized():
+    pool = QueueExecutor()
+    service = ScratchpadService(summarizer=joining, executor=pool, every=3, max_notes=3, max_chars=1000)
+    for i in range(5):
+        service.add_note("s", f"n{i}")
+    info = service.info("s")
+    assert info["notes"] == 3 and info["dropped"] == 2  # n0, n1 fell off unsummarized
+    assert info["summary"] == "n2\nn3\nn4"
+
+    pool.run()  # folds n2..n4 into the summary
+    pad = service.get("s")
+    assert pad.summary == "n2 | n3 | n4" and pad.summarized == 5
+    service.add_note("s", "n5")  # pushes out n2, already summarized
+    assert service.info("s")["dropped"] == 2
+    assert service.summary("s") == "n2 | n3 | n4\nn5"
+
+
+def test_char_cap_drops_oldest_notes():
+    service = ScratchpadService(executor=QueueExecutor(), every=100, max_notes=100, max_chars=10)
+    for note in ("aaaa", "bbbb", "cccc"):
+        service.add_note("s", note)
+    pad = service.get("s")
+    assert [text for _, text in pad.notes] == ["bbbb", "cccc"]
+    assert pad.chars == 8 and pad.dropped == 1
+
+
+def test_least_recently_used_sessions_evicted():
+    service = ScratchpadService(executor=QueueExecutor(), max_sessions=2)
+    service.add_note("a", "x")
+    service.add_note("b", "x")
+    service.summary("a")  # "b" is now the least recently used
+    service.add_note("c", "x")
+    assert service.stats()["evicted"] == 1 and service.stats()["sessions"] == 2
+    assert service.summary("a") == "x" and service.summary("b") == ""
+
+
+# ── background refresh ────────────────────────────────────────────────────────
+def test_refresh_started_before_toggle_off_is_discarded():
+    started, release = threading.Event(), threading.Event()
+
+    def slow(summary, notes):
+        started.set()
+        release.wait(5)
+        return joining(summary, notes)
+
+    with ThreadPoolExecutor(1) as pool:
+        service = ScratchpadService(summarizer=slow, executor=pool, every=2)
+        service.add_note("s", "old 1")
+        service.add_note("s", "old 2")
+        assert started.wait(5)
+        assert service.toggle("s", False) == "📝 Scratchpad summary:\nold 1\nold 2"
+        service.add_note("s", "new")
+        release.set()
+    pad = service.get("s")
+    assert not pad.refreshing
+    assert pad.summary == "" and service.summary("s") == "new"
+
+
+def test_failed_refresh_keeps_notes_and_retries():
+    calls = []
+
+    def flaky(summary, notes):
+        calls.append(list(notes))
+        if len(calls) == 1:
+            raise RuntimeError("model unavailable")
+        return joining(summary, notes)
+
+    pool = QueueExecutor()
+    service = ScratchpadService(summarizer=flaky, executor=pool, every=2)
+    service.add_note("s", "a")
+    service.add_note("s", "b")
+    pool.run()
+    pad = service.get("s")
+    assert not pad.refreshing and pad.summarized == 0
+    assert service.summary("s") == "a\nb"  # notes still served verbatim
+    assert service.stats()["refresh_errors"] == 1
+
+    service.add_note("s", "c")  # next note schedules the refresh again
+    pool.run()
+    assert calls[-1] == ["a", "b", "c"]
+    assert service.summary("s") == "a | b | c"
+    assert service.stats()["refreshes"] == 1
+
+
+# ── model summarizer ──────────────────────────────────────────────────────────
+def test_model_summary_stops_before_an_invented_user_turn():
+    class Session:
+        def eval(self, text):
+            self.prompt = text
+
+        def stream(self, temperature, max_tokens, stop=()):
+            reply = "Likes tea.\nUSER: and coffee?\nASSISTANT: ..."
+            cut = min((reply.find(s) for s in stop if s in reply), default=len(reply))
+            return iter([reply[:cut]])
+
+        def close(self):
+            pass
+
+    class Runner:
+        def open_session(self):
+            return Session()
+
+    interface = ModelInterfacePhi4.__new__(ModelInterfacePhi4)
+    interface.agent = type("Agent", (), {"runner": Runner()})()
+    assert interface.summarize("", ["likes tea"]) == "Likes tea."
@@ -0,0 +1,160 @@
+# pytest for session
+import threading
+
+import numpy as np
+import pytest
+
+from SLM.src.config import get_default_config
+from SLM.src.runner.exceptions import ErrorCode, GenerationError
+from SLM.src.runner.session import LlamaSession, TextSession
+
+EOS = 2
+
+
+class FakeLlama:
+    """Character-level stand-in for a llama context: one token per character, BOS = 1.
+
+    ``generate`` samples the characters of ``reply`` then EOS, evaluating each
+    sampled token before sampling the next one, like ``Llama.generate``.
+    """
+
+    def __init__(self, n_ctx=256):
+        self._n_ctx = n_ctx
+        self.input_ids = np.zeros(n_ctx, dtype=np.intc)
+        self.n_tokens = 0
+        self.evaluated = 0
+        self.reply = ""
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def token_eos(self):
+        return EOS
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return [1] * add_bos + [ord(c) for c in text.decode("utf-8")]
+
+    def detokenize(self, tokens):
+        return "".join(chr(t) for t in tokens).encode("utf-8")
+
+    def eval(self, tokens):
+        self.input_ids[self.n_tokens:self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+
+    def generate(self, tokens, temp=0.0, reset=False, **kwargs):
+        for c in self.reply:
+            self.eval(tokens)
+            tokens = [ord(c)]
+            yield ord(c)
+        self.eval(tokens)
+        yield EOS
+
+
+class FakeRunner:
+    def __init__(self, n_ctx=256):
+        self.config = get_default_config()
+        self.config.context.reserve_tokens = 8
+        self.config.context.safety_tokens = 0
+        self.model = FakeLlama(n_ctx)
+        self.lock = threading.RLock()
+
+    def ensure_prefix(self, tokens):
+        return 0
+
+
+def held(model):
+    return "".join(chr(t) for t in model.input_ids[1:model.n_tokens])
+
+
+def test_eval_only_evaluates_appended_text():
+    runner = FakeRunner()
+    session = LlamaSession(runner)
+    session.eval("SYSTEM: hi\n")
+    first = runner.model.evaluated
+    session.eval("USER: q\n")
+    assert runner.model.evaluated - first == len("USER: q\n")
+    assert session.text == "SYSTEM: hi\nUSER: q\n"
+    assert len(session) == 1 + len(session.text)
+
+
+def test_stream_yields_reply_and_extends_transcript():
+    runner = FakeRunner()
+    runner.model.reply = "hello there"
+    session = LlamaSession(runner)
+    session.eval("USER: q\n")
+    assert "".join(session.stream(temperature=0.0)) == "hello there"
+    assert session.text == "USER: q\nhello there"
+    assert session.stats["sampled_tokens"] == len("hello there")
+
+
+def test_stream_stops_at_stop_string_and_budget():
+    runner = FakeRunner()
+    runner.model.reply = "abc}def"
+    session = LlamaSession(runner)
+    session.eval("x")
+    assert "".join(session.stream(temperature=0.0, stop=["}"])) == "abc"
+    assert session.text == "xabc"
+
+    session = LlamaSession(runner)
+    session.eval("x")
+    assert "".join(session.stream(temperature=0.0, max_tokens=4)) == "abc}"
+
+
+def test_keep_generated_rewinds_the_transcript():
+    runner = FakeRunner()
+    runner.model.reply = 'I will call {"name": "calculator"} now'
+    session = LlamaSession(runner)
+    session.eval("USER: q\n")
+    out = "".join(session.stream(temperature=0.0))
+    cut = out.index("}") + 1
+    session.keep_generated(cut)
+    assert session.text == "USER: q\n" + out[:cut]
+    session.eval("\nTOOL: 42\n")
+    assert held(runner.model).startswith(session.text[:-1])
+
+
+def test_resync_after_another_session_reevaluates_only_the_diverged_tail():
+    runner = FakeRunner()
+    first, second = LlamaSession(runner), LlamaSession(runner)
+    first.eval("SYSTEM: shared prompt\nUSER: one\n")
+    second.eval("SYSTEM: shared prompt\nUSER: two\n")
+    assert second.stats["reused_tokens"] == 1 + len("SYSTEM: shared prompt\nUSER: ")
+
+    first.eval("TOOL: ok\n")
+    assert first.stats["resyncs"] == 1
+    assert first.stats["reevaluated_tokens"] == len("one")  # its "\n" was still pending
+    assert held(runner.model) == first.text[:-1]  # last token left pending for sampling
+
+
+def test_eval_refuses_transcript_without_room_for_the_reply():
+    runner = FakeRunner(n_ctx=32)
+    session = LlamaSession(runner)
+    session.eval("a" * 20)
+    with pytest.raises(GenerationError) as info:
+        session.eval("b" * 4)  # 25 + 4 + 8 reserved > 32
+    assert info.value.code == ErrorCode.CONTEXT_LENGTH_EXCEEDED
+    assert session.text == "a" * 20
+
+
+def test_stream_requires_a_prompt():
+    with pytest.raises(GenerationError):
+        next(LlamaSession(FakeRunner()).stream(temperature=0.0))
+
+
+def test_text_session_resubmits_full_transcript():
+    prompts = []
+
+    class Runner:
+        def generate(self, prompt, raw_prompt, stream, **kwargs):
+            prompts.append(prompt)
+            return ({"choices": [{"text": piece}]} for piece in ("gen", "erated"))
+
+    session = TextSession(Runner(), text="SYSTEM: s\n")
+    session.eval("USER: q\n")
+    assert "".join(session.stream(temperature=0.0)) == "generated"
+    session.keep_generated(3)
+    assert session.text == "SYSTEM: s\nUSER: q\ngen"
+    session.eval("\nTOOL: ok\n")
+    list(session.stream(temperature=0.0))
+    assert prompts == ["SYSTEM: s\nUSER: q\n", "SYSTEM: s\nUSER: q\ngen\nTOOL: ok\n"]
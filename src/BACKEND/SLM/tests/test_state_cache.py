@@ -0,0 +1,65 @@
+# pytest for state_cache
+import time
+
+from SLM.src.runner.state_cache import PromptStateCache
+
+
+def payload(tokens, size=100):
+    return {"tokens": list(tokens), "state": b"x" * size}
+
+
+def test_store_and_load_round_trip(tmp_path):
+    cache = PromptStateCache(tmp_path, "model-a", max_bytes=1 << 20)
+    cache.store(payload([1, 2, 3]))
+    assert [1, 2, 3] in cache
+    assert cache.load([1, 2, 3]) == payload([1, 2, 3])
+    assert cache.load([1, 2]) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_survives_restart_and_serves_most_used(tmp_path):
+    cache = PromptStateCache(tmp_path, "model-a", max_bytes=1 << 20)
+    cache.store(payload([1]))
+    cache.store(payload([2]))
+    cache.load([2])
+    cache.load([2])
+
+    reopened = PromptStateCache(tmp_path, "model-a", max_bytes=1 << 20)
+    assert [1] in reopened and [2] in reopened
+    assert reopened.load_most_used()["tokens"] == [2]
+
+
+def test_states_are_per_model(tmp_path):
+    PromptStateCache(tmp_path, "model-a", max_bytes=1 << 20).store(payload([1, 2]))
+    other = PromptStateCache(tmp_path, "model-b", max_bytes=1 << 20)
+    assert [1, 2] not in other
+    assert other.load_most_used() is None
+
+
+def test_least_recently_used_evicted_over_cap(tmp_path):
+    cache = PromptStateCache(tmp_path, "model-a", max_bytes=700)
+    cache.store(payload([1], size=250))
+    time.sleep(0.01)
+    cache.store(payload([2], size=250))
+    time.sleep(0.01)
+    cache.load([1])  # [2] is now the least recently used
+    time.sleep(0.01)
+    cache.store(payload([3], size=250))
+    assert [2] not in cache
+    assert [1] in cache and [3] in cache
+    assert cache.total_bytes <= 700
+    assert cache.stats["evictions"] == 1
+
+
+def test_oversized_state_is_not_stored(tmp_path):
+    cache = PromptStateCache(tmp_path, "model-a", max_bytes=50)
+    assert cache.store(payload([1], size=100)) is None
+    assert [1] not in cache
+
+
+def test_unreadable_blob_is_dropped(tmp_path):
+    cache = PromptStateCache(tmp_path, "model-a", max_bytes=1 << 20)
+    key = cache.store(payload([1, 2]))
+    (tmp_path / f"{key}.kv").write_bytes(b"not a pickle")
+    assert cache.load([1, 2]) is None
+    assert [1, 2] not in cache
@@ -1 +1,89 @@
 # pytest for tools
+import asyncio
+import json
+
+import pytest
+
+from SLM.src.agentic.tool_registry import acall_tool
+from TOOLS.json_formatter import JSONStreamFormatter, find_syntax_error, iter_format
+
+DOC = ('{"name": "café \\u00e9 \\"q\\"", "n": [1, -2.5, 3e10, 1E-7, true, false, null], '
+       '"e": {}, "a": [], "deep": {"x": [{"y": "z"}]}}')
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# ── streaming JSON formatter ──────────────────────────────────────────────────
+def test_format_matches_json_module():
+    out = "".join(iter_format([DOC]))
+    assert json.loads(out) == json.loads(DOC)
+    assert out.startswith('{\n  "name": "café \\u00e9 \\"q\\"",\n  "n": [\n    1,\n')
+    assert '"e": {},\n  "a": [],' in out
+    assert "".join(iter_format([DOC], indent=None)) == DOC.replace(": ", ":").replace(", ", ",")
+
+
+@pytest.mark.parametrize("indent", [2, None])
+def test_format_is_independent_of_chunk_boundaries(indent):
+    whole = "".join(iter_format([DOC], indent=indent))
+    for size in range(1, len(DOC) + 1):
+        assert "".join(iter_format(chunked(DOC, size), indent=indent)) == whole, size
+
+
+def test_utf8_split_inside_a_character():
+    data = DOC.encode("utf-8")
+    whole = "".join(iter_format([DOC]))
+    for size in (1, 2, 3, 7):
+        assert "".join(iter_format(chunked(data, size))) == whole
+
+
+def test_number_cut_at_boundary_is_carried_over():
+    formatter = JSONStreamFormatter(indent=None)
+    assert formatter.feed("[12") == "["
+    assert formatter.feed("3.5e") == ""
+    assert formatter.feed("-2]") + formatter.close() == "123.5e-2]"
+
+
+@pytest.mark.parametrize("bad", [
+    '{"a": 1,}',
+    '[1 2]',
+    '{"a" 1}',
+    '{"a": tru}',
+    '[1, 2',
+    '{"a": "x\\q"}',
+    '[1]]',
+    '{"a":\n  [1,\n  @]}',
+    '["abc',
+    '{"k":\n "ab',
+    '["a\\',
+    '["a\\u12x4"]',
+    '["a\\u12',
+    '["a\\u"]',
+    '["caf\\u00e9',
+    '["a\n"]',
+])
+def test_syntax_error_location_on_every_chunking(bad):
+    with pytest.raises(json.JSONDecodeError) as expected:
+        json.loads(bad)
+    for size in range(1, len(bad) + 1):
+        error = find_syntax_error(chunked(bad, size))
+        assert error is not None, size
+        assert (error.msg, error.pos, error.lineno, error.colno) == \
+            (expected.value.msg, expected.value.pos, expected.value.lineno, expected.value.colno), size
+
+
+def test_valid_document_has_no_error():
+    assert find_syntax_error(chunked(DOC, 5)) is None
+
+
+# ── tool registry ─────────────────────────────────────────────────────────────
+def test_concurrent_python_shell_calls_keep_their_own_output():
+    async def run_all():
+        return await asyncio.gather(*(
+            acall_tool("python_shell", {"code": f"for _ in range(50): print({i}) or __import__('time').sleep(0.0005)"})
+            for i in range(4)
+        ))
+
+    for i, out in enumerate(asyncio.run(run_all())):
+        assert out == "Output:\n" + "\n".join([str(i)] * 50)
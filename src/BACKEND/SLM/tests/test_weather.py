@@ -0,0 +1,45 @@
+# pytest for weather
+import threading
+import time
+
+from SLM.src.agentic.weather import CachedWeatherProvider, WeatherProvider
+
+
+class CountingProvider(WeatherProvider):
+    def __init__(self):
+        self.calls = 0
+
+    def fetch(self, location):
+        self.calls += 1
+        return {"loc": location, "temp_C": "20", "weather": "Sunny"}
+
+
+def test_fresh_stale_and_missing_entries():
+    backend = CountingProvider()
+    cache = CachedWeatherProvider(backend, ttl=60, stale_ttl=60)
+    cache.fetch("Paris")
+    assert cache.fetch("paris ")["loc"] == "paris "
+    key, (stored, value) = next(iter(cache._entries.items()))
+    cache._entries[key] = (stored - 90, value)  # past ttl, inside stale_ttl
+    cache.fetch("Paris")
+    cache._refresher.shutdown(wait=True)
+    assert cache.stats == {"hits": 1, "stale_hits": 1, "misses": 1}
+    assert backend.calls == 2  # the miss and the background refresh
+    assert time.monotonic() - cache._entries[key][0] < 60
+
+
+def test_stats_count_every_lookup_under_concurrency():
+    cache = CachedWeatherProvider(CountingProvider(), ttl=60, stale_ttl=60)
+    cache.fetch("Paris")
+
+    def hammer():
+        for _ in range(2000):
+            cache.fetch("Paris")
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 8 * 2000
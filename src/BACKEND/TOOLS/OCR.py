@@ -1,34 +1,273 @@
-from fastapi.responses import FileResponse
+"""Tesseract OCR with a configurable preprocessing pipeline and a result cache.
+
+Images go through ``OCRConfig.steps`` in order before Tesseract sees them:
+
+* ``roi``       – crop to the caller's region of interest ``(x, y, w, h)``
+* ``grayscale`` – single channel (the image is then decoded as grayscale)
+* ``downscale`` – scale to ``target_dpi`` using the DPI stored in the PNG /
+  JPEG header; images without one are capped at ``max_side`` pixels
+* ``deskew``    – rotate by the angle (up to ``max_skew`` degrees) that
+  maximises the row-projection variance of the text
+* ``threshold`` – ``adaptive`` (Gaussian, copes with uneven lighting),
+  ``otsu`` or ``fixed`` (the original global threshold at 150)
+* ``crop``      – trim the blank margin around the text
+
+Results are cached by the xxh3-128 hash of the image bytes together with the
+configuration and ROI, so a re-uploaded image is answered without decoding
+it.  Defaults come from ``SLAM_OCR_*`` environment variables; measure with
+``python -m benchmarks.bench_ocr``.
+"""
+
+import os
+import struct
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 import cv2
+import numpy as np
 import pytesseract
-import os
+import xxhash
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
 
-UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-def get_ocr_text(image):
 
-    try:
-        # Save the uploaded image
-        filename = f"{uuid.uuid4().hex}.jpg"
-        input_path = os.path.join(UPLOAD_FOLDER, filename)
+Roi = Tuple[int, int, int, int]
+
+
+class OCRConfig(BaseModel):
+    """Preprocessing and Tesseract settings."""
+    steps: List[str] = Field(
+        default=os.environ.get("SLAM_OCR_STEPS", "roi,grayscale,downscale,deskew,threshold,crop").split(","),
+        description="Preprocessing steps, applied in order"
+    )
+    target_dpi: int = Field(default=int(os.environ.get("SLAM_OCR_DPI", 300)), ge=50,
+                            description="Images stored at a higher DPI are downscaled to this")
+    max_side: int = Field(default=int(os.environ.get("SLAM_OCR_MAX_SIDE", 2500)), ge=256,
+                          description="Longest side of images without DPI metadata")
+    max_skew: float = Field(default=10.0, ge=0.0, description="Largest rotation deskew corrects, in degrees")
+    threshold: str = Field(default=os.environ.get("SLAM_OCR_THRESHOLD", "adaptive"),
+                           description="adaptive | otsu | fixed")
+    block_size: int = Field(default=31, ge=3, description="Adaptive threshold neighbourhood (odd)")
+    block_offset: int = Field(default=15, description="Constant subtracted from the adaptive mean")
+    crop_margin: int = Field(default=10, ge=0, description="Pixels kept around the text by crop")
+    psm: int = Field(default=6, description="Tesseract page segmentation mode")
+    lang: str = Field(default=os.environ.get("SLAM_OCR_LANG", "eng"))
+    cache_size: int = Field(default=int(os.environ.get("SLAM_OCR_CACHE", 256)), ge=0)
+
+    def tesseract_args(self) -> str:
+        return f"--oem 3 --psm {self.psm}"
+
+
+# ── DPI from the image header ────────────────────────────────────────────────
+def image_dpi(data) -> Optional[float]:
+    """Horizontal DPI recorded in a PNG ``pHYs`` chunk or a JPEG JFIF header, if any."""
+    head = bytes(data[:65536])
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        i = head.find(b"pHYs")
+        if i >= 4 and len(head) >= i + 13:
+            ppu_x, _, unit = struct.unpack(">IIB", head[i + 4:i + 13])
+            if unit == 1 and ppu_x:  # pixels per metre
+                return ppu_x * 0.0254
+    elif head.startswith(b"\xff\xd8") and head[6:11] == b"JFIF\x00" and len(head) >= 18:
+        unit, x_density = head[13], struct.unpack(">H", head[14:16])[0]
+        if x_density > 1:
+            if unit == 1:  # dots per inch
+                return float(x_density)
+            if unit == 2:  # dots per cm
+                return x_density * 2.54
+    return None
+
+
+# ── preprocessing steps ──────────────────────────────────────────────────────
+# each step takes and returns the image, and may record what it did in ``info``
+def _roi(img, config: OCRConfig, info: Dict[str, Any]):
+    roi = info.get("roi")
+    if not roi:
+        return img
+    x, y, w, h = roi
+    cropped = img[max(0, y):y + h, max(0, x):x + w]
+    if cropped.size == 0:
+        raise HTTPException(status_code=400, detail=f"ROI {roi} is outside the {img.shape[1]}x{img.shape[0]} image")
+    return cropped
+
+
+def _downscale(img, config: OCRConfig, info: Dict[str, Any]):
+    dpi = info.get("dpi")
+    if dpi:
+        scale = config.target_dpi / dpi
+    else:
+        scale = config.max_side / max(img.shape[:2])
+    if scale >= 1.0:
+        return img
+    info["scale"] = round(scale, 3)
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _grayscale(img, config: OCRConfig, info: Dict[str, Any]):
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def _projection_score(binary, angle: float) -> float:
+    h, w = binary.shape
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    rotated = cv2.warpAffine(binary, m, (w, h), flags=cv2.INTER_NEAREST)
+    return float(np.var(rotated.sum(axis=1, dtype=np.float64)))
 
-        with open(input_path, "wb") as f:
-            f.write( image)
 
-        # Load and process the image
-        img = cv2.imread(input_path)
+def _skew_angle(gray, max_skew: float) -> float:
+    """Text rotation in degrees: coarse 1° then fine 0.1° search on a small binarised copy."""
+    scale = min(1.0, 800 / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    # local threshold, so a lighting gradient does not pass for a block of text
+    binary = cv2.adaptiveThreshold(small, 1, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    best = max(np.arange(-max_skew, max_skew + 0.5, 1.0), key=lambda a: _projection_score(binary, a))
+    fine = np.arange(max(-max_skew, best - 1.0), min(max_skew, best + 1.0) + 0.05, 0.1)
+    return max(fine, key=lambda a: _projection_score(binary, a))
+
+
+def _deskew(img, config: OCRConfig, info: Dict[str, Any]):
+    if config.max_skew <= 0:
+        return img
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    angle = float(_skew_angle(gray, config.max_skew))
+    if abs(angle) < 0.2:
+        return img
+    info["skew"] = round(angle, 2)
+    h, w = img.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(img, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _threshold(img, config: OCRConfig, info: Dict[str, Any]):
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if config.threshold == "fixed":
+        return cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)[1]
+    if config.threshold == "otsu":
+        return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    block = config.block_size | 1
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                 block, config.block_offset)
+
+
+def _crop(img, config: OCRConfig, info: Dict[str, Any]):
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # text is the minority colour: dark on light unless the image is mostly dark
+    ink = gray < 128 if np.mean(gray) >= 128 else gray >= 128
+    coords = cv2.findNonZero(ink.astype(np.uint8))
+    if coords is None:
+        return img
+    x, y, w, h = cv2.boundingRect(coords)
+    m = config.crop_margin
+    return img[max(0, y - m):y + h + m, max(0, x - m):x + w + m]
+
+
+STEPS: Dict[str, Callable] = {
+    "roi": _roi,
+    "grayscale": _grayscale,
+    "downscale": _downscale,
+    "deskew": _deskew,
+    "threshold": _threshold,
+    "crop": _crop,
+}
+
+
+def preprocess(img, config: OCRConfig, info: Optional[Dict[str, Any]] = None):
+    """Run ``config.steps`` on a decoded BGR image; per-step milliseconds go to ``info["ms"]``."""
+    info = {} if info is None else info
+    timings = info.setdefault("ms", {})
+    for name in config.steps:
+        step = STEPS.get(name.strip())
+        if step is None:
+            raise ValueError(f"unknown OCR step {name!r}; known: {', '.join(STEPS)}")
+        start = time.perf_counter()
+        img = step(img, config, info)
+        timings[name] = round((time.perf_counter() - start) * 1e3, 1)
+    return img
+
+
+# ── OCR service ──────────────────────────────────────────────────────────────
+class OCRService:
+    """Decode, preprocess and OCR images, caching text by image hash."""
+
+    def __init__(self, config: Optional[OCRConfig] = None):
+        self.config = config or OCRConfig()
+        self._config_key = self.config.model_dump_json().encode("utf-8")
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "cache_hits": 0, "ocr_s": 0.0}
+
+    def _key(self, image, roi: Optional[Roi]) -> str:
+        h = xxhash.xxh3_128(image)
+        h.update(self._config_key)
+        h.update(repr(roi).encode())
+        return h.hexdigest()
+
+    def ocr(self, image, roi: Optional[Roi] = None) -> Dict[str, Any]:
+        """Text of an encoded image (bytes or memoryview) plus what preprocessing did."""
+        key = self._key(image, roi)
+        with self._lock:
+            self._stats["images"] += 1
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return {"text": text, "cached": True}
+
+        start = time.perf_counter()
+        # decoding straight to one channel is cheaper than converting a colour image afterwards
+        flags = cv2.IMREAD_GRAYSCALE if "grayscale" in self.config.steps else cv2.IMREAD_COLOR
+        img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), flags)
         if img is None:
             raise HTTPException(status_code=400, detail="Failed to read image")
+        info: Dict[str, Any] = {"roi": roi, "dpi": image_dpi(image), "size": [img.shape[1], img.shape[0]]}
+        processed = preprocess(img, self.config, info)
+        ocr_start = time.perf_counter()
+        text = pytesseract.image_to_string(processed, lang=self.config.lang, config=self.config.tesseract_args())
+        info["ms"]["tesseract"] = round((time.perf_counter() - ocr_start) * 1e3, 1)
+        seconds = time.perf_counter() - start
+
+        with self._lock:
+            self._stats["ocr_s"] += seconds
+            if self.config.cache_size:
+                self._cache[key] = text
+                while len(self._cache) > self.config.cache_size:
+                    self._cache.popitem(last=False)
+        info.pop("roi")
+        return {"text": text, "cached": False, "seconds": round(seconds, 3), **info}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, cached=len(self._cache))
+        stats["ocr_s"] = round(stats["ocr_s"], 3)
+        stats["config"] = self.config.model_dump()
+        return stats
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
 
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(thresh, config=custom_config)
+_service: Optional[OCRService] = None
+_service_lock = threading.Lock()
+
+def get_ocr_service() -> OCRService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = OCRService()
+    return _service
+
+
+def get_ocr_text(image, roi: Optional[Roi] = None):
+    # image: bytes or a memoryview of the spooled upload, decoded in place (no copy, no temp file)
+    try:
+        text = get_ocr_service().ocr(image, roi)["text"]
 
         rows = text.strip().split('\n')
         output_filename = f"{uuid.uuid4().hex}.txt"
@@ -40,6 +279,7 @@ def get_ocr_text(image):
         return FileResponse(path=output_path, filename=output_filename, media_type='text/plain')
 
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
@@ -1,5 +1,9 @@
 import re
-from sympy import sympify, SympifyError
+
+def _sympify(expr):
+    # sympy takes ~0.5s to import; only pay for it when something is evaluated
+    from sympy import sympify
+    return sympify(expr)
 
 def word_to_number(text):
     text = text.strip()
@@ -84,9 +88,9 @@ def evaluate_expression(user_input):
     if lowered.startswith("calculate "):
         expr = lowered[len("calculate "):].strip()  # Remove "calculate " part
         try:
-            result = sympify(expr).evalf()
+            result = _sympify(expr).evalf()
             return f"🧮 Result of `{expr}` is `{result}`"
-        except (SympifyError, Exception) as e:
+        except Exception as e:
             return f"❌ Error evaluating expression:\n`{str(e)}`"
 
     # Handle other types of expressions involving words like 'plus', 'minus', etc.
@@ -98,7 +102,7 @@ def evaluate_expression(user_input):
         if err:
             return err
         try:
-            result = sympify(expr).evalf()
+            result = _sympify(expr).evalf()
             return f"🧮 Result of `{expr}` is `{result}`"
         except Exception as e:
             return f"❌ Evaluation error: {str(e)}"
@@ -1,4 +1,7 @@
+import codecs
 import json
+import re
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
 
 def format_json_from_text(text: str) -> str:
     try:
@@ -6,3 +9,275 @@ def format_json_from_text(text: str) -> str:
         return "🧾 Formatted JSON:\n```json\n" + json.dumps(data, indent=2) + "\n```"
     except Exception as e:
         return f"❌ Could not format JSON:\n`{str(e)}`"
+
+
+# ── streaming formatter ──────────────────────────────────────────────────────
+# ``format_json_from_text`` parses the whole document; for large payloads the
+# tokenizer below re-indents (or minifies) the text as it arrives instead.
+# It never builds the document: strings and numbers are copied through
+# verbatim, only the container stack and an incomplete trailing token are kept.
+
+_WS = re.compile(r"[ \t\n\r]*")
+# one whole token after optional whitespace: punctuation, complete string, number or literal
+_TOKEN = re.compile(
+    r'[ \t\n\r]*(?:'
+    r'([{}\[\]:,])'
+    r'|("[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*")'
+    r'|(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)'
+    r'|(true|false|null))'
+)
+_STRING_RUN = re.compile(r'[^"\\\x00-\x1f]+')
+_ESCAPE = re.compile(r'\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})')
+_PARTIAL = re.compile(r"[-+0-9.eE]+|[A-Za-z]+")  # a number or literal the chunk may have cut
+_NUMBER_CHARS = re.compile(r"[-+0-9.eE]+")
+_MAX_TOKEN = 4096  # longest number / literal carried over a chunk boundary
+
+_VALUE, _KEY, _COLON, _COMMA, _END = range(5)
+_CLOSE = {"{": "}", "[": "]"}
+_EXPECTING = {
+    _VALUE: "Expecting value",
+    _KEY: "Expecting property name enclosed in double quotes",
+    _COLON: "Expecting ':' delimiter",
+    _COMMA: "Expecting ',' delimiter",
+    _END: "Extra data",
+}
+
+
+class JSONSyntaxError(ValueError):
+    """Invalid JSON at ``pos`` (characters from the start), like ``json.JSONDecodeError``."""
+
+    def __init__(self, msg: str, pos: int, lineno: int, colno: int):
+        super().__init__(f"{msg}: line {lineno} column {colno} (char {pos})")
+        self.msg = msg
+        self.pos = pos
+        self.lineno = lineno
+        self.colno = colno
+
+    def to_dict(self) -> Dict[str, Union[str, int]]:
+        return {"message": self.msg, "line": self.lineno, "column": self.colno, "offset": self.pos}
+
+
+class JSONStreamFormatter:
+    """Incremental JSON re-formatter.
+
+    ``feed`` text (or UTF-8 bytes) in chunks of any size and get the
+    formatted text for everything complete so far; ``close`` flushes the
+    rest and checks the document ended.  ``indent=None`` minifies.  Raises
+    ``JSONSyntaxError`` with the location of the first error.
+    """
+
+    def __init__(self, indent: Optional[int] = 2):
+        self.indent = indent
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buf = ""
+        self._offset = 0  # absolute position of _buf[0]
+        self._line = 1
+        self._line_start = 0
+        self._stack: List[str] = []
+        self._pads = ["\n"]  # newline + indentation per depth
+        self._expect = _VALUE
+        self._open = False  # container just opened, nothing emitted inside it yet
+        self._in_string = False  # inside a string cut by a chunk boundary
+        self._string_is_key = False
+        self._string_start = 0
+        self.max_depth = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def _error(self, msg: str, i: int) -> JSONSyntaxError:
+        pos = self._offset + i
+        nl = self._buf.rfind("\n", 0, i)
+        if nl < 0:
+            line, col = self._line, pos - self._line_start + 1
+        else:
+            line, col = self._line + self._buf.count("\n", 0, i), i - nl
+        return JSONSyntaxError(msg, pos, line, col)
+
+    def _pad(self, depth: int) -> str:
+        while len(self._pads) <= depth:
+            self._pads.append("\n" + " " * (self.indent * len(self._pads)))
+        return self._pads[depth]
+
+    # ── tokenizer ───────────────────────────────────────────────────────────
+    def _scan(self, final: bool) -> str:
+        buf, n, i = self._buf, len(self._buf), 0
+        out: List[str] = []
+        emit = out.append
+        pretty = self.indent is not None
+        colon = ": " if pretty else ":"
+        stack = self._stack
+        expect, opened = self._expect, self._open
+        try:
+            while i < n:
+                if self._in_string:
+                    m = _STRING_RUN.match(buf, i)
+                    if m:
+                        emit(m.group())
+                        i = m.end()
+                        if i == n:
+                            break
+                    c = buf[i]
+                    if c == '"':
+                        emit(c)
+                        i += 1
+                        self._in_string = False
+                        expect = _COLON if self._string_is_key else (_COMMA if stack else _END)
+                    elif c == "\\":
+                        m = _ESCAPE.match(buf, i)
+                        if m and m.end() == n and buf[i + 1] == "u":
+                            # json rejects a \u escape that ends the input: wait for what follows
+                            if not final:
+                                break
+                            raise self._error("Invalid \\uXXXX escape", i + 1)
+                        if m:
+                            emit(m.group())
+                            i = m.end()
+                        elif (not final and n - i < 6) or i + 1 == n:
+                            break  # escape cut by the chunk boundary (or by the end: unterminated)
+                        elif buf[i + 1] == "u":
+                            raise self._error("Invalid \\uXXXX escape", i + 1)
+                        else:
+                            raise self._error("Invalid \\escape", i)
+                    else:
+                        raise self._error("Invalid control character at", i)
+                    continue
+
+                m = _TOKEN.match(buf, i)
+                if m is None:
+                    # trailing whitespace, a token cut by the chunk boundary, or an error
+                    j = _WS.match(buf, i).end()
+                    if j == n:
+                        i = j
+                        break
+                    if buf[j] == '"' and expect in (_VALUE, _KEY):
+                        # string continues in the next chunk (or is invalid further on)
+                        if opened and pretty:
+                            emit(self._pad(len(stack)))
+                        opened = False
+                        emit('"')
+                        self._in_string, self._string_is_key = True, expect == _KEY
+                        self._string_start = self._offset + j
+                        i = j + 1
+                        continue
+                    partial = _PARTIAL.match(buf, j)
+                    if not final and partial and partial.end() == n and n - j <= _MAX_TOKEN:
+                        i = j
+                        break
+                    raise self._error(_EXPECTING[expect], j)
+
+                kind = m.lastindex
+                tok = m.group(kind)
+                if kind == 1:
+                    if tok == ",":
+                        if expect != _COMMA:
+                            raise self._error(_EXPECTING[expect], m.start(1))
+                        emit(",")
+                        if pretty:
+                            emit(self._pad(len(stack)))
+                        expect = _KEY if stack[-1] == "{" else _VALUE
+                    elif tok == ":":
+                        if expect != _COLON:
+                            raise self._error(_EXPECTING[expect], m.start(1))
+                        emit(colon)
+                        expect = _VALUE
+                    elif tok == "{" or tok == "[":
+                        if expect != _VALUE:
+                            raise self._error(_EXPECTING[expect], m.start(1))
+                        if opened and pretty:
+                            emit(self._pad(len(stack)))
+                        emit(tok)
+                        stack.append(tok)
+                        self.max_depth = max(self.max_depth, len(stack))
+                        opened = True
+                        expect = _KEY if tok == "{" else _VALUE
+                    else:
+                        if not (stack and tok == _CLOSE[stack[-1]] and (expect == _COMMA or opened)):
+                            raise self._error(_EXPECTING[expect], m.start(1))
+                        stack.pop()
+                        if opened:
+                            opened = False
+                        elif pretty:
+                            emit(self._pad(len(stack)))
+                        emit(tok)
+                        expect = _COMMA if stack else _END
+                else:
+                    if expect == _KEY and kind == 2:
+                        expect = _COLON
+                    elif expect == _VALUE:
+                        if kind == 3 and not final and n - m.end() <= 2 \
+                                and _NUMBER_CHARS.match(buf, m.start(3)).end() == n:
+                            i = m.start(3)  # "1." / "1e" / "1e+" cut by the chunk boundary
+                            break
+                        expect = _COMMA if stack else _END
+                    else:
+                        raise self._error(_EXPECTING[expect], m.start(kind))
+                    if opened and pretty:
+                        emit(self._pad(len(stack)))
+                    opened = False
+                    emit(tok)
+                i = m.end()
+        finally:
+            self._expect, self._open = expect, opened
+
+        # keep only the incomplete tail, moving the line bookkeeping past what was consumed
+        newlines = buf.count("\n", 0, i)
+        if newlines:
+            self._line += newlines
+            self._line_start = self._offset + buf.rfind("\n", 0, i) + 1
+        self._buf = buf[i:]
+        self._offset += i
+        text = "".join(out)
+        self.chars_out += len(text)
+        return text
+
+    # ── public API ──────────────────────────────────────────────────────────
+    def feed(self, data: Union[str, bytes]) -> str:
+        """Consume a chunk; returns the formatted text it completed."""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = self._decoder.decode(data)
+        self.chars_in += len(data)
+        self._buf += data
+        return self._scan(final=False)
+
+    def close(self) -> str:
+        """Flush the last token and check the document is complete."""
+        self._buf += self._decoder.decode(b"", final=True)
+        text = self._scan(final=True)
+        if self._in_string:
+            # a string cannot hold a raw newline, so its quote is on the current line
+            raise JSONSyntaxError("Unterminated string starting at", self._string_start,
+                                  self._line, self._string_start - self._line_start + 1)
+        if self._expect != _END:
+            raise self._error(_EXPECTING[self._expect], len(self._buf))
+        return text + ("\n" if self.indent is not None else "")
+
+
+def iter_chunks(f: BinaryIO, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    """Read a binary file object in ``chunk_size`` pieces."""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_format(chunks: Iterable[Union[str, bytes]], indent: Optional[int] = 2) -> Iterator[str]:
+    """Formatted text for a document given as chunks; raises ``JSONSyntaxError`` where it breaks."""
+    formatter = JSONStreamFormatter(indent)
+    for chunk in chunks:
+        text = formatter.feed(chunk)
+        if text:
+            yield text
+    text = formatter.close()
+    if text:
+        yield text
+
+
+def find_syntax_error(chunks: Iterable[Union[str, bytes]]) -> Optional[JSONSyntaxError]:
+    """The first syntax error of a chunked document, or None if it is valid JSON."""
+    try:
+        for _ in iter_format(chunks, indent=None):
+            pass
+    except JSONSyntaxError as e:
+        return e
+    return None
@@ -0,0 +1,278 @@
+"""On-disk retrieval index over uploaded documents.
+
+Uploaded files are turned into text (txt / docx natively, pdf through the
+optional ``pypdf``), cut into overlapping word windows and stored in a
+SQLite FTS5 table, which gives BM25 ranking from an on-disk inverted index.
+With ``embeddings=True`` every chunk also gets a feature-hashing vector
+(word unigrams and bigrams, no model needed) in a memory-mapped float32
+matrix next to the database; searches then fuse the BM25 and cosine
+rankings.
+
+The agent reaches the index through the ``search_documents`` tool, which
+returns the top-k chunks only, so a document never has to fit in the
+context window.  Location and options come from ``SLAM_INDEX_DIR`` and
+``SLAM_INDEX_EMBEDDINGS``; measure with ``python -m benchmarks.bench_retrieval``.
+"""
+
+import html
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import xxhash
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+DEFAULT_DIR = Path(os.environ.get("SLAM_INDEX_DIR", Path(__file__).parent.parent / "dataset" / ".index"))
+
+_WORD = re.compile(r"\S+")
+_TERM = re.compile(r"\w+")
+_DOCX_PARAGRAPH = re.compile(r"<w:p[ >].*?</w:p>", re.S)
+_DOCX_TEXT = re.compile(r"<w:t(?: [^>]*)?>([^<]*)</w:t>")
+
+
+# ── text extraction ──────────────────────────────────────────────────────────
+def _docx_text(data: Buffer) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        xml = z.read("word/document.xml").decode("utf-8")
+    paragraphs = ("".join(_DOCX_TEXT.findall(p)) for p in _DOCX_PARAGRAPH.findall(xml))
+    # named and numeric character references (&amp;, &#8217;, &#x2019;)
+    return html.unescape("\n".join(p for p in paragraphs if p))
+
+
+def _pdf_text(data: Buffer) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ValueError("PDF uploads need the 'pypdf' package") from None
+    return "\n\n".join(page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages)
+
+
+def extract_text(name: str, data: Buffer) -> str:
+    """Plain text of an uploaded ``.txt`` / ``.docx`` / ``.pdf`` file (anything else is read as text).
+
+    ``data`` may be any bytes-like object, e.g. the zero-copy view of a spooled upload.
+    """
+    suffix = Path(name).suffix.lower()
+    if suffix == ".docx":
+        return _docx_text(data)
+    if suffix == ".pdf":
+        return _pdf_text(data)
+    return str(data, "utf-8", errors="replace")
+
+
+def chunk_text(text: str, chunk_words: int = 120, overlap: int = 30) -> List[str]:
+    """Overlapping windows of ``chunk_words`` words, cut from ``text`` so line breaks survive."""
+    spans = [m.span() for m in _WORD.finditer(text)]
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(spans), step):
+        window = spans[start:start + chunk_words]
+        chunks.append(text[window[0][0]:window[-1][1]])
+        if start + chunk_words >= len(spans):
+            break
+    return chunks
+
+
+# ── hashing embeddings ───────────────────────────────────────────────────────
+# numpy is imported where it is used so the tool module stays cheap to import
+def embed(texts: Sequence[str], dim: int):
+    """L2-normalised signed feature-hashing vectors of word unigrams and bigrams (float32 array)."""
+    import numpy as np
+
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        terms = _TERM.findall(text.lower())
+        terms += [a + " " + b for a, b in zip(terms, terms[1:])]
+        if not terms:
+            continue
+        hashes = np.fromiter((xxhash.xxh3_64_intdigest(t.encode("utf-8")) for t in terms), dtype=np.uint64, count=len(terms))
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        vec = np.bincount((hashes % np.uint64(dim)).astype(np.int64), weights=signs, minlength=dim)
+        norm = np.linalg.norm(vec)
+        if norm:
+            out[row] = vec / norm
+    return out
+
+
+# ── index ────────────────────────────────────────────────────────────────────
+class DocumentIndex:
+    """BM25 (SQLite FTS5) index of document chunks, optionally with hashing embeddings."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY, name TEXT, sha TEXT UNIQUE, chunks INTEGER, chars INTEGER, added REAL);
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+            text, doc_id UNINDEXED, ord UNINDEXED, tokenize = 'porter unicode61');
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, root: Path = DEFAULT_DIR,
+                 embeddings: bool = os.environ.get("SLAM_INDEX_EMBEDDINGS") == "1",
+                 dim: int = 256, chunk_words: int = 120, overlap: int = 30):
+        """
+        Args:
+            root: directory holding ``index.sqlite`` (and ``embeddings.f32``)
+            embeddings: also keep hashing vectors and use them when ranking
+            dim: embedding width; fixed once the matrix exists
+            chunk_words / overlap: chunk size and overlap in words
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.chunk_words = chunk_words
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root / "index.sqlite", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self._SCHEMA)
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        self.embeddings = embeddings or "dim" in meta
+        self.dim = int(meta.get("dim", dim))
+        self._matrix = None
+        self._rows = 0  # allocated rows of the memory-mapped matrix
+        if self.embeddings:
+            with self._db:
+                self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+            path = self.root / "embeddings.f32"
+            if path.exists() and path.stat().st_size:
+                import numpy as np
+                self._rows = path.stat().st_size // (4 * self.dim)
+                self._matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(self._rows, self.dim))
+
+    # ── embeddings matrix ────────────────────────────────────────────────────
+    def _reserve(self, rows: int) -> None:
+        """Grow the memory-mapped matrix (doubling) to hold ``rows`` rows."""
+        import numpy as np
+
+        if rows <= self._rows:
+            return
+        new_rows = max(rows, 2 * self._rows, 1024)
+        path = self.root / "embeddings.f32"
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(path, "ab") as f:
+            f.truncate(new_rows * self.dim * 4)
+        self._matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(new_rows, self.dim))
+        self._rows = new_rows
+
+    def _max_rowid(self) -> int:
+        return self._db.execute("SELECT COALESCE(MAX(rowid), 0) FROM chunks").fetchone()[0]
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def add_document(self, name: str, text: str) -> Dict[str, Any]:
+        """Chunk and index ``text``; a document with identical text is indexed once."""
+        start = time.perf_counter()
+        sha = xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+        chunks = chunk_text(text, self.chunk_words, self.overlap)
+        vectors = embed(chunks, self.dim) if self.embeddings and chunks else None
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id, chunks FROM documents WHERE sha = ?", (sha,)).fetchone()
+            if row is not None:
+                return {"doc_id": row[0], "name": name, "chunks": row[1], "duplicate": True, "seconds": 0.0}
+            doc_id = self._db.execute(
+                "INSERT INTO documents (name, sha, chunks, chars, added) VALUES (?, ?, ?, ?, ?)",
+                (name, sha, len(chunks), len(text), time.time())).lastrowid
+            first = self._max_rowid() + 1
+            self._db.executemany("INSERT INTO chunks (rowid, text, doc_id, ord) VALUES (?, ?, ?, ?)",
+                                 ((first + i, chunk, doc_id, i) for i, chunk in enumerate(chunks)))
+            if vectors is not None:
+                self._reserve(first + len(chunks))
+                self._matrix[first:first + len(chunks)] = vectors
+        return {"doc_id": doc_id, "name": name, "chunks": len(chunks), "duplicate": False,
+                "seconds": round(time.perf_counter() - start, 4)}
+
+    def remove_document(self, doc_id: int) -> bool:
+        with self._lock, self._db:
+            if self.embeddings and self._matrix is not None:
+                rows = [r for (r,) in self._db.execute("SELECT rowid FROM chunks WHERE doc_id = ?", (doc_id,))]
+                self._matrix[[r for r in rows if r < self._rows]] = 0.0
+            self._db.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            return self._db.execute("DELETE FROM documents WHERE id = ?", (doc_id,)).rowcount > 0
+
+    def _bm25(self, terms: List[str], limit: int) -> List[int]:
+        match = " OR ".join(f'"{t}"' for t in terms)
+        return [r for (r,) in self._db.execute(
+            "SELECT rowid FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?", (match, limit))]
+
+    def _nearest(self, query: str, limit: int) -> List[int]:
+        import numpy as np
+
+        n = min(self._max_rowid() + 1, self._rows)
+        if n == 0:
+            return []
+        scores = self._matrix[:n] @ embed([query], self.dim)[0]
+        limit = min(limit, n)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        return [int(r) for r in top[np.argsort(-scores[top])] if scores[r] > 0]
+
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Top ``k`` chunks for ``query``: BM25, fused with embedding similarity when enabled."""
+        terms = _TERM.findall(query.lower())
+        if not terms:
+            return []
+        with self._lock:
+            if self.embeddings and self._matrix is not None:
+                # reciprocal rank fusion of the two rankings
+                fused: Dict[int, float] = {}
+                for ranking in (self._bm25(terms, 10 * k), self._nearest(query, 10 * k)):
+                    for rank, rowid in enumerate(ranking):
+                        fused[rowid] = fused.get(rowid, 0.0) + 1.0 / (60 + rank)
+                ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+            else:
+                ranked = self._bm25(terms, k)
+            if not ranked:
+                return []
+            rows = self._db.execute(
+                "SELECT chunks.rowid, documents.name, chunks.ord, chunks.text FROM chunks "
+                "JOIN documents ON documents.id = chunks.doc_id "
+                f"WHERE chunks.rowid IN ({','.join('?' * len(ranked))})", ranked).fetchall()
+        by_id = {r[0]: {"document": r[1], "chunk": r[2], "text": r[3]} for r in rows}
+        return [by_id[r] for r in ranked if r in by_id]
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT id, name, chunks, chars, added FROM documents ORDER BY id").fetchall()
+        return [dict(zip(("doc_id", "name", "chunks", "chars", "added"), r)) for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            docs, chunks = self._db.execute("SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM documents").fetchone()
+        return {"documents": docs, "chunks": chunks, "embeddings": self.embeddings,
+                "dim": self.dim if self.embeddings else None, "root": str(self.root)}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            self._db.close()
+
+
+_index: Optional[DocumentIndex] = None
+_index_lock = threading.Lock()
+
+def get_document_index() -> DocumentIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DocumentIndex()
+    return _index
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    if not results:
+        return "No passage of the uploaded documents matches the query."
+    return "\n\n".join(f"[{r['document']} #{r['chunk']}] {r['text']}" for r in results)
+
+
+def search_documents(query: str, k: int = 3) -> str:
+    """Agent tool: the ``k`` passages of the uploaded documents most relevant to ``query``."""
+    return format_results(get_document_index().search(query, k=int(k)))
@@ -1,24 +1,212 @@
-# TOOLS/scratchpad.py
+"""Per-session scratchpads with a rolling summary.
 
-class ScratchpadManager:
-    def __init__(self):
+Every session keeps an append-only note log capped at ``max_notes`` notes /
+``max_chars`` characters (oldest notes fall off first) and a summary of the
+notes seen so far.  Every ``every`` new notes the summary is refreshed in the
+background: the summarizer folds the new notes into the previous summary, so
+each refresh costs O(``every`` notes), not O(all notes).  Reading the summary
+or toggling the scratchpad off never waits for a model: notes the background
+refresh has not folded in yet are appended verbatim.
+
+The summarizer is ``summarize(previous_summary, notes) -> str``; without one
+the summary is the most recent ``max_summary_chars`` of note text.  Limits
+come from ``SLAM_SCRATCHPAD_*`` environment variables.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+Summarizer = Callable[[str, List[str]], str]
+
+
+def truncating_summarizer(max_chars: int) -> Summarizer:
+    """Model-free fallback: the last ``max_chars`` characters of summary + notes."""
+    def summarize(summary: str, notes: List[str]) -> str:
+        text = "\n".join([summary, *notes]).strip()
+        return text[-max_chars:]
+    return summarize
+
+
+class Scratchpad:
+    """Note log and rolling summary of one session."""
+
+    def __init__(self, max_notes: int, max_chars: int):
         self.enabled = False
-        self.notes = []
-
-    def toggle(self, status: bool):
-        self.enabled = status
-        if not status:
-            full_text = "\n".join(self.notes).strip()
-            self.notes.clear()
-            if full_text:
-                return f"📝 Scratchpad summary:\n{full_text}"  # placeholder summary
+        self.max_chars = max_chars
+        self.notes: Deque[Tuple[int, str]] = deque(maxlen=max_notes)  # (seq, text)
+        self.chars = 0
+        self.seq = 0  # notes ever added
+        self.summary = ""
+        self.summarized = 0  # notes with seq < summarized are in ``summary``
+        self.dropped = 0  # notes that fell off the log before being summarized
+        self.refreshing = False
+        self.epoch = 0  # bumped by clear() so a refresh started before it is discarded
+        self.lock = threading.Lock()
+
+    def _forget(self, seq: int, text: str) -> None:
+        self.chars -= len(text)
+        if seq >= self.summarized:
+            self.dropped += 1
+
+    def append(self, text: str) -> None:
+        if len(self.notes) == self.notes.maxlen:
+            self._forget(*self.notes[0])
+        self.notes.append((self.seq, text))
+        self.seq += 1
+        self.chars += len(text)
+        while self.chars > self.max_chars and len(self.notes) > 1:
+            self._forget(*self.notes.popleft())
+
+    def pending(self) -> List[str]:
+        """Notes not folded into the summary yet."""
+        return [text for seq, text in self.notes if seq >= self.summarized]
+
+    def current(self) -> str:
+        """Summary plus the notes the background refresh has not reached."""
+        return "\n".join(part for part in (self.summary, *self.pending()) if part).strip()
+
+    def clear(self) -> None:
+        self.notes.clear()
+        self.chars = 0
+        self.summary = ""
+        self.summarized = self.seq
+        self.dropped = 0
+        self.epoch += 1
+
+
+class ScratchpadService:
+    """Scratchpads keyed by session id, summarized incrementally on an executor."""
+
+    def __init__(self,
+                 summarizer: Optional[Summarizer] = None,
+                 executor: Optional[Executor] = None,
+                 every: int = int(os.environ.get("SLAM_SCRATCHPAD_EVERY", 8)),
+                 max_notes: int = int(os.environ.get("SLAM_SCRATCHPAD_NOTES", 256)),
+                 max_chars: int = int(os.environ.get("SLAM_SCRATCHPAD_CHARS", 64 * 1024)),
+                 max_summary_chars: int = 4096,
+                 max_sessions: int = int(os.environ.get("SLAM_SCRATCHPAD_SESSIONS", 1024))):
+        """
+        Args:
+            summarizer: ``summarize(previous_summary, notes)``; default keeps the latest text
+            executor: where refreshes run (default: the shared inference executor)
+            every: refresh the summary after this many new notes
+            max_notes / max_chars: cap of each session's note log
+            max_summary_chars: summaries are cut to this length
+            max_sessions: least recently used sessions beyond this are dropped
+        """
+        self.summarizer = summarizer or truncating_summarizer(max_summary_chars)
+        self._executor = executor
+        self.every = max(1, every)
+        self.max_notes = max_notes
+        self.max_chars = max_chars
+        self.max_summary_chars = max_summary_chars
+        self.max_sessions = max_sessions
+        self._pads: "OrderedDict[str, Scratchpad]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"notes": 0, "refreshes": 0, "refresh_errors": 0, "refresh_s": 0.0, "evicted": 0}
+
+    # ── sessions ─────────────────────────────────────────────────────────────
+    def get(self, session_id: str) -> Scratchpad:
+        with self._lock:
+            pad = self._pads.get(session_id)
+            if pad is None:
+                pad = self._pads[session_id] = Scratchpad(self.max_notes, self.max_chars)
+                while len(self._pads) > self.max_sessions:
+                    self._pads.popitem(last=False)
+                    self._stats["evicted"] += 1
             else:
-                return "📝 Scratchpad was empty."
-        else:
-            return ""
+                self._pads.move_to_end(session_id)
+            return pad
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            from SLM.src.utils.executors import get_inference_executor
+            self._executor = get_inference_executor()
+        return self._executor
+
+    # ── background refresh ───────────────────────────────────────────────────
+    def _schedule(self, pad: Scratchpad) -> None:
+        """Start a refresh if enough notes are pending and none is running (``pad.lock`` held)."""
+        if pad.refreshing or pad.seq - pad.summarized < self.every:
+            return
+        pad.refreshing = True
+        self.executor.submit(self._refresh, pad)
+
+    def _refresh(self, pad: Scratchpad) -> None:
+        with pad.lock:
+            summary, notes, upto, epoch = pad.summary, pad.pending(), pad.seq, pad.epoch
+        start = time.perf_counter()
+        try:
+            new_summary = self.summarizer(summary, notes)[-self.max_summary_chars:] if notes else summary
+        except Exception:
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+            with pad.lock:
+                pad.refreshing = False
+            return
+        with self._lock:
+            self._stats["refreshes"] += 1
+            self._stats["refresh_s"] += time.perf_counter() - start
+        with pad.lock:
+            pad.refreshing = False
+            if pad.epoch == epoch:
+                pad.summary, pad.summarized = new_summary, upto
+            self._schedule(pad)
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def add_note(self, session_id: str, text: str) -> int:
+        """Append a note; returns the number of notes in the session's log."""
+        pad = self.get(session_id)
+        with pad.lock:
+            pad.append(text)
+            self._schedule(pad)
+            count = len(pad.notes)
+        with self._lock:
+            self._stats["notes"] += 1
+        return count
+
+    def summary(self, session_id: str) -> str:
+        """The session's current summary, including notes not folded in yet."""
+        pad = self.get(session_id)
+        with pad.lock:
+            return pad.current()
+
+    def toggle(self, session_id: str, status: bool) -> str:
+        """Enable / disable the scratchpad; disabling returns the summary and clears the log."""
+        pad = self.get(session_id)
+        with pad.lock:
+            pad.enabled = status
+            if status:
+                return ""
+            text = pad.current()
+            pad.clear()
+        if text:
+            return f"📝 Scratchpad summary:\n{text}"
+        return "📝 Scratchpad was empty."
+
+    def is_enabled(self, session_id: str) -> bool:
+        return self.get(session_id).enabled
 
-    def add_note(self, text: str):
-        self.notes.append(text)
+    def info(self, session_id: str) -> Dict[str, Any]:
+        pad = self.get(session_id)
+        with pad.lock:
+            return {
+                "enabled": pad.enabled,
+                "summary": pad.current(),
+                "notes": len(pad.notes),
+                "chars": pad.chars,
+                "pending": pad.seq - pad.summarized,
+                "dropped": pad.dropped,
+                "refreshing": pad.refreshing,
+            }
 
-    def is_enabled(self):
-        return self.enabled
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, sessions=len(self._pads))
+        stats["refresh_s"] = round(stats["refresh_s"], 3)
+        return stats
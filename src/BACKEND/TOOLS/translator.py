@@ -1,11 +1,228 @@
-from transformers import pipeline
+"""English → French translation with a local seq2seq model (``t5-small``).
 
-# Load the model once
-_translator = pipeline("translation_en_to_fr", model="t5-small")
+``TranslatorService`` loads the model on first use, splits documents into
+sentences, translates the sentences it has not seen before in padded
+batches and keeps sentence translations in an LRU cache.  ``iter_translate``
+/ ``astream`` yield the translated document batch by batch, in order;
+``astream`` runs the batches on the shared T5 executor.
+
+Model, batch size and cache size come from ``SLAM_TRANSLATOR_MODEL``,
+``SLAM_TRANSLATOR_BATCH`` and ``SLAM_TRANSLATOR_CACHE``.  Measure with
+``python -m benchmarks.bench_translator``.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, Iterator, List, Optional, Tuple
+
+TASK = "translation_en_to_fr"
+DEFAULT_MODEL = os.environ.get("SLAM_TRANSLATOR_MODEL", "t5-small")
+
+# a sentence ends at . ! or ? followed by whitespace; line breaks always separate
+_BOUNDARY = re.compile(r"((?<=[.!?])[ \t]+|[ \t]*\n\s*)")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Alternating ``[sentence, separator, sentence, ...]``; joining them gives back ``text``."""
+    return _BOUNDARY.split(text)
+
+
+class _LRU:
+    """Thread-safe LRU mapping with hit / miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TranslatorService:
+    """Lazily loaded, batched and cached sentence-level translator."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL,
+                 batch_size: int = int(os.environ.get("SLAM_TRANSLATOR_BATCH", 16)),
+                 cache_size: int = int(os.environ.get("SLAM_TRANSLATOR_CACHE", 4096)),
+                 max_length: int = 256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache = _LRU(cache_size)
+        self._model = None
+        self._tokenizer = None
+        self._generate_kwargs: Dict = {}
+        self._prefix = ""
+        self._lock = threading.Lock()
+        self._stats = {"documents": 0, "sentences": 0, "batches": 0, "translated": 0, "translate_s": 0.0}
+
+    # ── model ────────────────────────────────────────────────────────────────
+    def _load(self) -> None:
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is not None:
+                return
+            from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+            import torch
+
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
+            model.to("cuda" if torch.cuda.is_available() else "cpu").eval()
+            # same prefix and decoding settings the transformers pipeline applies for this task
+            params = dict((model.config.task_specific_params or {}).get(TASK, {}))
+            self._prefix = params.pop("prefix", "")
+            params.pop("max_length", None)
+            self._generate_kwargs = params
+            self._tokenizer = tokenizer
+            self._model = model
+
+    def _translate_batch(self, sentences: List[str]) -> List[str]:
+        """Translate ``sentences`` in one padded ``generate`` call."""
+        import torch
+
+        self._load()
+        start = time.perf_counter()
+        inputs = self._tokenizer([self._prefix + s for s in sentences], padding=True,
+                                 truncation=True, return_tensors="pt").to(self._model.device)
+        with torch.inference_mode():
+            outputs = self._model.generate(**inputs, max_length=self.max_length, do_sample=False,
+                                           **self._generate_kwargs)
+        translations = self._tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["translated"] += len(sentences)
+            self._stats["translate_s"] += time.perf_counter() - start
+        return translations
+
+    # ── planning ─────────────────────────────────────────────────────────────
+    def _plan(self, text: str) -> Tuple[List[str], List[Optional[str]], Dict[str, List[int]], List[List[str]]]:
+        """Split ``text``, resolve cached sentences and batch the rest in document order.
+
+        Returns the segments, their translations so far (None = pending),
+        the positions of every pending sentence, and the batches to run.
+        """
+        segments = split_sentences(text)
+        out: List[Optional[str]] = list(segments)
+        pending: Dict[str, List[int]] = {}
+        n_sentences = 0
+        for i in range(0, len(segments), 2):  # even positions are sentences, odd are separators
+            sentence = segments[i].strip()
+            if not sentence:
+                continue
+            n_sentences += 1
+            if sentence in pending:
+                pending[sentence].append(i)
+                out[i] = None
+                continue
+            cached = self.cache.get(sentence)
+            if cached is None:
+                pending[sentence] = [i]
+                out[i] = None
+            else:
+                out[i] = cached
+        with self._lock:
+            self._stats["documents"] += 1
+            self._stats["sentences"] += n_sentences
+        todo = list(pending)
+        batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+        return segments, out, pending, batches
+
+    def _fill(self, out, pending, sentences: List[str], translations: List[str]) -> None:
+        for sentence, translation in zip(sentences, translations):
+            self.cache.put(sentence, translation)
+            for i in pending[sentence]:
+                out[i] = translation
+
+    @staticmethod
+    def _ready(out: List[Optional[str]], start: int) -> Tuple[str, int]:
+        """Text of the translated segments from ``start`` up to the first pending one."""
+        end = start
+        while end < len(out) and out[end] is not None:
+            end += 1
+        return "".join(out[start:end]), end
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def iter_translate(self, text: str) -> Iterator[str]:
+        """Yield the translation of ``text`` piece by piece as batches finish."""
+        segments, out, pending, batches = self._plan(text)
+        emitted = 0
+        for batch in batches:
+            piece, emitted = self._ready(out, emitted)
+            if piece:
+                yield piece
+            self._fill(out, pending, batch, self._translate_batch(batch))
+        piece, emitted = self._ready(out, emitted)
+        if piece:
+            yield piece
+
+    def translate(self, text: str) -> str:
+        return "".join(self.iter_translate(text))
+
+    async def astream(self, text: str) -> AsyncGenerator[str, None]:
+        """``iter_translate`` for asyncio callers; batches run on the T5 executor."""
+        from SLM.src.utils.executors import get_t5_executor, run_in_executor
+
+        segments, out, pending, batches = self._plan(text)
+        emitted = 0
+        for batch in batches:
+            piece, emitted = self._ready(out, emitted)
+            if piece:
+                yield piece
+            translations = await run_in_executor(get_t5_executor(), self._translate_batch, batch)
+            self._fill(out, pending, batch, translations)
+        piece, emitted = self._ready(out, emitted)
+        if piece:
+            yield piece
+
+    async def atranslate(self, text: str) -> str:
+        return "".join([piece async for piece in self.astream(text)])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(cache_hits=self.cache.hits, cache_misses=self.cache.misses, cached=len(self.cache),
+                     loaded=self._model is not None, translate_s=round(stats["translate_s"], 3))
+        return stats
+
+
+_service: Optional[TranslatorService] = None
+_service_lock = threading.Lock()
+
+def get_translator_service() -> TranslatorService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = TranslatorService()
+    return _service
 
 def translate_en_to_fr(text: str) -> str:
     if not text.strip():
         return "❌ No text provided."
-    # returns list of dicts: [{"translation_text": "..."}]
-    out = _translator(text, max_length=256, do_sample=False)[0]["translation_text"]
-    return out
+    return get_translator_service().translate(text)
@@ -0,0 +1,145 @@
+"""Aggregate decode throughput: batch scheduler vs one context per request.
+
+Starts ``--sessions`` concurrent agent-style requests (shared system prompt,
+distinct user turn) and measures generated tokens per second over the wall
+time of the whole burst, plus the mean time to first token, for
+
+* ``contexts`` – every request on its own llama.cpp context (weights shared
+  through mmap), each decoding in its own thread;
+* ``batched``  – every request a ``BatchSession`` of one runner, decoded
+  together by the ``BatchScheduler``.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_batching --model SLM/models/Phi-4-mini-instruct-Q5_K_M.gguf
+    python -m benchmarks.bench_batching --model ... --sessions 1 4 16 32 --max-tokens 64
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from SLM.src.agentic import Agent
+from SLM.src.config import get_default_config
+from SLM.src.runner import SLMRunner
+from SLM.src.utils.lazy import lazy_import
+
+llama_cpp = lazy_import("llama_cpp")
+
+SYSTEM = "You are a helpful assistant. Answer briefly and use tools when a calculation is needed. " * 4
+
+
+def make_prompts(n: int) -> List[str]:
+    return [Agent._render([{"role": "system", "content": SYSTEM},
+                           {"role": "user", "content": f"Request {i}: what is {i} times {i + 7}?"}])
+            for i in range(n)]
+
+
+def burst(prompts: List[str], run_one: Callable[[int, str, Dict], None]) -> Dict[str, float]:
+    """Run ``run_one`` for every prompt in its own thread, all released at once."""
+    results = [dict() for _ in prompts]
+    gate = threading.Barrier(len(prompts) + 1)
+
+    def worker(i):
+        gate.wait()
+        results[i]["start"] = time.perf_counter()
+        run_one(i, prompts[i], results[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(prompts))]
+    for t in threads:
+        t.start()
+    gate.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    tokens = sum(r["tokens"] for r in results)
+    return {
+        "tokens": tokens,
+        "wall_s": wall,
+        "tok_s": tokens / wall,
+        "ttft_s": statistics.mean(r["first"] - r["start"] for r in results),
+    }
+
+
+def bench_contexts(args, prompts: List[str]) -> Dict[str, float]:
+    models = [llama_cpp.Llama(model_path=args.model, n_ctx=args.n_ctx, n_threads=args.threads, verbose=False)
+              for _ in prompts]
+
+    def run_one(i, prompt, out):
+        model = models[i]
+        tokens = model.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+        out["tokens"] = 0
+        for n, token in enumerate(model.generate(tokens, temp=args.temperature, reset=True)):
+            if n == 0:
+                out["first"] = time.perf_counter()
+            if llama_cpp.llama_token_is_eog(model._model.vocab, token):
+                break
+            out["tokens"] += 1
+            if out["tokens"] >= args.max_tokens:
+                break
+
+    try:
+        return burst(prompts, run_one)
+    finally:
+        for model in models:
+            model.close()
+
+
+def bench_batched(args, prompts: List[str]) -> Dict[str, float]:
+    config = get_default_config()
+    config.model.model_path = Path(args.model)
+    config.model.use_prompt = False
+    config.model.context_size = args.n_ctx
+    config.hardware.n_gpu_layers = 0
+    config.hardware.n_threads = args.threads
+    config.preload.page_in = False
+    config.preload.warmup_tokens = 0
+    config.cache.state_dir = None
+    config.scheduler.enabled = True
+    config.scheduler.max_sessions = len(prompts)
+    config.scheduler.n_ctx = args.n_ctx * len(prompts)
+    runner = SLMRunner(config)
+    runner.register_prefix(Agent._render_prefix(SYSTEM))
+
+    def run_one(i, prompt, out):
+        session = runner.open_session()
+        session.eval(prompt)
+        for _ in session.stream(temperature=args.temperature, max_tokens=args.max_tokens):
+            out.setdefault("first", time.perf_counter())
+        out["tokens"] = session.stats["sampled_tokens"]
+        session.close()
+
+    try:
+        return burst(prompts, run_one)
+    finally:
+        runner.scheduler.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="GGUF file")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--n-ctx", type=int, default=512, help="context per request")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--mode", choices=["both", "contexts", "batched"], default="both")
+    args = parser.parse_args(argv)
+
+    modes = ["contexts", "batched"] if args.mode == "both" else [args.mode]
+    print(f"{'sessions':>8}  {'mode':<9}{'tokens':>8}{'wall s':>9}{'tok/s':>10}{'ttft s':>9}  speed-up")
+    for n in args.sessions:
+        prompts = make_prompts(n)
+        base = None
+        for mode in modes:
+            result = (bench_contexts if mode == "contexts" else bench_batched)(args, prompts)
+            base = base or result["tok_s"]
+            print(f"{n:>8}  {mode:<9}{result['tokens']:>8}{result['wall_s']:>9.2f}{result['tok_s']:>10.1f}"
+                  f"{result['ttft_s']:>9.3f}  x{result['tok_s'] / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
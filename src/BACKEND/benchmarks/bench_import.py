@@ -0,0 +1,106 @@
+"""Import-time benchmark for the backend packages.
+
+Imports each module in a fresh interpreter under ``python -X importtime``,
+sums the cumulative time of the imports it triggered (interpreter start-up
+excluded) and compares the best of ``--repeat`` runs with its budget.  Also
+fails if a module drags in one of the heavy dependencies that must only be
+loaded on first use.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --module model_interface --top 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# module -> import budget in ms
+TARGETS = {
+    "SLM.src": 400,
+    "SLM.src.agentic": 450,
+    "TOOLS.calculator": 50,
+    "TOOLS.translator": 50,
+    "TOOLS.retrieval": 50,
+    "model_interface": 500,
+}
+
+# deferred to first use; importing any of these at module load is a regression
+HEAVY = ["torch", "transformers", "peft", "llama_cpp", "sympy", "numpy", "requests"]
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(code: str) -> Tuple[List[Tuple[str, int, int, int]], List[str]]:
+    """Run ``code`` under ``-X importtime``.
+
+    Returns ``(name, depth, self_us, cumulative_us)`` rows and the heavy
+    modules left in ``sys.modules``.  Raises ``RuntimeError`` if the import fails.
+    """
+    probe = f"{code}\nimport sys\nprint(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=_ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        errors = [l for l in proc.stderr.splitlines() if l.strip() and not l.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"exit status {proc.returncode}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cum_us)))
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    return rows, loaded
+
+
+def import_ms(rows, baseline: set) -> float:
+    """Cumulative ms of the top-level imports not already done at start-up."""
+    return sum(cum for name, depth, _, cum in rows if depth == 0 and name not in baseline) / 1000
+
+
+def measure(module: str, repeat: int, baseline: set) -> Dict:
+    runs = [import_profile(f"import {module}") for _ in range(repeat)]
+    times = [import_ms(rows, baseline) for rows, _ in runs]
+    best = min(range(repeat), key=times.__getitem__)
+    return {"ms": times[best], "rows": runs[best][0], "heavy": runs[best][1]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="module to time (repeatable); default: all targets")
+    parser.add_argument("--repeat", type=int, default=5, help="best of N fresh interpreters")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest modules by self time")
+    args = parser.parse_args(argv)
+
+    baseline_rows, _ = import_profile("pass")
+    baseline = {name for name, _, _, _ in baseline_rows}
+
+    failed = False
+    print(f"{'module':<22}{'import ms':>11}{'budget':>9}  heavy deps loaded")
+    for module in args.module or list(TARGETS):
+        try:
+            result = measure(module, args.repeat, baseline)
+        except RuntimeError as e:
+            failed = True
+            print(f"{module:<22}{'failed':>11}{TARGETS.get(module) or '-':>9}  {e}")
+            continue
+        budget = TARGETS.get(module)
+        over = budget is not None and result["ms"] > budget
+        failed |= over or bool(result["heavy"])
+        print(f"{module:<22}{result['ms']:>11.1f}{budget or '-':>9}  "
+              f"{', '.join(result['heavy']) or '-'}{'   OVER BUDGET' if over else ''}")
+        if args.top:
+            own = [r for r in result["rows"] if r[0] not in baseline]
+            slowest = sorted(own, key=lambda r: r[2], reverse=True)[:args.top]
+            for name, _, self_us, cum_us in slowest:
+                print(f"    {self_us / 1000:8.1f} ms self {cum_us / 1000:9.1f} ms cumulative  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
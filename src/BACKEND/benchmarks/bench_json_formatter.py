@@ -0,0 +1,88 @@
+"""Throughput and memory of the streaming JSON formatter on a large document.
+
+Writes a synthetic array of records (``--mb`` megabytes) to a temporary file,
+then re-formats it with ``iter_format`` from 64 KB chunks and reports MB/s
+and the growth of peak RSS.  ``--compare`` also times ``json.load`` +
+``json.dump`` on the same file, whose memory grows with the document.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_json_formatter --mb 200
+    python -m benchmarks.bench_json_formatter --file big.json --mode minify --compare
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from TOOLS.json_formatter import iter_chunks, iter_format
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_document(path: str, mb: float, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        i = 0
+        while f.tell() < mb * 1e6:
+            if i:
+                f.write(",")
+            json.dump({"id": i, "name": f"user {i}", "score": rng.random(), "tags": ["a", "b", "c"],
+                       "active": i % 2 == 0, "meta": {"x": None, "note": "line\nbreak é"}}, f)
+            i += 1
+        f.write("]")
+
+
+def run_stream(path: str, indent) -> dict:
+    start, before = time.perf_counter(), peak_rss_mb()
+    out = 0
+    with open(path, "rb") as f:
+        for text in iter_format(iter_chunks(f), indent=indent):
+            out += len(text)
+    return {"s": time.perf_counter() - start, "rss_growth_mb": peak_rss_mb() - before, "out_chars": out}
+
+
+def run_json(path: str, indent) -> dict:
+    start, before = time.perf_counter(), peak_rss_mb()
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    out = len(json.dumps(data, indent=indent, ensure_ascii=False))
+    return {"s": time.perf_counter() - start, "rss_growth_mb": peak_rss_mb() - before, "out_chars": out}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=None, help="existing JSON file (default: generate one)")
+    parser.add_argument("--mb", type=float, default=100, help="size of the generated document")
+    parser.add_argument("--mode", choices=["pretty", "minify"], default="pretty")
+    parser.add_argument("--compare", action="store_true", help="also run json.load / json.dumps")
+    args = parser.parse_args(argv)
+
+    indent = None if args.mode == "minify" else 2
+    path = args.file
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        write_document(path, args.mb)
+    try:
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{size_mb:.1f} MB, mode {args.mode}")
+        # streaming first: ru_maxrss only ever grows, so json.load would hide its footprint
+        runs = [("stream", run_stream)] + ([("json", run_json)] if args.compare else [])
+        for name, run in runs:
+            r = run(path, indent)
+            print(f"  {name:<7}{r['s']:>8.2f} s {size_mb / r['s']:>8.1f} MB/s  "
+                  f"peak RSS +{r['rss_growth_mb']:.1f} MB  ({r['out_chars']:,} chars out)")
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
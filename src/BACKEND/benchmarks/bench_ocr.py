@@ -0,0 +1,127 @@
+"""OCR latency vs accuracy per preprocessing preset.
+
+Runs every image of a sample set through ``OCRService`` with each preset
+and reports the mean / p95 latency and the character accuracy against the
+ground truth (``difflib`` similarity of whitespace-normalised text), then
+the latency of a repeated image served from the hash cache.
+
+Samples: ``--samples DIR`` holding images with a ``<name>.txt`` ground truth
+next to each, or (default) ``--synthetic N`` generated pages - printed text
+at 600 DPI, rotated a few degrees, with uneven lighting and noise; half
+carry their DPI in the PNG header.  Needs the ``tesseract`` binary.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_ocr
+    python -m benchmarks.bench_ocr --samples dataset/ocr_samples --presets legacy default
+"""
+
+import argparse
+import difflib
+import random
+import statistics
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from TOOLS.OCR import OCRConfig, OCRService
+
+PRESETS: Dict[str, Dict] = {
+    # what get_ocr_text did before: full resolution, global threshold at 150
+    "legacy": {"steps": ["grayscale", "threshold"], "threshold": "fixed"},
+    "downscale": {"steps": ["grayscale", "downscale", "threshold"], "threshold": "otsu"},
+    "no-deskew": {"steps": ["grayscale", "downscale", "threshold", "crop"]},
+    "default": {},
+}
+
+LINES = [
+    "Invoice number 4821 issued on 12 March 2024",
+    "Total amount due: 1,254.80 EUR within 30 days",
+    "Please quote the reference on every payment",
+    "The quick brown fox jumps over the lazy dog",
+    "Meeting moved to Thursday at 10:30 in room B",
+    "Keep this receipt for your records",
+]
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"}
+
+
+def with_dpi(png: bytes, dpi: float) -> bytes:
+    """Insert a ``pHYs`` chunk after IHDR (OpenCV does not write one)."""
+    ppm = int(round(dpi / 0.0254))
+    data = b"pHYs" + struct.pack(">IIB", ppm, ppm, 1)
+    chunk = struct.pack(">I", 9) + data + struct.pack(">I", zlib.crc32(data))
+    return png[:33] + chunk + png[33:]
+
+
+def synthetic_page(rng: random.Random) -> Tuple[bytes, str]:
+    lines = rng.sample(LINES, 4)
+    h, w = 1400, 3600
+    page = np.full((h, w), 235, dtype=np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(page, line, (120, 250 + i * 300), cv2.FONT_HERSHEY_SIMPLEX, 3.0, 30, 7, cv2.LINE_AA)
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-5, 5), 1.0)
+    page = cv2.warpAffine(page, m, (w, h), borderValue=235)
+    light = np.linspace(0.55, 1.0, w, dtype=np.float32)[None, :]  # darker on one side
+    noise = np.random.default_rng(rng.randrange(1 << 30)).normal(0, 12, page.shape)
+    page = np.clip(page * light + noise, 0, 255).astype(np.uint8)
+    png = cv2.imencode(".png", page)[1].tobytes()
+    if rng.random() < 0.5:
+        png = with_dpi(png, 600)
+    return png, "\n".join(lines)
+
+
+def load_samples(args) -> List[Tuple[str, bytes, str]]:
+    if args.samples:
+        samples = []
+        for path in sorted(Path(args.samples).iterdir()):
+            truth = path.with_suffix(".txt")
+            if path.suffix.lower() in IMAGE_SUFFIXES and truth.exists():
+                samples.append((path.name, path.read_bytes(), truth.read_text(encoding="utf-8")))
+        return samples
+    rng = random.Random(args.seed)
+    return [(f"synthetic{i}.png", *synthetic_page(rng)) for i in range(args.synthetic)]
+
+
+def accuracy(text: str, truth: str) -> float:
+    return difflib.SequenceMatcher(None, " ".join(text.split()), " ".join(truth.split())).ratio()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=None, help="directory of images with .txt ground truth")
+    parser.add_argument("--synthetic", type=int, default=12, help="generated pages when --samples is not given")
+    parser.add_argument("--presets", nargs="+", default=list(PRESETS), choices=list(PRESETS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    samples = load_samples(args)
+    if not samples:
+        parser.error("no samples found")
+    print(f"{len(samples)} samples")
+    print(f"{'preset':<11}{'mean ms':>9}{'p95 ms':>9}{'accuracy':>10}")
+    for preset in args.presets:
+        service = OCRService(OCRConfig(cache_size=0, **PRESETS[preset]))
+        latencies, scores = [], []
+        for name, data, truth in samples:
+            start = time.perf_counter()
+            text = service.ocr(data)["text"]
+            latencies.append((time.perf_counter() - start) * 1e3)
+            scores.append(accuracy(text, truth))
+        latencies.sort()
+        print(f"{preset:<11}{statistics.mean(latencies):>9.0f}{latencies[int(len(latencies) * 0.95)]:>9.0f}"
+              f"{statistics.mean(scores):>10.1%}")
+
+    cached = OCRService(OCRConfig(**PRESETS[args.presets[-1]]))
+    cached.ocr(samples[0][1])
+    start = time.perf_counter()
+    for _ in range(100):
+        cached.ocr(samples[0][1])
+    print(f"cache hit: {(time.perf_counter() - start) * 10:.3f} ms ({len(samples[0][1]) / 1e6:.1f} MB image)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Indexing and query latency of the document retrieval index.
+
+Generates a synthetic corpus of ``--pages`` pages (``--words`` words each,
+Zipf-distributed vocabulary, grouped into documents of ``--doc-pages``
+pages), indexes it into a fresh ``DocumentIndex`` and reports indexing
+throughput, on-disk size and the latency of ``--queries`` searches, for
+BM25 alone and with hashing embeddings.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --pages 10000 --mode bm25 --k 5
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from TOOLS.retrieval import DocumentIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "sta", "vor", "ul", "tek", "shi", "ban", "dro", "pel", "qui", "zan"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def make_corpus(args) -> List[str]:
+    rng = random.Random(args.seed)
+    vocab = make_vocabulary(args.vocab, rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]  # Zipf
+    docs = []
+    for start in range(0, args.pages, args.doc_pages):
+        pages = []
+        for _ in range(min(args.doc_pages, args.pages - start)):
+            words = rng.choices(vocab, weights, k=args.words)
+            pages.append(" ".join(words) + ".")
+        docs.append("\n\n".join(pages))
+    return docs
+
+
+def make_queries(docs: List[str], n: int, seed: int) -> List[str]:
+    """Three- to six-word queries taken from random places of the corpus."""
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(n):
+        words = rng.choice(docs).split()
+        i = rng.randrange(len(words) - 6)
+        queries.append(" ".join(words[i:i + rng.randint(3, 6)]))
+    return queries
+
+
+def run(args, docs: List[str], queries: List[str], embeddings: bool) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        index = DocumentIndex(Path(root), embeddings=embeddings)
+        start = time.perf_counter()
+        for i, doc in enumerate(docs):
+            index.add_document(f"doc{i}.txt", doc)
+        index_s = time.perf_counter() - start
+        stats = index.stats()
+        size_mb = sum(p.stat().st_size for p in Path(root).iterdir()) / 1e6
+
+        index.search(queries[0], k=args.k)
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, k=args.k)
+            latencies.append((time.perf_counter() - start) * 1e3)
+        index.close()
+
+    latencies.sort()
+    label = "bm25+embeddings" if embeddings else "bm25"
+    print(f"{label:<16}{index_s:>9.1f}{args.pages / index_s:>10.0f}{stats['chunks']:>9}{size_mb:>9.1f}"
+          f"{statistics.mean(latencies):>9.2f}{latencies[len(latencies) // 2]:>9.2f}"
+          f"{latencies[int(len(latencies) * 0.95)]:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--words", type=int, default=400, help="words per page")
+    parser.add_argument("--doc-pages", type=int, default=50, help="pages per document")
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=["both", "bm25", "embeddings"], default="both")
+    args = parser.parse_args(argv)
+
+    docs = make_corpus(args)
+    queries = make_queries(docs, args.queries, args.seed)
+    print(f"{args.pages} pages in {len(docs)} documents, {args.pages * args.words / 1e6:.1f}M words")
+    print(f"{'mode':<16}{'index s':>9}{'pages/s':>10}{'chunks':>9}{'disk MB':>9}"
+          f"{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for embeddings in {"both": (False, True), "bm25": (False,), "embeddings": (True,)}[args.mode]:
+        run(args, docs, queries, embeddings)
+
+
+if __name__ == "__main__":
+    main()
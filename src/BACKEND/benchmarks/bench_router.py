@@ -0,0 +1,101 @@
+"""Route mix and latency of the ``/slam`` router on recorded traffic.
+
+Offline (default): replays CSV rows through ``Router.decide`` and reports the
+share of queries per path, the decision overhead and, for the tool path,
+how often the calculator answer matches the expected rewrite.  Rows with a
+rewrite column (``target`` / ``Actual``) use it as the T5 output.
+
+Live (``--url``): posts the same queries to a running backend, then prints
+its ``/router_stats`` (per-path mean / p95 latency and CPU per request).
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_router --data dataset/flan_t5_math_dataset_words_50k.csv dataset/final_dataset.csv
+    python -m benchmarks.bench_router --data dataset/final_dataset.csv --url http://localhost:8000 --limit 200
+"""
+
+import argparse
+import csv
+import json
+import random
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from router import Router, RouterConfig, run_tool
+
+RAW_COLUMNS = ("input", "Input", "prompt")
+REWRITE_COLUMNS = ("target", "Actual", "output")
+
+
+def load_traffic(paths: List[str], limit: Optional[int], seed: int) -> List[Tuple[str, Optional[str]]]:
+    """``(raw, rewrite)`` pairs from every file, shuffled together like mixed traffic."""
+    rows = []
+    for path in paths:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                raw = next((row[c] for c in RAW_COLUMNS if c in row), None)
+                rewrite = next((row[c] for c in REWRITE_COLUMNS if c in row), None)
+                if raw:
+                    rows.append((raw, rewrite))
+    random.Random(seed).shuffle(rows)
+    return rows[:limit] if limit else rows
+
+
+def offline(rows, config: RouterConfig, small: bool) -> None:
+    router = Router(agent=None, small=object() if small else None, config=config)
+    routes = Counter()
+    tool_inputs = []
+    start = time.perf_counter()
+    for raw, rewrite in rows:
+        decision = router.decide(raw, rewrite)
+        routes[decision.route] += 1
+        if decision.route == "tool":
+            tool_inputs.append(decision.answer)
+    decide_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+    start = time.perf_counter()
+    answered = sum(run_tool(t) is not None for t in tool_inputs)
+    tool_ms = (time.perf_counter() - start) / max(len(tool_inputs), 1) * 1e3
+
+    print(f"{len(rows):,} queries, decide() {decide_us:.1f} us/query")
+    for route in ("tool", "small", "agent"):
+        print(f"  {route:<6} {routes[route]:>8,} ({routes[route] / len(rows):6.1%})")
+    if tool_inputs:
+        print(f"  tool path: {answered / len(tool_inputs):.1%} answered by the calculator, {tool_ms:.2f} ms/answer")
+
+
+def live(rows, url: str) -> None:
+    import requests
+
+    session = requests.Session()
+    start = time.perf_counter()
+    for raw, rewrite in rows:
+        payload = {"input_text": f"{raw} simplified to {rewrite}" if rewrite else raw,
+                   "raw_text": raw, "rewritten_text": rewrite}
+        session.post(f"{url}/slam", json=payload, timeout=600).raise_for_status()
+    elapsed = time.perf_counter() - start
+    print(f"{len(rows)} requests in {elapsed:.1f}s, mean {elapsed / len(rows):.3f}s/request")
+    print(json.dumps(session.get(f"{url}/router_stats", timeout=30).json()["response"], indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", nargs="+", required=True, help="CSV files with an input and optional rewrite column")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tool-threshold", type=float, default=RouterConfig().tool_threshold)
+    parser.add_argument("--small-threshold", type=float, default=RouterConfig().small_threshold)
+    parser.add_argument("--no-small", action="store_true", help="assume no small model is deployed")
+    parser.add_argument("--url", default=None, help="replay against a running backend instead")
+    args = parser.parse_args(argv)
+
+    rows = load_traffic(args.data, args.limit, args.seed)
+    if args.url:
+        live(rows, args.url.rstrip("/"))
+    else:
+        config = RouterConfig(tool_threshold=args.tool_threshold, small_threshold=args.small_threshold)
+        offline(rows, config, small=not args.no_small)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Translation throughput: per-string pipeline calls vs ``TranslatorService``.
+
+Builds ``--docs`` synthetic multi-paragraph documents (sentences repeat
+across documents, as boilerplate does in real traffic) and translates them
+
+* ``per-string`` – one ``transformers`` translation pipeline call per
+  sentence, the way ``translate_en_to_fr`` used to work;
+* ``cold``       – ``TranslatorService`` with an empty cache: sentences
+  deduplicated and translated in padded batches;
+* ``warm``       – the same documents again, served from the sentence cache.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_translator
+    python -m benchmarks.bench_translator --model t5-small --docs 8 --paragraphs 6 --batch-size 32
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from TOOLS.translator import DEFAULT_MODEL, TASK, TranslatorService, split_sentences
+
+SUBJECTS = ["The model", "Our team", "The backend", "This report", "The user", "The scheduler", "A new release"]
+VERBS = ["improves", "describes", "measures", "reduces", "explains", "translates", "stores"]
+OBJECTS = ["the latency of every request", "the memory used by the cache", "a short summary of the results",
+           "the documents uploaded today", "the answer in a few seconds", "the cost of each query"]
+BOILERPLATE = ["Thank you for reading.", "Please contact support if you have any questions."]
+
+
+def make_documents(n: int, paragraphs: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n):
+        paras = []
+        for _ in range(paragraphs):
+            sentences = [f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}."
+                         for _ in range(rng.randint(3, 6))]
+            paras.append(" ".join(sentences))
+        paras.append(" ".join(BOILERPLATE))
+        docs.append("\n\n".join(paras))
+    return docs
+
+
+def count_sentences(docs: List[str]) -> int:
+    return sum(1 for doc in docs for s in split_sentences(doc)[::2] if s.strip())
+
+
+def bench_per_string(args, docs: List[str]) -> float:
+    from transformers import pipeline
+
+    translator = pipeline(TASK, model=args.model)
+    # pipelines default to max_new_tokens=256; match the service's max_length instead
+    translator("Warm up.", max_new_tokens=args.max_length - 1, do_sample=False)
+    start = time.perf_counter()
+    for doc in docs:
+        for sentence in split_sentences(doc)[::2]:
+            if sentence.strip():
+                translator(sentence.strip(), max_new_tokens=args.max_length - 1, do_sample=False)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--paragraphs", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    docs = make_documents(args.docs, args.paragraphs, args.seed)
+    n = count_sentences(docs)
+    print(f"{len(docs)} documents, {n} sentences, {len({s.strip() for d in docs for s in split_sentences(d)[::2]})} unique")
+
+    service = TranslatorService(args.model, batch_size=args.batch_size, max_length=args.max_length)
+    service.translate("Warm up.")
+    service.cache = type(service.cache)(service.cache.maxsize)
+
+    results = []
+    if not args.skip_baseline:
+        results.append(("per-string", bench_per_string(args, docs)))
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        for doc in docs:
+            service.translate(doc)
+        results.append((label, time.perf_counter() - start))
+
+    base = results[0][1]
+    print(f"{'mode':<11}{'seconds':>9}{'sent/s':>10}  speed-up")
+    for label, seconds in results:
+        print(f"{label:<11}{seconds:>9.2f}{n / seconds:>10.1f}  x{base / seconds:.2f}")
+    print(service.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Worker peak RSS under concurrent large uploads: buffered vs streamed.
+
+Sends ``--concurrency`` simultaneous ``--size-mb`` image uploads to an
+in-process app (httpx over ASGI, request bodies generated chunk by chunk so
+the client holds no copy) and samples the process RSS while they run.
+
+* ``buffered`` – the previous handler: ``UploadFile`` parameter, then
+  ``await image.read()`` hands the tool the whole body as ``bytes``;
+* ``streamed`` – ``uploads.receive_upload`` spools the body as it arrives
+  and the tool reads ``upload.view()`` (a memoryview of the spill file).
+
+Both "tools" checksum the body.  Each mode runs in a fresh interpreter so
+one does not inherit the other's heap.  ``anon`` is anonymous memory
+(heap); mmapped spill-file pages show up in RSS but are page cache that
+the kernel can reclaim.
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_uploads
+    python -m benchmarks.bench_uploads --concurrency 8 --size-mb 50 --spool-dir /dev/shm
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+import psutil
+
+BOUNDARY = "benchboundary7c1e"
+CHUNK = 1 << 20
+
+
+def anon_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class PeakSampler(threading.Thread):
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak_rss = self.peak_anon = 0.0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss / 2 ** 20)
+            self.peak_anon = max(self.peak_anon, anon_mb())
+            time.sleep(self.interval)
+
+
+def build_app(mode: str):
+    from fastapi import FastAPI, File, Request, UploadFile
+
+    app = FastAPI()
+    if mode == "buffered":
+        @app.post("/OCR")
+        async def ocr(image: UploadFile = File(...)):
+            data = await image.read()
+            return {"crc": zlib.crc32(data), "size": len(data)}
+    else:
+        from uploads import IMAGE_KINDS, receive_upload
+
+        @app.post("/OCR")
+        async def ocr(request: Request):
+            upload = await receive_upload(request, field="image", kinds=IMAGE_KINDS)
+            try:
+                view = upload.view()
+                return {"crc": zlib.crc32(view), "size": len(view)}
+            finally:
+                upload.close()
+    return app
+
+
+async def body(size: int):
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"scan.png\"\r\n"
+           f"Content-Type: image/png\r\n\r\n").encode()
+    chunk = b"\x89PNG\r\n\x1a\n" + bytes(CHUNK - 8)
+    sent = 0
+    while sent < size:
+        piece = chunk if sent == 0 else chunk[8:] + b"\0" * 8
+        yield piece[:size - sent]
+        sent += min(len(piece), size - sent)
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def burst(mode: str, concurrency: int, size: int):
+    import httpx
+
+    transport = httpx.ASGITransport(app=build_app(mode))
+    headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        responses = await asyncio.gather(*(client.post("/OCR", content=body(size), headers=headers)
+                                           for _ in range(concurrency)))
+    for r in responses:
+        r.raise_for_status()
+        assert r.json()["size"] == size, r.text
+
+
+def run_mode(args) -> None:
+    """Child process: one burst, then a JSON line with the measurements."""
+    if args.spool_dir:
+        os.environ["SLAM_UPLOAD_DIR"] = args.spool_dir
+    base_rss, base_anon = psutil.Process().memory_info().rss / 2 ** 20, anon_mb()
+    sampler = PeakSampler()
+    sampler.start()
+    start = time.perf_counter()
+    asyncio.run(burst(args.run, args.concurrency, int(args.size_mb * 2 ** 20)))
+    seconds = time.perf_counter() - start
+    sampler.running = False
+    sampler.join()
+    print(json.dumps({"seconds": seconds, "rss": sampler.peak_rss - base_rss, "anon": sampler.peak_anon - base_anon}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--spool-dir", default=None, help="SLAM_UPLOAD_DIR for the streamed mode")
+    parser.add_argument("--run", choices=["buffered", "streamed"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.run:
+        return run_mode(args)
+
+    total = args.concurrency * args.size_mb
+    print(f"{args.concurrency} concurrent uploads of {args.size_mb:g} MB ({total:g} MB in flight)")
+    print(f"{'mode':<10}{'seconds':>9}{'MB/s':>8}{'peak RSS +MB':>14}{'peak anon +MB':>15}")
+    for mode in ("buffered", "streamed"):
+        cmd = [sys.executable, "-m", "benchmarks.bench_uploads", "--run", mode,
+               "--concurrency", str(args.concurrency), "--size-mb", str(args.size_mb)]
+        if args.spool_dir:
+            cmd += ["--spool-dir", args.spool_dir]
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:<10}{r['seconds']:>9.2f}{total / r['seconds']:>8.0f}{r['rss']:>14.0f}{r['anon']:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
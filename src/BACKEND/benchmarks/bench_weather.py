@@ -0,0 +1,73 @@
+"""Offline benchmark for the weather tool.
+
+Starts the wttr-compatible stub on localhost and compares:
+  * one-shot ``requests.get`` per call (the previous implementation)
+  * pooled session, no cache
+  * pooled session behind the TTL cache
+
+Run from ``src/BACKEND``:
+    python -m benchmarks.bench_weather --calls 500 --latency 0.02
+"""
+
+import argparse
+import random
+import threading
+import time
+
+import requests
+
+from SLM.src.agentic.weather import (
+    CachedWeatherProvider,
+    WttrWeatherProvider,
+    serve_stub,
+)
+
+CITIES = ["London", "Paris", "new york", "New  York", "Bengaluru", "Tokyo", "Berlin", "Lima"]
+
+
+def one_shot(base_url: str, location: str):
+    r = requests.get(f"{base_url}/{location}?format=j1", timeout=5)
+    r.raise_for_status()
+    return r.json()["current_condition"][0]
+
+
+def timed(label: str, fn, locations) -> None:
+    start = time.perf_counter()
+    for loc in locations:
+        fn(loc)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(locations) / elapsed:9.1f} calls/s   "
+          f"{1000 * elapsed / len(locations):7.2f} ms/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per request (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    threading.Thread(
+        target=serve_stub,
+        kwargs={"port": args.port, "latency": args.latency},
+        daemon=True,
+    ).start()
+    time.sleep(0.3)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    rng = random.Random(args.seed)
+    locations = [rng.choice(CITIES) for _ in range(args.calls)]
+
+    timed("requests.get per call", lambda loc: one_shot(base_url, loc), locations)
+
+    pooled = WttrWeatherProvider(base_url=base_url)
+    timed("pooled session", pooled.fetch, locations)
+
+    cached = CachedWeatherProvider(WttrWeatherProvider(base_url=base_url), ttl=300)
+    timed("pooled + TTL cache", cached.fetch, locations)
+    print(f"cache stats: {cached.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Parallel, streaming front end for the synthetic data generators.
+
+Runs one of the existing template sets across a process pool.  Every shard
+has its own deterministic seed (derived from ``--seed`` and the shard index)
+and streams its rows to its own Parquet / JSONL / CSV file in fixed-size
+batches, so memory stays flat however many rows are requested.
+
+Prompts are de-duplicated with a Bloom filter:
+  * ``--dedup global`` – one filter in shared memory, seen by all workers
+    (output then depends on worker scheduling)
+  * ``--dedup shard``  – one filter per shard; fully reproducible output,
+    duplicates across shards are possible
+  * ``--dedup none``
+
+    python generate.py math --rows 10000000 --workers 16 --format parquet --out out/math
+    python generate.py ocr --rows 500 --format csv --out out/ocr
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import math
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import xxhash
+
+HERE = Path(__file__).resolve().parent
+NOTEBOOKS = HERE.parents[2] / "notebooks"
+
+
+# ── template sets ─────────────────────────────────────────────────────────────
+def _load(path):
+    """Import a generator script by path (they live outside any package)."""
+    name = f"_datagen_{path.stem}"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return sys.modules[name]
+
+
+def _math_row(rng):
+    m = _load(HERE / "synthetic_data_generattion.py")
+    return dict(zip(("Original Question", "Simplified Form", "Category"), m.generate_row(rng)))
+
+
+def _json_row(rng):
+    return _load(HERE / "synthetic_data_generation_for_ocs_json.py").generate_json_formatter_row(rng)
+
+
+def _ocr_row(rng):
+    return _load(HERE / "synthetic_data_generation_for_ocs_json.py").generate_ocr_prompt_row(rng)
+
+
+def _calc_row(rng):
+    return _load(NOTEBOOKS / "calculator_data_generation.py").generate_sample(rng)
+
+
+# name -> (row factory, output columns, column holding the prompt)
+GENERATORS = {
+    "math": (_math_row, ["Original Question", "Simplified Form", "Category"], "Original Question"),
+    "json": (_json_row, ["input", "output"], "input"),
+    "ocr": (_ocr_row, ["input", "output"], "input"),
+    "calc": (_calc_row, ["prompt", "output"], "prompt"),
+}
+
+
+# ── de-duplication ────────────────────────────────────────────────────────────
+class BloomFilter:
+    """Bloom filter over a byte buffer (one byte per slot).
+
+    A byte per slot instead of a bit costs 8x the memory but makes every
+    update a single-byte store, so several processes can share one filter
+    without lost updates.
+    """
+
+    def __init__(self, n_slots, n_hashes, buf=None):
+        self.n_slots = n_slots
+        self.n_hashes = n_hashes
+        self.slots = np.frombuffer(buf, dtype=np.uint8, count=n_slots) if buf is not None \
+            else np.zeros(n_slots, dtype=np.uint8)
+
+    @staticmethod
+    def size_for(capacity, error_rate):
+        """(slots, hashes) for ``capacity`` items at the given false-positive rate."""
+        n_slots = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        n_hashes = max(round(n_slots / capacity * math.log(2)), 1)
+        return n_slots, n_hashes
+
+    def _positions(self, key):
+        digest = xxhash.xxh3_128_intdigest(key.encode("utf-8"))
+        h1, h2 = digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+        return [(h1 + i * h2) % self.n_slots for i in range(self.n_hashes)]
+
+    def add(self, key):
+        """Insert ``key``; returns False if it was (probably) present already."""
+        pos = self._positions(key)
+        if all(self.slots[p] for p in pos):
+            return False
+        self.slots[pos] = 1
+        return True
+
+
+# ── writers ───────────────────────────────────────────────────────────────────
+class ShardWriter:
+    """Appends batches of row dicts to one shard file."""
+
+    def __init__(self, path, fmt, columns):
+        self.path, self.fmt, self.columns = path, fmt, columns
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._pa = pa
+            self._schema = pa.schema([(c, pa.string()) for c in columns])
+            self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+            if fmt == "csv":
+                self._csv = csv.DictWriter(self._file, fieldnames=columns)
+                self._csv.writeheader()
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.fmt == "parquet":
+            table = self._pa.table({c: [str(r[c]) for r in rows] for c in self.columns}, schema=self._schema)
+            self._writer.write_table(table)
+        elif self.fmt == "csv":
+            self._csv.writerows(rows)
+        else:
+            self._file.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+
+    def close(self):
+        if self.fmt == "parquet":
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+# ── workers ───────────────────────────────────────────────────────────────────
+_shared = None  # (SharedMemory, BloomFilter) in each worker when --dedup global
+
+
+def _attach_filter(name, n_slots, n_hashes):
+    global _shared
+    shm = shared_memory.SharedMemory(name=name)
+    _shared = (shm, BloomFilter(n_slots, n_hashes, shm.buf))
+
+
+def shard_seed(seed, shard):
+    return f"{seed}:{shard}"
+
+
+def run_shard(generator, shard, n_shards, rows, seed, out_dir, fmt, dedup, error_rate, batch_rows, max_attempts):
+    """Generate ``rows`` rows for one shard; returns its stats."""
+    start = time.perf_counter()
+    make_row, columns, key_column = GENERATORS[generator]
+    rng = random.Random(shard_seed(seed, shard))
+    if dedup == "global":
+        bloom = _shared[1]
+    elif dedup == "shard":
+        bloom = BloomFilter(*BloomFilter.size_for(rows, error_rate))
+    else:
+        bloom = None
+
+    path = Path(out_dir) / f"{generator}-{shard:05d}-of-{n_shards:05d}.{fmt}"
+    writer = ShardWriter(path, fmt, columns)
+    written = duplicates = attempts = 0
+    batch = []
+    try:
+        while written + len(batch) < rows and attempts < rows * max_attempts:
+            attempts += 1
+            row = make_row(rng)
+            if bloom is not None and not bloom.add(row[key_column]):
+                duplicates += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write(batch)
+                written += len(batch)
+                batch = []
+        writer.write(batch)
+        written += len(batch)
+    finally:
+        writer.close()
+    return {
+        "shard": shard,
+        "path": str(path),
+        "rows": written,
+        "duplicates": duplicates,
+        "exhausted": written < rows,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("generator", choices=sorted(GENERATORS))
+    parser.add_argument("--rows", type=int, required=True, help="total rows to generate")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--format", choices=["parquet", "jsonl", "csv"], default="parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shards", type=int, default=None, help="default: 4 per worker")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dedup", choices=["global", "shard", "none"], default="global")
+    parser.add_argument("--error-rate", type=float, default=1e-3, help="Bloom filter false-positive rate")
+    parser.add_argument("--batch-rows", type=int, default=50_000, help="rows buffered per write")
+    parser.add_argument("--max-attempts", type=int, default=20,
+                        help="give up on a shard after rows x this many draws (template set exhausted)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    n_shards = args.shards or args.workers * 4
+    os.makedirs(args.out, exist_ok=True)
+    per_shard = [args.rows // n_shards + (i < args.rows % n_shards) for i in range(n_shards)]
+
+    shm = None
+    initializer, initargs = None, ()
+    if args.dedup == "global":
+        n_slots, n_hashes = BloomFilter.size_for(args.rows, args.error_rate)
+        shm = shared_memory.SharedMemory(create=True, size=n_slots)
+        initializer, initargs = _attach_filter, (shm.name, n_slots, n_hashes)
+        print(f"Bloom filter: {n_slots / 2 ** 20:.1f} MiB shared, {n_hashes} hashes")
+
+    start = time.perf_counter()
+    total = duplicates = 0
+    exhausted = []
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=initializer, initargs=initargs) as pool:
+            futures = [
+                pool.submit(run_shard, args.generator, shard, n_shards, rows, args.seed, args.out, args.format,
+                            args.dedup, args.error_rate, args.batch_rows, args.max_attempts)
+                for shard, rows in enumerate(per_shard)
+            ]
+            for future in as_completed(futures):
+                stats = future.result()
+                total += stats["rows"]
+                duplicates += stats["duplicates"]
+                if stats["exhausted"]:
+                    exhausted.append(stats["shard"])
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    elapsed = time.perf_counter() - start
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"{total:,} rows in {n_shards} shards under {args.out} in {elapsed:.1f}s "
+          f"({total / elapsed:,.0f} rows/s), {duplicates:,} duplicates skipped, "
+          f"peak worker RSS {worker_rss:.0f} MB")
+    if exhausted:
+        print(f"warning: {len(exhausted)} shard(s) ran out of unique prompts; "
+              f"the '{args.generator}' template set cannot yield {args.rows:,} distinct rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,67 +27,76 @@ refined_templates = [
     "format the following information as JSON. Example: {{\"field\": \"data\"}}"
 ]
 
-data = []
-for _ in range(1000):
-    action = random.choice(actions)
-    obj = random.choice(objects)
-    template = random.choice(templates)
+ocr_actions = [
+    "extract text from", "recognize text in", "read", "scan", "get text from", "perform OCR on", "convert image to text"
+]
+ocr_objects = [
+    "this image", "the image", "the scanned document", "the photo", "the screenshot", "this document image"
+]
+ocr_templates = [
+    "{action} {object}",
+    "can you {action} {object}",
+    "please {action} {object}",
+    "help me {action} {object}",
+    "could you {action} {object}",
+    "i need to {action} {object}",
+    "would you {action} {object}",
+    "can you help me {action} {object}",
+    "could you please {action} {object}",
+    "can you please {action} {object}",
+    "please help me {action} {object}"
+]
+ocr_refined_templates = [
+    "please extract text from {object}",
+    "please perform OCR on {object}",
+    "please recognize text in {object}"
+]
+
+
+# One JSON-formatter prompt refinement row
+def generate_json_formatter_row(rng=random):
+    action = rng.choice(actions)
+    obj = rng.choice(objects)
+    template = rng.choice(templates)
     input_text = template.format(action=action, object=obj)
-    refined_template = random.choice(refined_templates)
+    refined_template = rng.choice(refined_templates)
     output_text = refined_template
-    data.append({
+    return {
         "input": input_text,
         "output": output_text
-    })
+    }
 
-with open("json_formatter_training_data.csv", "w", encoding="utf-8", newline='') as f:
-    writer = csv.DictWriter(f, fieldnames=["input", "output"])
-    writer.writeheader()
-    writer.writerows(data)
 
-# Function for prompt refinement for OCR tool
-def generate_ocr_prompt_data(num_samples=1000, output_file="ocr_prompt_training_data.csv"):
-    ocr_actions = [
-        "extract text from", "recognize text in", "read", "scan", "get text from", "perform OCR on", "convert image to text"
-    ]
-    ocr_objects = [
-        "this image", "the image", "the scanned document", "the photo", "the screenshot", "this document image"
-    ]
-    ocr_templates = [
-        "{action} {object}",
-        "can you {action} {object}",
-        "please {action} {object}",
-        "help me {action} {object}",
-        "could you {action} {object}",
-        "i need to {action} {object}",
-        "would you {action} {object}",
-        "can you help me {action} {object}",
-        "could you please {action} {object}",
-        "can you please {action} {object}",
-        "please help me {action} {object}"
-    ]
-    ocr_refined_templates = [
-        "please extract text from {object}",
-        "please perform OCR on {object}",
-        "please recognize text in {object}"
-    ]
-    ocr_data = []
-    for _ in range(num_samples):
-        action = random.choice(ocr_actions)
-        obj = random.choice(ocr_objects)
-        template = random.choice(ocr_templates)
-        input_text = template.format(action=action, object=obj)
-        refined_template = random.choice(ocr_refined_templates)
-        output_text = refined_template.format(action=action, object=obj)
-        ocr_data.append({
-            "input": input_text,
-            "output": output_text
-        })
+# One OCR prompt refinement row
+def generate_ocr_prompt_row(rng=random):
+    action = rng.choice(ocr_actions)
+    obj = rng.choice(ocr_objects)
+    template = rng.choice(ocr_templates)
+    input_text = template.format(action=action, object=obj)
+    refined_template = rng.choice(ocr_refined_templates)
+    output_text = refined_template.format(action=action, object=obj)
+    return {
+        "input": input_text,
+        "output": output_text
+    }
+
+
+def _write_rows(rows, output_file):
     with open(output_file, "w", encoding="utf-8", newline='') as f:
         writer = csv.DictWriter(f, fieldnames=["input", "output"])
         writer.writeheader()
-        writer.writerows(ocr_data)
+        writer.writerows(rows)
+
+
+# Function for prompt refinement for JSON formatter tool
+def generate_json_formatter_data(num_samples=1000, output_file="json_formatter_training_data.csv"):
+    _write_rows([generate_json_formatter_row() for _ in range(num_samples)], output_file)
+
+
+# Function for prompt refinement for OCR tool
+def generate_ocr_prompt_data(num_samples=1000, output_file="ocr_prompt_training_data.csv"):
+    _write_rows([generate_ocr_prompt_row() for _ in range(num_samples)], output_file)
 
 if __name__ == "__main__":
-    # Already generated JSON formatter data above
-    generate_ocr_prompt_data()
\ No newline at end of file
+    generate_json_formatter_data()
+    generate_ocr_prompt_data()
@@ -1,5 +1,6 @@
 import random
 import csv
+from functools import lru_cache
 import inflect
 
 # Define categories and corresponding templates
@@ -72,35 +73,42 @@ categories = {
     ]
 }
 
-# Function to generate synthetic data
-def generate_data(num_samples):
-    data = []
-    for _ in range(num_samples):
-        category = random.choice(list(categories.keys()))
-        #print(category)
-        template, simplified = random.choice(categories[category])
-        num_placeholders = max(template.count("{}"), simplified.count("{}"))
-        if(category == "tables"):
-            num_placeholders = 1  # For table questions, we only need one number
+_inflect_engine = None
+
+
+# Randomly decide whether to use digits or words for each number
+@lru_cache(maxsize=None)  # only 10k distinct numbers are ever drawn
+def num_to_word(n):
+    global _inflect_engine
+    if _inflect_engine is None:  # building the engine is far slower than using it
+        _inflect_engine = inflect.engine()
+    return _inflect_engine.number_to_words(n)
+
 
-        nums = [random.randint(1, 10000) for _ in range(num_placeholders)]
-        # Randomly decide whether to use digits or words for each number
-        def num_to_word(n):
-            p = inflect.engine()
-            return p.number_to_words(n)
+# Function to generate one synthetic row: (original, simplified_form, category)
+def generate_row(rng=random):
+    category = rng.choice(list(categories.keys()))
+    template, simplified = rng.choice(categories[category])
+    num_placeholders = max(template.count("{}"), simplified.count("{}"))
+    if(category == "tables"):
+        num_placeholders = 1  # For table questions, we only need one number
 
-        # Use only as many numbers as needed for the template
-        nums_in_words = [num_to_word(n) if random.choice([True, False]) else n for n in nums[:template.count("{}")]]
-        original = template.format(*nums_in_words)
-        # For tables, ensure the same number is used in both places in the simplified template
-        if category == "tables":
-            simplified_form = f"calculate the expression: {simplified.format(nums[0], nums[0])}"
-        else:
-            simplified_form = f"calculate the expression: {simplified.format(*nums[:simplified.count('{}')])}"
-        #print(simplified.count('{}'), nums[:simplified.count('{}')])
-        #print(original, simplified_form, category)
-        data.append((original, simplified_form, category))
-    return data
+    nums = [rng.randint(1, 10000) for _ in range(num_placeholders)]
+
+    # Use only as many numbers as needed for the template
+    nums_in_words = [num_to_word(n) if rng.choice([True, False]) else n for n in nums[:template.count("{}")]]
+    original = template.format(*nums_in_words)
+    # For tables, ensure the same number is used in both places in the simplified template
+    if category == "tables":
+        simplified_form = f"calculate the expression: {simplified.format(nums[0], nums[0])}"
+    else:
+        simplified_form = f"calculate the expression: {simplified.format(*nums[:simplified.count('{}')])}"
+    return (original, simplified_form, category)
+
+
+# Function to generate synthetic data
+def generate_data(num_samples, rng=random):
+    return [generate_row(rng) for _ in range(num_samples)]
 
 
 # Main function to run the script
@@ -116,4 +124,4 @@ def main():
    print(f"Dataset of {num_samples} samples saved to: {output_file}")
    
 if __name__ == "__main__":
-   main()
\ No newline at end of file
+   main()
\ No newline at end of file
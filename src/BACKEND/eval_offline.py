@@ -0,0 +1,281 @@
+"""Offline evaluation of the T5 rewriter and the SLAM agent.
+
+Streams a JSONL / Parquet / CSV file of prompts and expected outputs and
+writes one JSON line per item (latency, tokens, correctness) to ``--out``,
+followed by an aggregate summary in ``<out>.summary.json``.
+
+* ``t5``    – ``ModelInterfaceT5.infer_batch`` over length-sorted padded batches
+  (``latency_s`` is the item's share of its batch, ``batch_latency_s`` the batch)
+* ``agent`` – ``Agent.chat`` across a process pool of runner replicas, each
+  with its own llama.cpp model and ``cpus / replicas`` threads
+
+Results are appended as items finish; rerunning with ``--resume`` skips the
+ids already in ``--out``.
+
+Run from ``src/BACKEND``:
+    python eval_offline.py t5 --data dataset/heldout.jsonl --out eval/t5.jsonl
+    python eval_offline.py agent --data heldout.parquet --out eval/agent.jsonl --replicas 4 --match contains
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+
+
+# ── input ─────────────────────────────────────────────────────────────────────
+def _read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a ``.parquet`` / ``.csv`` / JSONL file; the file stays open only while iterating."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+        with pq.ParquetFile(path) as pf:
+            for batch in pf.iter_batches(batch_size=4096):
+                yield from batch.to_pylist()
+    elif suffix == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from (json.loads(line) for line in f if line.strip())
+
+
+def read_items(path: str, prompt_field: str, expected_field: str, id_field: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Yield ``{"id", "prompt", "expected"}`` without loading the whole file."""
+    for i, row in enumerate(_read_rows(path)):
+        yield {
+            "id": str(row[id_field]) if id_field else str(i),
+            "prompt": row[prompt_field],
+            "expected": row.get(expected_field),
+        }
+
+
+def done_ids(out_path: str) -> Set[str]:
+    if not os.path.exists(out_path):
+        return set()
+    # drop a record cut short by an interrupted run
+    with open(out_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with open(out_path, encoding="utf-8") as f:
+        return {json.loads(line)["id"] for line in f if line.strip()}
+
+
+# ── scoring ───────────────────────────────────────────────────────────────────
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _norm(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def is_correct(response: str, expected: Optional[str], mode: str) -> Optional[bool]:
+    if expected is None:
+        return None
+    if mode == "exact":
+        return _norm(response) == _norm(expected)
+    if mode == "contains":
+        return _norm(expected) in _norm(response)
+    # numeric: every number in the expected answer appears in the response
+    got = [float(x) for x in _NUMBER.findall(response)]
+    want = [float(x) for x in _NUMBER.findall(str(expected))]
+    return bool(want) and all(any(abs(w - g) <= 1e-6 * max(1.0, abs(w)) for g in got) for w in want)
+
+
+# ── T5 ────────────────────────────────────────────────────────────────────────
+def eval_t5(items: Iterator[Dict[str, Any]], args, emit) -> None:
+    from model_interface import ModelInterfaceT5
+
+    model = ModelInterfaceT5()
+    while True:
+        chunk = list(islice(items, args.chunk))
+        if not chunk:
+            return
+        # sort by length so each padded batch wastes little
+        chunk.sort(key=lambda item: len(item["prompt"]))
+        for start in range(0, len(chunk), args.batch_size):
+            batch = chunk[start:start + args.batch_size]
+            t0 = time.perf_counter()
+            outputs = model.infer_batch([item["prompt"] for item in batch], max_length=args.max_length)
+            elapsed = time.perf_counter() - t0
+            for item, out in zip(batch, outputs):
+                # per-item share of the batch, so percentiles compare with the agent's
+                emit(item, out["response"], {
+                    "latency_s": elapsed / len(batch),
+                    "batch_latency_s": elapsed,
+                    "batch_size": len(batch),
+                    "output_tokens": out["output_tokens"],
+                })
+
+
+# ── agent ─────────────────────────────────────────────────────────────────────
+_replica = None  # ModelInterfacePhi4 in each worker process
+
+
+def _init_replica(n_threads: int) -> None:
+    global _replica
+    from model_interface import ModelInterfacePhi4
+    from SLM.src.config import get_default_config
+
+    config = get_default_config()
+    config.hardware.n_threads = n_threads
+    _replica = ModelInterfacePhi4(config)
+
+
+def _run_agent_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    from SLM.src.agentic import Agent, TextDelta, Transcript
+
+    agent = Agent(_replica.config, runner=_replica.agent.runner)
+    transcript, first = Transcript(), None
+    t0 = time.perf_counter()
+    try:
+        for event in agent.chat(_replica.system_message, item["prompt"]):
+            if first is None and isinstance(event, TextDelta) and event.text:
+                first = time.perf_counter() - t0
+            transcript.add(event)
+        error = None
+    except Exception as exc:
+        error = str(exc)
+    return {
+        "item": item,
+        "response": transcript.text,
+        "metrics": {
+            "latency_s": time.perf_counter() - t0,
+            "ttft_s": first,
+            "output_tokens": agent.usage["generated_tokens"],
+            "wasted_tokens": agent.usage["wasted_tokens"],
+            "tool_calls": agent.usage["tool_calls"],
+            "error": error,
+        },
+    }
+
+
+def eval_agent(items: Iterator[Dict[str, Any]], args, emit) -> None:
+    threads = args.threads or max((os.cpu_count() or 1) // args.replicas, 1)
+    with ProcessPoolExecutor(max_workers=args.replicas, initializer=_init_replica, initargs=(threads,)) as pool:
+        pending = set()
+        for item in items:
+            # bounded in-flight work keeps memory flat on large inputs
+            if len(pending) >= 2 * args.replicas:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    r = future.result()
+                    emit(r["item"], r["response"], r["metrics"])
+            pending.add(pool.submit(_run_agent_item, item))
+        for future in wait(pending).done:
+            r = future.result()
+            emit(r["item"], r["response"], r["metrics"])
+
+
+# ── summary ───────────────────────────────────────────────────────────────────
+def summarize(out_path: str, wall_s: float) -> Dict[str, Any]:
+    """Aggregate over every record in ``out_path`` (including resumed ones)."""
+    latency: List[float] = []
+    tokens = correct = scored = errors = n = 0
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            n += 1
+            latency.append(r["latency_s"])
+            tokens += r.get("output_tokens") or 0
+            errors += bool(r.get("error"))
+            if r["correct"] is not None:
+                scored += 1
+                correct += r["correct"]
+    lat = np.array(latency or [0.0])
+    return {
+        "items": n,
+        "accuracy": correct / scored if scored else None,
+        "errors": errors,
+        "output_tokens": tokens,
+        "latency_s": {
+            "mean": float(lat.mean()),
+            "p50": float(np.percentile(lat, 50)),
+            "p95": float(np.percentile(lat, 95)),
+            "max": float(lat.max()),
+        },
+        "wall_s_this_run": wall_s,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=["t5", "agent"])
+    parser.add_argument("--data", required=True, help=".jsonl, .parquet or .csv")
+    parser.add_argument("--out", required=True, help="per-item results (JSONL)")
+    parser.add_argument("--prompt-field", default="input")
+    parser.add_argument("--expected-field", default="target")
+    parser.add_argument("--id-field", default=None, help="default: row number")
+    parser.add_argument("--match", choices=["exact", "contains", "numeric"], default=None,
+                        help="default: exact for t5, contains for agent")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--resume", action="store_true", help="skip ids already present in --out")
+    # t5
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk", type=int, default=2048, help="items sorted by length together")
+    parser.add_argument("--max-length", type=int, default=50)
+    # agent
+    parser.add_argument("--replicas", type=int, default=2, help="runner processes, one model each")
+    parser.add_argument("--threads", type=int, default=None, help="llama.cpp threads per replica")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    match = args.match or ("exact" if args.target == "t5" else "contains")
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+
+    skip = done_ids(args.out) if args.resume else set()
+    if not args.resume and os.path.exists(args.out):
+        os.remove(args.out)
+    items = (item for item in read_items(args.data, args.prompt_field, args.expected_field, args.id_field)
+             if item["id"] not in skip)
+    if args.limit is not None:
+        items = islice(items, args.limit)
+    if skip:
+        print(f"Resuming: {len(skip)} items already scored")
+
+    count = tokens = 0
+    start = time.perf_counter()
+    with open(args.out, "a", encoding="utf-8") as out:
+        def emit(item, response, metrics):
+            nonlocal count, tokens
+            record = {"id": item["id"], "prompt": item["prompt"], "expected": item["expected"],
+                      "response": response, "correct": is_correct(response, item["expected"], match)}
+            record.update(metrics)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()  # every finished item is a checkpoint
+            count += 1
+            tokens += metrics.get("output_tokens") or 0
+            if count % 100 == 0:
+                print(f"{count} items, {count / (time.perf_counter() - start):.1f} items/s")
+
+        (eval_t5 if args.target == "t5" else eval_agent)(items, args, emit)
+
+    wall = time.perf_counter() - start
+    summary = summarize(args.out, wall)
+    summary.update({
+        "target": args.target,
+        "match": match,
+        "items_this_run": count,
+        "items_per_s": count / wall if wall else None,
+        "output_tokens_per_s": tokens / wall if wall else None,
+    })
+    with open(f"{args.out}.summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,233 @@
 ##SLAM-Backend##
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
-from TOOLS.OCR import get_ocr_text
+from TOOLS.OCR import get_ocr_service, get_ocr_text
 from TOOLS.calculator import evaluate_expression
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from TOOLS.json_formatter import format_json_from_text, find_syntax_error, iter_chunks, iter_format
+from TOOLS.translator import get_translator_service
+from TOOLS.scratchpad import ScratchpadService
+from TOOLS.retrieval import extract_text, get_document_index, search_documents
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from model_interface import ModelInterfaceT5 , ModelInterfacePhi4    
+from SLM.src.utils.executors import get_inference_executor, get_t5_executor, get_tool_executor, run_in_executor
+from SLM.src.config import get_small_config
+from SLM.src.agentic import register_tool
+from SLM.src.utils.tracing import TracingMiddleware, ingest
+from SLM.src.utils.profiling import ProfilingMiddleware, get_profiler
+from router import Router
+from uploads import DOCUMENT_KINDS, IMAGE_KINDS, TEXT_KINDS, receive_upload
 
 
 app = FastAPI()
+# X-SLAM-Profile: cprofile|sample (or ?profile=) on /slam, /infer_t5 and /OCR captures a
+# profile of that request, rate-capped; listed and downloaded from /admin/profiles
+app.add_middleware(ProfilingMiddleware)
+# Per-request spans (UI -> router -> agent -> tools), written to SLAM_TRACE_FILE;
+# breakdown with `python -m SLM.src.utils.tracing`
+app.add_middleware(TracingMiddleware)
 
 model_interface = ModelInterfaceT5()
 slm_runner = ModelInterfacePhi4()
 
+# Simple queries go to the calculator or a smaller GGUF instead of the full agent
+small_config = get_small_config()
+small_runner = ModelInterfacePhi4(small_config) if small_config.model.model_path.exists() else None
+router = Router(slm_runner, rewriter=model_interface, small=small_runner)
+# Uploaded files are indexed, not pasted into the prompt; the agent pulls the top chunks
+register_tool("search_documents", search_documents, {"query": str})
+# Rolling scratchpad summaries are refreshed in the background, on the small model when there is one
+scratchpads = ScratchpadService(summarizer=(small_runner or slm_runner).summarize, executor=get_inference_executor())
+
 
 class Query(BaseModel):
     input_text: str
 
+class TranslateQuery(BaseModel):
+    text: str
+    stream: bool = False  # send the translation sentence batch by sentence batch
+
+class ScratchpadToggle(BaseModel):
+    session_id: str
+    enabled: bool
+
+class ScratchpadNote(BaseModel):
+    session_id: str
+    text: str
+
+class TraceSpans(BaseModel):
+    spans: List[Dict[str, Any]]  # client-side spans of a trace, OTLP field names
+
+class SlamQuery(Query):
+    raw_text: Optional[str] = None  # the user's query before the T5 rewrite
+    rewritten_text: Optional[str] = None  # T5 output; computed by the router if missing
+
 @app.get("/ping")
 def ping():
     return {"response": "Hi , SLAM backend is up and running"}
 
 
+@app.post("/traces")
+def traces(query: TraceSpans):
+    # the UI's round-trip spans, stored next to the server's own
+    return {"response": ingest(query.spans)}
+
+
+@app.get("/admin/profiles")
+def list_profiles():
+    profiler = get_profiler()
+    return {"response": {"profiles": profiler.list(), "stats": profiler.stats()}}
+
+@app.get("/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, format: str = "raw"):
+    # raw: the .prof (pstats / snakeviz) or .folded (flamegraph) file; text: top functions
+    profiler = get_profiler()
+    path = profiler.path(profile_id)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail=f"no profile {profile_id}")
+    if format == "text":
+        return PlainTextResponse(profiler.summary(profile_id))
+    return FileResponse(path, filename=path.name, media_type="application/octet-stream")
+
+
+@app.get("/startup_report")
+def startup_report():
+    # model load / page-in / warm-up timings, RSS and residency of the agent model
+    return {"response": slm_runner.agent.runner.startup_report}
+
+
+@app.get("/context_stats")
+def context_stats():
+    # prompts over the context window and which fallback handled them
+    return {"response": slm_runner.agent.runner.context_guard.stats()}
+
+
 @app.post("/OCR")
-async def get_ocr(image: UploadFile = File(...)):
-    image=await(image.read())
-    return get_ocr_text(image)
+async def get_ocr(request: Request, roi: Optional[str] = None):
+    # multipart field 'image', streamed to a spool and handed to OCR as a zero-copy view;
+    # roi="x,y,w,h" restricts OCR to that region of the image
+    try:
+        region = tuple(int(v) for v in roi.split(",")) if roi else None
+    except ValueError:
+        region = ()
+    if region is not None and len(region) != 4:
+        raise HTTPException(status_code=400, detail="roi must be 'x,y,w,h'")
+    upload = await receive_upload(request, field="image", kinds=IMAGE_KINDS)
+    try:
+        return await run_in_executor(get_tool_executor(), get_ocr_text, upload.view(), region)
+    finally:
+        upload.close()
+
+@app.get("/ocr_stats")
+def ocr_stats():
+    return {"response": get_ocr_service().stats()}
+
+@app.post("/documents")
+async def upload_document(request: Request):
+    upload = await receive_upload(request, field="file", kinds=DOCUMENT_KINDS)
+    name = upload.filename or f"upload.{'txt' if upload.kind == 'text' else upload.kind}"
+    try:
+        text = await run_in_executor(get_tool_executor(), extract_text, name, upload.view())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"could not read {name}: {e}")
+    finally:
+        upload.close()
+    if not text.strip():
+        raise HTTPException(status_code=400, detail=f"no text found in {name}")
+    result = await run_in_executor(get_tool_executor(), get_document_index().add_document, name, text)
+    return {"response": result}
+
+@app.get("/documents")
+def list_documents():
+    index = get_document_index()
+    return {"response": {"documents": index.documents(), "stats": index.stats()}}
+
+@app.get("/documents/search")
+async def search(query: str, k: int = 3):
+    return {"response": await run_in_executor(get_tool_executor(), get_document_index().search, query, k)}
 
 @app.post("/calculator")
 def calculate(query : str):
     response = evaluate_expression(query)
     return {"response": response} 
 
+def _formatted(upload, indent: Optional[int]):
+    try:
+        for text in iter_format(iter_chunks(upload.file()), indent=indent):
+            yield text.encode("utf-8")
+    finally:
+        upload.close()
+
 @app.post("/json_formatter")
-def json_format(query: str = None):
-    return {"response": query}
-def json_format(query: str = None):
-    return {"response": query}
+async def json_format(request: Request, query: str = None, mode: str = "pretty", indent: int = 2):
+    # Small snippets come as ?query=; documents as the request body or a file upload,
+    # checked and then re-formatted chunk by chunk (mode: pretty | minify | validate)
+    if query is not None:
+        return {"response": format_json_from_text(query)}
+    if mode not in ("pretty", "minify", "validate"):
+        raise HTTPException(status_code=400, detail=f"unknown mode {mode!r}")
+    upload = await receive_upload(request, field="file", kinds=TEXT_KINDS)
+    error = await run_in_executor(get_tool_executor(), find_syntax_error, iter_chunks(upload.file()))
+    if error is not None or mode == "validate":
+        upload.close()
+        report = {"valid": error is None, "error": error.to_dict() if error else None}
+        return JSONResponse(status_code=400 if error else 200, content={"response": report})
+    return StreamingResponse(_formatted(upload, None if mode == "minify" else indent), media_type="application/json")
 
 @app.post("/translator")
-def translator(text: str):
-    return {"response": f"Hi , Placeholder for translator-{text}"}
+async def translator(text: str = None, query: Optional[TranslateQuery] = None):
+    # English -> French; long documents go in the JSON body rather than ?text=
+    if query is None:
+        if text is None:
+            raise HTTPException(status_code=400, detail="no text to translate")
+        query = TranslateQuery(text=text)
+    if not query.text.strip():
+        return {"response": "❌ No text provided."}
+    service = get_translator_service()
+    try:
+        if query.stream:
+            return StreamingResponse(service.astream(query.text), media_type="text/plain; charset=utf-8")
+        return {"response": await service.atranslate(query.text)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scratchpad/toggle")
+def scratchpad_toggle(query: ScratchpadToggle):
+    # turning it off returns the rolling summary right away, no model call
+    return {"response": scratchpads.toggle(query.session_id, query.enabled)}
+
+@app.post("/scratchpad/note")
+def scratchpad_note(query: ScratchpadNote):
+    return {"response": {"notes": scratchpads.add_note(query.session_id, query.text)}}
+
+@app.get("/scratchpad")
+def scratchpad(session_id: str):
+    return {"response": scratchpads.info(session_id)}
+
+@app.get("/scratchpad_stats")
+def scratchpad_stats():
+    return {"response": scratchpads.stats()}
+
+@app.get("/translator_stats")
+def translator_stats():
+    return {"response": get_translator_service().stats()}
 
 @app.post("/infer_t5")
 async def infer_t5(query: Query):
     try:
-        response = model_interface.infer(query.input_text)
+        response = await run_in_executor(get_t5_executor(), model_interface.infer, query.input_text)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/slam")
-async def slam(query: Query):
+async def slam(query: SlamQuery):
     try:
-        response = slm_runner.infer(query.input_text)
+        response = await router.aroute(query.input_text, raw=query.raw_text, rewrite=query.rewritten_text)
         return response
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/router_stats")
+def router_stats():
+    return {"response": router.stats()}
\ No newline at end of file
@@ -1,36 +1,57 @@
 
 #Importing the model
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-from peft import PeftModel, PeftConfig
-import torch
-from SLM.src.agentic import Agent 
+# transformers / peft / torch are only imported once ModelInterfaceT5 is built
+from SLM.src.utils.lazy import lazy_import
+from SLM.src.agentic import Agent, TextDelta, Transcript
 from SLM.src.config import get_pretrained_config,get_default_config
+from SLM.src.utils.tracing import traced
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+peft = lazy_import("peft")
 
 
 class ModelInterfaceT5:
     def __init__(self):
         self.peft_model_id="src/MODELS/flan-t5-math-lora-out-saved"
-        self.config = PeftConfig.from_pretrained(self.peft_model_id)
-        self.base_model = T5ForConditionalGeneration.from_pretrained(self.config.base_model_name_or_path)
-        self.model = PeftModel.from_pretrained(self.base_model, self.peft_model_id)
-        self.tokenizer = T5Tokenizer.from_pretrained(self.peft_model_id)
+        self.config = peft.PeftConfig.from_pretrained(self.peft_model_id)
+        self.base_model = transformers.T5ForConditionalGeneration.from_pretrained(self.config.base_model_name_or_path)
+        self.model = peft.PeftModel.from_pretrained(self.base_model, self.peft_model_id)
+        self.tokenizer = transformers.T5Tokenizer.from_pretrained(self.peft_model_id)
         # Set the device to GPU if available, otherwise CPU
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = self.model.to(self.device)
-        self.tokenizer=T5Tokenizer.from_pretrained(self.peft_model_id)
+        self.tokenizer=transformers.T5Tokenizer.from_pretrained(self.peft_model_id)
         
 
+    @traced("t5.rewrite")
     def infer(self, query: str) -> str:
         inputs = self.tokenizer(query, return_tensors="pt").to(self.device)
         outputs = self.model.generate(input_ids=inputs.input_ids, max_length=50)
         answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
         return {"response": answer}
+
+    def infer_batch(self, queries, max_length: int = 50):
+        """Batched ``infer``: pads to the longest query and decodes all answers in one ``generate`` call."""
+        inputs = self.tokenizer(queries, padding=True, return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                input_ids=inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                max_length=max_length,
+            )
+        answers = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        pad = self.tokenizer.pad_token_id
+        return [
+            {"response": answer, "output_tokens": int((out != pad).sum())}
+            for answer, out in zip(answers, outputs)
+        ]
     
 class ModelInterfacePhi4:
-    def __init__(self):
+    def __init__(self, config=None):
         # self.config = get_pretrained_config(repo_id="unsloth/Phi-4-mini-instruct-GGUF",
         #                     filename="src/SLM/models/Phi-4-mini-instruct-Q5_K_M.gguf")
-        self.config= get_default_config()
+        self.config= config or get_default_config()
         self.config.model.use_prompt=False
         self.agent=Agent(self.config)
         self.system_message=  """
@@ -40,6 +61,7 @@ You are a helpful AI assistant with access to tool. Before acting on a step, ALW
    {"name": "get_date", "parameters": {}}
    {"name": "python_shell", "parameters": {"code": "<code using standard libraries>"}}
    {"name": "get_weather_details", "parameters": {"location": "<location>"}}
+   {"name": "search_documents", "parameters": {"query": "<keywords>"}}
 2. Wait for the tool result, once you get it, say something like "Now that we have the `result_value`, we can proceed with the next step."
 3. Continue your response using the tool result
 
@@ -50,6 +72,7 @@ Available tools:
 - get_date: Returns current date in YYYYMMDD format (requires empty {} parameter)
 - python_shell: Executes Python code and returns its result (requires "code" parameter)
 - get_weather_details: Fetches weather details for a location (requires "location" parameter)
+- search_documents: Returns the passages of the user's uploaded files most relevant to a query (requires "query" parameter). Use it for any question about an uploaded document instead of guessing its content.
 
 Tool results will be provided in the format: [Tool <name> returned: <result> | $result_N], always use $result_N to refer to the result of the Nth tool call. You cannot refer to subvalues within $result_N, always use the whole value.
 
@@ -63,12 +86,43 @@ Once all steps in the prompt are completed, summarize write an end message and p
 
 The minute you type "USER" the system will crash, be cautious.
 """
+    @traced("phi4.infer")
     def infer(self, query: str) -> str:
-        response=""
-        for tok in self.agent.chat(self.system_message,query):
-            response += tok
-            print(tok,end="",flush=True)
-        return {"response": response}
+        # answer text without the tool-call JSON, plus the tool log and token usage
+        transcript = Transcript()
+        for event in self.agent.chat(self.system_message,query):
+            transcript.add(event)
+            if isinstance(event, TextDelta):
+                print(event.text,end="",flush=True)
+        return transcript.to_response()
+
+    def summarize(self, summary: str, notes, max_tokens: int = 256) -> str:
+        """Fold ``notes`` into the running ``summary`` (scratchpad refreshes); greedy, no tools."""
+        runner = self.agent.runner
+        prompt = Agent._render([
+            {"role": "system", "content": "You maintain a concise running summary of a user's notes. "
+                                          "Merge the new notes into the summary, keep every fact, "
+                                          "and reply with the updated summary only."},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(empty)'}\n\nNew notes:\n"
+                                        + "\n".join(f"- {note}" for note in notes)},
+        ])
+        session = runner.open_session()
+        try:
+            session.eval(prompt)
+            # same plain-text format as the agent: stop before the model invents a USER turn
+            return "".join(session.stream(temperature=0.0, max_tokens=max_tokens, stop=["USER"])).strip()
+        finally:
+            session.close()
+
+    @traced("phi4.infer")
+    async def ainfer(self, query: str) -> str:
+        # Per-request agent so concurrent sessions don't share $result_N state;
+        # the loaded model is shared through the runner.
+        agent = Agent(self.config, runner=self.agent.runner)
+        transcript = Transcript()
+        async for event in agent.achat(self.system_message,query):
+            transcript.add(event)
+        return transcript.to_response()
     
 # if __name__ == "__main__":
 #     model_interface = ModelInterfaceT5()
@@ -0,0 +1,357 @@
+"""Routes ``/slam`` queries to the cheapest path that can answer them.
+
+Paths, tried in this order:
+  * ``tool``  – the T5 rewrite is a plain ``Calculate <expression>`` or
+    ``Calculate table of <n>`` whose numbers and operator are corroborated by
+    the raw query (in the same order for ``-``, ``/`` and ``^``), with no
+    grouping or operation the query doesn't ask for; answered by
+    ``TOOLS.calculator`` without any LLM
+  * ``small`` – a short single-step query; the agent on the smaller / lower-bit
+    GGUF from ``get_small_config`` (only if that model file exists)
+  * ``agent`` – everything else, on the full Phi-4-mini agent
+
+Each path has a confidence threshold (``RouterConfig``; a threshold above 1
+disables the path), falls back to the next path on failure, and keeps its
+own latency and CPU accounting (``Router.stats()``, ``GET /router_stats``).
+CPU time is process-wide, so it is exact only while requests don't overlap.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from SLM.src.utils.executors import get_t5_executor, get_tool_executor, run_in_executor
+from SLM.src.utils.tracing import current_span, span
+from TOOLS.calculator import evaluate_expression
+
+ROUTES = ("tool", "small", "agent")
+
+
+class RouterConfig(BaseModel):
+    """Thresholds for the router; defaults from ``SLAM_ROUTER_*`` environment variables."""
+    tool_threshold: float = Field(
+        default=float(os.environ.get("SLAM_ROUTER_TOOL_THRESHOLD", 0.9)), ge=0.0,
+        description="Minimum confidence that the rewrite is a faithful calculation"
+    )
+    small_threshold: float = Field(
+        default=float(os.environ.get("SLAM_ROUTER_SMALL_THRESHOLD", 0.7)), ge=0.0,
+        description="Minimum simplicity score for the small model"
+    )
+    small_max_words: int = Field(
+        default=int(os.environ.get("SLAM_ROUTER_SMALL_MAX_WORDS", 20)), ge=1,
+        description="Queries longer than this count against the small model"
+    )
+    stats_window: int = Field(default=1024, ge=1, description="Latencies kept per path for percentiles")
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    confidence: float
+    reason: str
+    answer: Optional[str] = None  # precomputed for the tool path
+
+
+# ── number / operator extraction ──────────────────────────────────────────────
+_UNITS = {w: i for i, w in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+    "fourteen fifteen sixteen seventeen eighteen nineteen".split())}
+_TENS = {w: 10 * i for i, w in enumerate("twenty thirty forty fifty sixty seventy eighty ninety".split(), 2)}
+_SCALES = {"hundred": 100, "thousand": 1000, "million": 10 ** 6}
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z]+|[^\sa-z\d]")
+
+# operator -> whole words (or symbols) in a query that ask for it; a hyphen
+# only counts outside words, so "twenty-one" is not a subtraction
+_OPERATOR_WORDS = {
+    "+": re.compile(r"\b(?:plus|add|adds|added|adding|addition|sum|total)\b|\+"),
+    "-": re.compile(r"\b(?:minus|subtract\w*|less|difference|take away|takes away)\b|(?<![a-z])-(?![a-z])"),
+    "*": re.compile(r"\b(?:times|multipl\w*|product|x)\b|\*(?!\*)"),
+    "/": re.compile(r"\b(?:divide\w*|division|quotient|over|split)\b|/"),
+    "^": re.compile(r"\b(?:power|powers|squared|cubed|exponent\w*|raised)\b|\^|\*\*"),
+}
+# operations the calculator rewrite has no symbol for: if the query asks for
+# one, the rewrite dropped it
+_UNSUPPORTED = re.compile(
+    r"\b(?:percent|percentage|root|sqrt|half|double|twice|triple|average|mean|factorial|log|sin|cos|tan)\b|%"
+)
+_NON_COMMUTATIVE = frozenset("-/^")
+_ARITHMETIC = re.compile(r"^[\d\s.+\-*/()^]+$")
+_TABLE = re.compile(r"^table of (\d+)$")
+_MULTI_STEP = re.compile(
+    r"\b(then|after that|afterwards|step|steps|first|finally|compare|explain|why|and also|"
+    r"each|every|convert|write a|code|function|program)\b"
+)
+
+
+def numbers_in(text: str) -> List[float]:
+    """Numbers written as digits or English words ("sixty eight" -> 68)."""
+    numbers: List[float] = []
+    current = total = 0
+    in_number = False
+
+    def flush():
+        nonlocal current, total, in_number
+        if in_number:
+            numbers.append(float(total + current))
+        current = total = 0
+        in_number = False
+
+    tokens = _TOKEN.findall(text.lower().replace("-", " "))
+    for i, token in enumerate(tokens):
+        if token[0].isdigit():
+            flush()
+            numbers.append(float(token))
+        elif token in _UNITS or token in _TENS:
+            low = current % 100
+            # "sixty seven" is one number, "seven five" or "twenty thirty" are two
+            joins = low == 0 or (low >= 20 and low % 10 == 0 and _UNITS.get(token, 10) < 10)
+            if in_number and not joins:
+                flush()
+            current += _UNITS.get(token, 0) + _TENS.get(token, 0)
+            in_number = True
+        elif token in _SCALES and in_number:
+            if _SCALES[token] == 100:
+                current *= 100
+            else:
+                total += current * _SCALES[token]
+                current = 0
+        elif (token == "and" and in_number and current % 100 == 0 and total + current > 0
+              and i + 1 < len(tokens) and (tokens[i + 1] in _UNITS or tokens[i + 1] in _TENS)):
+            continue  # "one hundred and five"
+        else:
+            flush()
+    flush()
+    return numbers
+
+
+def _mentions_operator(text: str, operator: str) -> bool:
+    return _OPERATOR_WORDS[operator].search(text.lower()) is not None
+
+
+def _operators_in(expression: str) -> set:
+    """Operators in a rewritten expression, with ``**`` read as ``^``."""
+    return {"^" if op == "**" else op for op in re.findall(r"\*\*|[+\-*/^]", expression)}
+
+
+def _multiset_match(expected: List[float], found: List[float]) -> float:
+    """1.0 if ``found`` holds exactly ``expected``, 0.5 if it contains it, else 0."""
+    remaining = list(found)
+    for n in expected:
+        if n not in remaining:
+            return 0.0
+        remaining.remove(n)
+    return 1.0 if not remaining else 0.5
+
+
+def _in_order(expected: List[float], found: List[float]) -> bool:
+    """True if ``expected`` occurs in ``found`` in the same order (not necessarily adjacent)."""
+    rest = iter(found)
+    return all(n in rest for n in expected)
+
+
+def calculation_confidence(raw: str, rewrite: str) -> Tuple[float, Optional[str], str]:
+    """
+    How sure we are that ``rewrite`` is a faithful, directly computable form of ``raw``.
+
+    Returns:
+        (confidence, tool input or None, reason)
+    """
+    lowered = rewrite.strip().lower().rstrip(".")
+    if not lowered.startswith("calculate "):
+        return 0.0, None, "rewrite is not a calculation"
+    body = lowered[len("calculate "):].strip()
+
+    table = _TABLE.match(body)
+    if table:
+        numbers = _multiset_match([float(table.group(1))], numbers_in(raw))
+        asked = re.search(r"\b(?:table|times|multipl\w*)\b", raw.lower()) is not None
+        return 0.6 * numbers + 0.4 * asked, body, "multiplication table"
+
+    if not _ARITHMETIC.match(body):
+        return 0.0, None, "expression is not plain arithmetic"
+    operators = _operators_in(body)
+    expected, found = numbers_in(body), numbers_in(raw)
+    numbers = _multiset_match(expected, found)
+    ops = all(_mentions_operator(raw, op) for op in operators)
+    confidence = 0.6 * numbers + 0.4 * ops
+    tool_input = f"calculate {body}"
+    if operators & _NON_COMMUTATIVE and not _in_order(expected, found):
+        # "3 minus 5" rewritten as "5 - 3": same numbers, different answer
+        return min(confidence, 0.5), tool_input, "operands reordered around a non-commutative operator"
+    if "(" in body and "(" not in raw:
+        # "3 times 4 plus 2" rewritten as "3 * (4 + 2)": the grouping is a guess
+        return min(confidence, 0.5), tool_input, "rewrite adds grouping"
+    dropped = [op for op in _OPERATOR_WORDS if op not in operators and _mentions_operator(raw, op)]
+    if dropped or _UNSUPPORTED.search(raw.lower()):
+        # "8 and 3 squared" rewritten as "8 - 3"
+        return min(confidence, 0.5), tool_input, "query asks for an operation the rewrite dropped"
+    return confidence, tool_input, "arithmetic"
+
+
+def simplicity(raw: str, max_words: int) -> float:
+    """Heuristic score in [0, 1]: 1 for a short single-step question."""
+    words = len(raw.split())
+    score = 1.0
+    score -= min(0.5, max(0, words - max_words) / max_words)
+    score -= 0.3 * min(2, len(_MULTI_STEP.findall(raw.lower())))
+    score -= 0.2 * (len(numbers_in(raw)) > 4)
+    score -= 0.2 * (raw.count("?") > 1)
+    return max(0.0, score)
+
+
+def run_tool(tool_input: str) -> Optional[str]:
+    """Answer for the tool path, or None if the calculator can't handle it."""
+    table = _TABLE.match(tool_input)
+    if table:
+        n = int(table.group(1))
+        return "\n".join(f"{n} x {i} = {n * i}" for i in range(1, 11))
+    answer = evaluate_expression(tool_input)
+    return answer if answer and not answer.startswith("❌") else None
+
+
+# ── accounting ────────────────────────────────────────────────────────────────
+class RouteStats:
+    """Latency and CPU accounting for one path."""
+
+    def __init__(self, window: int):
+        self.count = self.errors = self.fallbacks = 0
+        self.total_s = self.cpu_s = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, seconds: float, cpu_seconds: float) -> None:
+        self.count += 1
+        self.total_s += seconds
+        self.cpu_s += cpu_seconds
+        self.recent.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def pct(q: float) -> Optional[float]:
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))], 4) if recent else None
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "mean_s": round(self.total_s / self.count, 4) if self.count else None,
+            "p50_s": pct(0.5),
+            "p95_s": pct(0.95),
+            "cpu_s_mean": round(self.cpu_s / self.count, 4) if self.count else None,
+        }
+
+
+# ── router ────────────────────────────────────────────────────────────────────
+class Router:
+    """Chooses between the calculator, the small model and the full agent for each query."""
+
+    def __init__(self, agent, rewriter=None, small=None, config: Optional[RouterConfig] = None):
+        """
+        Args:
+            agent: ``ModelInterfacePhi4`` on the full model
+            rewriter: ``ModelInterfaceT5``; used when the caller sends no rewrite
+            small: ``ModelInterfacePhi4`` on the small model, or None to disable that path
+            config: thresholds (default: ``RouterConfig()``)
+        """
+        self.agent = agent
+        self.rewriter = rewriter
+        self.small = small
+        self.config = config or RouterConfig()
+        self._lock = threading.Lock()
+        self._stats = {name: RouteStats(self.config.stats_window) for name in ROUTES + ("rewrite",)}
+
+    def decide(self, raw: str, rewrite: Optional[str]) -> RouteDecision:
+        """Pick a path from the raw query and its T5 rewrite (pure function of the inputs)."""
+        if rewrite:
+            confidence, tool_input, reason = calculation_confidence(raw, rewrite)
+            if confidence >= self.config.tool_threshold:
+                return RouteDecision("tool", confidence, reason, tool_input)
+        score = simplicity(raw, self.config.small_max_words)
+        if self.small is not None and score >= self.config.small_threshold:
+            return RouteDecision("small", score, "short single-step query")
+        return RouteDecision("agent", 1.0 - score, "default")
+
+    def _record(self, route: str, start: float, cpu_start: float) -> None:
+        with self._lock:
+            self._stats[route].record(time.perf_counter() - start, time.process_time() - cpu_start)
+
+    async def _rewrite(self, raw: str) -> Optional[str]:
+        if self.rewriter is None:
+            return None
+        start, cpu_start = time.perf_counter(), time.process_time()
+        out = await run_in_executor(get_t5_executor(), self.rewriter.infer, raw)
+        self._record("rewrite", start, cpu_start)
+        return out.get("response")
+
+    async def aroute(self, text: str, raw: Optional[str] = None, rewrite: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Answer ``text`` on the cheapest suitable path.
+
+        Args:
+            text: prompt for the model paths (the UI sends "<raw> simplified to <rewrite>")
+            raw: the user's original query (default: ``text``)
+            rewrite: its T5 rewrite; computed here if omitted and a rewriter is set
+        """
+        raw = raw or text
+        if rewrite is None:
+            rewrite = await self._rewrite(raw)
+        decision = self.decide(raw, rewrite)
+        current_span().set(route=decision.route, confidence=round(decision.confidence, 3))
+
+        order = list(ROUTES[ROUTES.index(decision.route):])
+        if self.small is None and "small" in order:
+            order.remove("small")
+        for i, route in enumerate(order):
+            start, cpu_start = time.perf_counter(), time.process_time()
+            try:
+                with span(f"route.{route}"):
+                    if route == "tool":
+                        response = await run_in_executor(get_tool_executor(), run_tool, decision.answer)
+                        if response is None:
+                            raise ValueError("calculator could not evaluate the rewrite")
+                    else:
+                        model = self.small if route == "small" else self.agent
+                        response = (await model.ainfer(text))["response"]
+            except Exception:
+                with self._lock:
+                    self._stats[route].errors += 1
+                    if i + 1 < len(order):
+                        self._stats[route].fallbacks += 1
+                if i + 1 == len(order):
+                    raise
+                continue
+            self._record(route, start, cpu_start)
+            return {
+                "response": response,
+                "route": route,
+                "confidence": round(decision.confidence, 3),
+                "reason": decision.reason if route == decision.route else f"fallback from {decision.route}",
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            paths = {name: s.summary() for name, s in self._stats.items()}
+        served = sum(paths[name]["count"] for name in ROUTES)
+        return {
+            "config": self.config.model_dump(),
+            "small_model": self.small is not None,
+            "paths": paths,
+            "share": {name: round(paths[name]["count"] / served, 3) if served else None for name in ROUTES},
+        }
+
+
+__all__ = [
+    "Router",
+    "RouterConfig",
+    "RouteDecision",
+    "calculation_confidence",
+    "numbers_in",
+    "simplicity",
+    "run_tool",
+]
@@ -0,0 +1,253 @@
+"""Streaming upload handling for the file endpoints.
+
+``receive_upload`` reads the request body chunk by chunk as it arrives -
+the named part of a ``multipart/form-data`` body, or the raw body - into a
+``SpooledUpload``: memory up to ``SLAM_UPLOAD_SPOOL_BYTES`` (1 MB), a
+temporary file after that (in ``SLAM_UPLOAD_DIR``, e.g. ``/dev/shm`` for
+RAM-backed spill files).  Limits are enforced while streaming:
+
+* 413 as soon as ``Content-Length`` or the bytes received exceed the limit
+  (``SLAM_UPLOAD_MAX_MB``, 64 MB by default);
+* 415 once the first bytes show a type the endpoint does not accept
+  (checked against magic numbers, not the client's content type).
+
+Tools read the upload through ``view()``, a read-only ``memoryview`` of the
+memory buffer or of an ``mmap`` of the spill file, so no copy of the body
+is made in the worker.  Measure with ``python -m benchmarks.bench_uploads``.
+"""
+
+import codecs
+import io
+import mmap
+import os
+import tempfile
+from typing import BinaryIO, Dict, FrozenSet, List, Optional
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+MAX_BYTES = int(float(os.environ.get("SLAM_UPLOAD_MAX_MB", 64)) * (1 << 20))
+SPOOL_BYTES = int(os.environ.get("SLAM_UPLOAD_SPOOL_BYTES", 1 << 20))
+SPOOL_DIR = os.environ.get("SLAM_UPLOAD_DIR") or None
+SNIFF_BYTES = 512
+_MULTIPART_SLACK = 64 * 1024  # boundaries and part headers on top of the file itself
+
+IMAGE_KINDS = frozenset({"png", "jpeg", "gif", "tiff", "bmp", "webp"})
+DOCUMENT_KINDS = frozenset({"text", "pdf", "zip"})
+TEXT_KINDS = frozenset({"text"})
+
+_MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"%PDF-", "pdf"),
+    (b"PK\x03\x04", "zip"),
+]
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """File type from the first bytes of a body: an image / pdf / zip kind, "text" or None."""
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    if head[:2] == b"BM" and head[6:10] == b"\x00\x00\x00\x00":
+        return "bmp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if b"\x00" not in head:
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(head)  # a character may be cut at the end
+            return "text"
+        except UnicodeDecodeError:
+            pass
+    return None
+
+
+class SpooledUpload:
+    """An upload body in memory, or in a temporary file once it outgrows ``spool_bytes``."""
+
+    def __init__(self, filename: Optional[str] = None, content_type: Optional[str] = None,
+                 kinds: Optional[FrozenSet[str]] = None, max_bytes: int = MAX_BYTES,
+                 spool_bytes: int = SPOOL_BYTES):
+        self.filename = filename
+        self.content_type = content_type
+        self.kinds = kinds
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.kind: Optional[str] = None
+        self.size = 0
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file: Optional[BinaryIO] = None
+        self._head = b""
+        self._map: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+
+    @property
+    def in_memory(self) -> bool:
+        return self._file is None
+
+    def _check_kind(self) -> None:
+        self.kind = sniff(self._head)
+        if self.kinds is not None and self.kind not in self.kinds:
+            raise HTTPException(status_code=415, detail=f"unsupported content ({self.kind or 'unknown'}); "
+                                                        f"expected {', '.join(sorted(self.kinds))}")
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"upload exceeds {self.max_bytes} bytes")
+        if self.kind is None and len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) == SNIFF_BYTES:
+                self._check_kind()
+        if self._file is None and self.size > self.spool_bytes:
+            self._file = tempfile.TemporaryFile(dir=SPOOL_DIR)
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        (self._buffer if self._file is None else self._file).write(data)
+
+    def finish(self) -> "SpooledUpload":
+        """Check a body shorter than ``SNIFF_BYTES``; called once the body is complete."""
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="empty upload")
+        if self.kind is None:
+            self._check_kind()
+        if self._file is not None:
+            self._file.flush()
+        return self
+
+    def view(self) -> memoryview:
+        """Read-only zero-copy view of the body."""
+        if self._file is None:
+            view = self._buffer.getbuffer().toreadonly()
+        else:
+            if self._map is None:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._map)
+        self._views.append(view)
+        return view
+
+    def file(self) -> BinaryIO:
+        """The body as a file object, rewound."""
+        f = self._buffer if self._file is None else self._file
+        f.seek(0)
+        return f
+
+    def close(self) -> None:
+        for view in self._views:
+            try:
+                view.release()
+            except BufferError:
+                pass  # still exported (e.g. np.frombuffer); freed with its last user
+        self._views.clear()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+        self._buffer = None
+
+
+async def _receive_multipart(request: Request, boundary: bytes, field: str, **limits) -> SpooledUpload:
+    uploads: List[SpooledUpload] = []
+    headers: Dict[bytes, bytes] = {}
+    current = {"name": b"", "value": b"", "upload": None}
+
+    def on_part_begin():
+        headers.clear()
+        current["upload"] = None
+
+    def on_header_field(data, start, end):
+        current["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        current["value"] += data[start:end]
+
+    def on_header_end():
+        headers[current["name"].lower()] = current["value"]
+        current["name"] = current["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("latin-1") == field and not uploads:
+            filename = options.get(b"filename")
+            content_type = headers.get(b"content-type")
+            current["upload"] = SpooledUpload(filename.decode("utf-8", "replace") if filename else None,
+                                              content_type.decode("latin-1") if content_type else None, **limits)
+            uploads.append(current["upload"])
+
+    def on_part_data(data, start, end):
+        if current["upload"] is not None:
+            current["upload"].write(data[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        if not uploads:
+            raise HTTPException(status_code=400, detail=f"multipart body needs a '{field}' field")
+        return uploads[0].finish()
+    except Exception as e:
+        for upload in uploads:
+            upload.close()
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=400, detail=f"malformed multipart body: {e}")
+
+
+async def receive_upload(request: Request, field: str = "file", kinds: Optional[FrozenSet[str]] = None,
+                         max_bytes: int = MAX_BYTES) -> SpooledUpload:
+    """
+    Stream the ``field`` part of a multipart body (or the raw body) into a ``SpooledUpload``.
+
+    Args:
+        request: the incoming request; its body must not have been read yet
+        field: multipart field holding the file; other parts are skipped
+        kinds: accepted ``sniff`` kinds, e.g. ``IMAGE_KINDS`` (None accepts anything)
+        max_bytes: size limit of the file
+
+    Raises:
+        HTTPException: 413 too large, 415 unsupported type, 400 empty or malformed body
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + _MULTIPART_SLACK:
+        raise HTTPException(status_code=413, detail=f"upload exceeds {max_bytes} bytes")
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type == b"multipart/form-data":
+        if b"boundary" not in options:
+            raise HTTPException(status_code=400, detail="multipart body without boundary")
+        return await _receive_multipart(request, options[b"boundary"], field, kinds=kinds, max_bytes=max_bytes)
+
+    upload = SpooledUpload(content_type=content_type.decode("latin-1") or None, kinds=kinds, max_bytes=max_bytes)
+    try:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        return upload.finish()
+    except Exception:
+        upload.close()
+        raise
+
+
+__all__ = [
+    "SpooledUpload",
+    "receive_upload",
+    "sniff",
+    "IMAGE_KINDS",
+    "DOCUMENT_KINDS",
+    "TEXT_KINDS",
+    "MAX_BYTES",
+]
@@ -1,15 +1,44 @@
+import argparse
+import hashlib
+import json
+import os
 import random
+import resource
+import time
+from functools import partial
+import psutil
 import torch
+from torch.nn.utils.rnn import pad_sequence
 from torch.utils.data import Dataset, DataLoader
-from transformers import T5Tokenizer, T5ForConditionalGeneration, Trainer, TrainingArguments
+from transformers import T5Tokenizer, T5ForConditionalGeneration, Trainer, TrainingArguments, TrainerCallback
+from transformers.trainer_utils import get_last_checkpoint
 from peft import get_peft_model, LoraConfig, TaskType
 import pandas as pd
 from sklearn.model_selection import train_test_split
 import numpy as np
 
+# Data and model locations
+DATA_FILES = [
+    "/kaggle/input/mathdata/flan_t5_math_dataset_words_50k.csv",
+    "/kaggle/input/input-actuall5/final_dataset.csv",
+]
+TOKENIZED_CACHE_DIR = "./tokenized_cache"
+MODEL_NAME = "google/flan-t5-small"
+
+# Prompt prefixes the released adapter was trained with (keep byte-identical)
+PROMPT_PREFIX = "Simplify this prompt: "
+SOURCE_PREFIX = "Answer this math problem: "
+
+MAX_INPUT_LENGTH = 128
+MAX_TARGET_LENGTH = 32
+LENGTH_COLUMN = "length"
+
+
 # Enhanced dataset class with better tokenization
 class MathDataset(Dataset):
-    def __init__(self, data, tokenizer, max_input_length=128, max_target_length=32):
+    """Tokenizes on the fly on every access; kept as the uncached reference path."""
+
+    def __init__(self, data, tokenizer, max_input_length=MAX_INPUT_LENGTH, max_target_length=MAX_TARGET_LENGTH):
         self.data = data
         self.tokenizer = tokenizer
         self.max_input_length = max_input_length
@@ -22,7 +51,7 @@ class MathDataset(Dataset):
         source, target = self.data[idx]
 
         # Better preprocessing
-        source = f"Answer this math problem: {source}"
+        source = f"{SOURCE_PREFIX}{source}"
 
         # Tokenization with proper handling
         input_enc = self.tokenizer(
@@ -52,45 +81,182 @@ class MathDataset(Dataset):
             "labels": labels,
         }
 
-# Load and split data
-df1 = pd.read_csv("/kaggle/input/mathdata/flan_t5_math_dataset_words_50k.csv")
-df2 = pd.read_csv("/kaggle/input/input-actuall5/final_dataset.csv")
-df2 = df2.rename(columns={"Input": "input", "Actual": "target"})
-combined_df = pd.concat([df1, df2], ignore_index=True)
-
-data = list(zip("Simplify this prompt: "+ combined_df["input"], combined_df["target"]))
-
-
-
-
-# Train/validation split
-train_data, val_data = train_test_split(data, test_size=0.1, random_state=42)
-
-# Model and tokenizer
-model_name = "google/flan-t5-small"
-tokenizer = T5Tokenizer.from_pretrained(model_name)
-model = T5ForConditionalGeneration.from_pretrained(model_name)
-
-# Ensure model is in training mode and enable gradient computation
-model.train()
-model.config.use_cache = False  # Disable cache for training
 
-# Enhanced LoRA config
-peft_config = LoraConfig(
-    task_type=TaskType.SEQ_2_SEQ_LM,
-    inference_mode=False,
-    r=16,  # Increased rank for better capacity
-    lora_alpha=32,  # Increased alpha
-    lora_dropout=0.1,
-    target_modules=["q", "v"]  # More comprehensive targeting
-)
-
-model = get_peft_model(model, peft_config)
+# ── data loading ──────────────────────────────────────────────────────────────
+def load_pairs(data_files=DATA_FILES):
+    """Combined (source, target) frame from the generated CSVs."""
+    frames = []
+    for path in data_files:
+        df = pd.read_csv(path)
+        df = df.rename(columns={"Input": "input", "Actual": "target"})
+        frames.append(df[["input", "target"]])
+    combined_df = pd.concat(frames, ignore_index=True)
+    return pd.DataFrame({"source": PROMPT_PREFIX + combined_df["input"], "target": combined_df["target"]})
+
+
+# ── pre-tokenized cache ───────────────────────────────────────────────────────
+def _file_signature(path):
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, int(st.st_mtime)]
+
+
+def tokenized_cache_key(tokenizer, data_files, max_input_length, max_target_length, pad_to_max_length=False):
+    """Hash of everything the tokenized rows depend on: tokenizer, lengths, padding, prefixes and input files."""
+    spec = {
+        "tokenizer": [type(tokenizer).__name__, tokenizer.name_or_path, len(tokenizer)],
+        "max_input_length": max_input_length,
+        "max_target_length": max_target_length,
+        "pad_to_max_length": pad_to_max_length,
+        "prefixes": [PROMPT_PREFIX, SOURCE_PREFIX],
+        "data": [_file_signature(p) for p in data_files],
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _tokenize_batch(batch, tokenizer, max_input_length, max_target_length, pad_to_max_length):
+    padding = "max_length" if pad_to_max_length else False
+    input_enc = tokenizer(
+        [SOURCE_PREFIX + s for s in batch["source"]],
+        padding=padding,
+        truncation=True,
+        max_length=max_input_length,
+    )
+    target_enc = tokenizer(
+        text_target=batch["target"],
+        padding=padding,
+        truncation=True,
+        max_length=max_target_length,
+    )
+    pad = tokenizer.pad_token_id
+    labels = [[t if t != pad else -100 for t in seq] for seq in target_enc["input_ids"]]
+    return {
+        "input_ids": input_enc["input_ids"],
+        "attention_mask": input_enc["attention_mask"],
+        "labels": labels,
+        # real (unpadded) input length, used to group similar lengths into a batch
+        LENGTH_COLUMN: [sum(mask) for mask in input_enc["attention_mask"]],
+    }
+
+
+def build_tokenized_dataset(tokenizer, data_files=DATA_FILES, cache_dir=TOKENIZED_CACHE_DIR,
+                            max_input_length=MAX_INPUT_LENGTH, max_target_length=MAX_TARGET_LENGTH,
+                            pad_to_max_length=False, num_proc=None):
+    """Tokenize the CSVs once (in parallel) into an Arrow store and open it memory-mapped.
+
+    The store lives under ``cache_dir/<key>`` where the key covers the
+    tokenizer, lengths and input files, so a changed tokenizer or dataset
+    gets a fresh store while reruns skip tokenization entirely.  Rows are
+    stored unpadded unless ``pad_to_max_length`` (the previous fixed-size
+    layout, kept for comparison); ``dynamic_collator`` pads per batch.
+    """
+    from datasets import Dataset as ArrowDataset, load_from_disk
+
+    key = tokenized_cache_key(tokenizer, data_files, max_input_length, max_target_length, pad_to_max_length)
+    path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(path, "dataset_info.json")):
+        start = time.time()
+        raw = ArrowDataset.from_pandas(load_pairs(data_files), preserve_index=False)
+        tokenized = raw.map(
+            _tokenize_batch,
+            batched=True,
+            batch_size=1000,
+            num_proc=num_proc or os.cpu_count(),
+            remove_columns=raw.column_names,
+            fn_kwargs={
+                "tokenizer": tokenizer,
+                "max_input_length": max_input_length,
+                "max_target_length": max_target_length,
+                "pad_to_max_length": pad_to_max_length,
+            },
+            desc="Tokenizing",
+        )
+        tokenized.save_to_disk(path)
+        print(f"Tokenized {len(tokenized):,} rows into {path} in {time.time() - start:.1f}s")
+    else:
+        print(f"Using tokenized cache {path}")
+
+    # load_from_disk memory-maps the Arrow files; the torch format reads rows zero-copy
+    return load_from_disk(path).with_format("torch")
+
+
+def split_dataset(dataset, test_size=0.1, seed=42):
+    """Same train/validation split as sklearn's ``train_test_split`` over the rows."""
+    train_idx, val_idx = train_test_split(np.arange(len(dataset)), test_size=test_size, random_state=seed)
+    return dataset.select(train_idx), dataset.select(val_idx)
+
+
+# ── training callbacks ────────────────────────────────────────────────────────
+class ThroughputCallback(TrainerCallback):
+    """Logs samples/sec per epoch so epoch 1 (cold page cache) can be compared with later epochs."""
+
+    def __init__(self):
+        self.epochs = []
+        self._start = None
+        self._step = 0
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._start = time.perf_counter()
+        self._step = state.global_step
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        elapsed = time.perf_counter() - self._start
+        samples = (state.global_step - self._step) * args.train_batch_size * args.gradient_accumulation_steps
+        self.epochs.append(samples / elapsed if elapsed else 0.0)
+        print(f"Epoch {len(self.epochs)}: {self.epochs[-1]:.1f} samples/s ({elapsed:.1f}s)")
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if len(self.epochs) > 1:
+            print(f"Throughput epoch 1: {self.epochs[0]:.1f} samples/s, "
+                  f"epoch {len(self.epochs)}: {self.epochs[-1]:.1f} samples/s")
+
+
+class ResourceCallback(TrainerCallback):
+    """Logs optimizer steps/sec and peak RSS (main process and dataloader workers) at each logging step.
+
+    Worker RSS is sampled from the live child processes after every optimizer
+    step (``RUSAGE_CHILDREN`` only covers children that already exited, such
+    as the ``datasets.map`` tokenization pool); the peak of the largest worker
+    is reported, since summing would count pages shared with the parent twice.
+    """
+
+    def __init__(self):
+        self._time = None
+        self._step = 0
+        self._process = psutil.Process()
+        self._worker_peak = 0
+
+    def _sample_workers(self):
+        for child in self._process.children():
+            try:
+                self._worker_peak = max(self._worker_peak, child.memory_info().rss)
+            except psutil.Error:  # exited since children() listed it
+                continue
+
+    def peak_rss_mb(self):
+        # ru_maxrss is in KiB on Linux
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self._sample_workers()
+        return own / 1024, self._worker_peak / 2 ** 20
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._time = time.perf_counter()
+        self._step = state.global_step
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self._sample_workers()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        now = time.perf_counter()
+        if logs is None or state.global_step == self._step:
+            return
+        own, workers = self.peak_rss_mb()
+        logs["steps_per_second_window"] = round((state.global_step - self._step) / (now - self._time), 3)
+        logs["peak_rss_mb"] = round(own, 1)
+        logs["peak_worker_rss_mb"] = round(workers, 1)
+        print(f"step {state.global_step}: {logs['steps_per_second_window']} steps/s, "
+              f"peak RSS {own:.0f} MB (largest worker {workers:.0f} MB)")
+        self._time, self._step = now, state.global_step
 
-# Enable gradient computation for LoRA parameters
-for name, param in model.named_parameters():
-    if 'lora' in name:
-        param.requires_grad = True
 
 # Print trainable parameters
 def print_trainable_parameters(model):
@@ -103,36 +269,8 @@ def print_trainable_parameters(model):
     print(f"Trainable params: {trainable_params:,} || All params: {all_param:,} || "
           f"Trainable%: {100 * trainable_params / all_param:.2f}%")
 
-print_trainable_parameters(model)
-
-# Datasets
-train_dataset = MathDataset(train_data, tokenizer)
-val_dataset = MathDataset(val_data, tokenizer)
-
-# Enhanced training arguments
-training_args = TrainingArguments(
-    output_dir="./flan-t5-math-lora-enhanced",
-    per_device_train_batch_size=8,
-    per_device_eval_batch_size=8,
-    num_train_epochs=5,
-    learning_rate=5e-5,
-    warmup_steps=500,
-    logging_dir="./logs",
-    logging_steps=100,
-    eval_steps=300,
-    save_steps=900,
-    eval_strategy="steps",  # Changed from evaluation_strategy
-    save_strategy="steps",
-    load_best_model_at_end=True,
-    metric_for_best_model="eval_loss",
-    greater_is_better=False,
-    report_to="none",
-    gradient_checkpointing=False,  # Disabled to avoid conflicts with LoRA
-    dataloader_pin_memory=True,
-    remove_unused_columns=False,
-)
-
-# Custom data collator for better batching
+
+# Custom data collator for better batching (rows already padded to max length)
 def data_collator(features):
     batch = {}
     batch["input_ids"] = torch.stack([f["input_ids"] for f in features])
@@ -140,21 +278,18 @@ def data_collator(features):
     batch["labels"] = torch.stack([f["labels"] for f in features])
     return batch
 
-# Trainer with validation
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_dataset,
-    eval_dataset=val_dataset,
-    data_collator=data_collator,
-)
 
-# Training with progress tracking
-print("Starting training...")
-trainer.train()
+# Pads each batch only to its longest input / target
+def dynamic_collator(features, pad_token_id=0):
+    batch = {}
+    batch["input_ids"] = pad_sequence([f["input_ids"] for f in features], batch_first=True, padding_value=pad_token_id)
+    batch["attention_mask"] = pad_sequence([f["attention_mask"] for f in features], batch_first=True, padding_value=0)
+    batch["labels"] = pad_sequence([f["labels"] for f in features], batch_first=True, padding_value=-100)
+    return batch
+
 
-# Save the LoRA adapter
-model.save_pretrained("./flan-t5-math-lora-final")
+def make_collator(tokenizer, pad_to_max_length=False):
+    return data_collator if pad_to_max_length else partial(dynamic_collator, pad_token_id=tokenizer.pad_token_id)
 
 
 # Gradient analysis function
@@ -183,12 +318,183 @@ def analyze_gradients(model, sample_batch):
 
     return lora_gradients
 
-# Example gradient analysis
-print("\n=== Gradient Analysis ===")
-sample_batch = next(iter(DataLoader(train_dataset, batch_size=2)))
-sample_batch = {k: v.to(model.device) if isinstance(v, torch.Tensor) else v
-                for k, v in sample_batch.items()}
 
-gradients = analyze_gradients(model, sample_batch)
-for name, stats in gradients.items():
-    print(f"{name}: mean={stats['mean']:.6f}, std={stats['std']:.6f}")
\ No newline at end of file
+def build_lora_model(model_name=MODEL_NAME):
+    model = T5ForConditionalGeneration.from_pretrained(model_name)
+
+    # Ensure model is in training mode and enable gradient computation
+    model.train()
+    model.config.use_cache = False  # Disable cache for training
+
+    # Enhanced LoRA config
+    peft_config = LoraConfig(
+        task_type=TaskType.SEQ_2_SEQ_LM,
+        inference_mode=False,
+        r=16,  # Increased rank for better capacity
+        lora_alpha=32,  # Increased alpha
+        lora_dropout=0.1,
+        target_modules=["q", "v"]  # More comprehensive targeting
+    )
+
+    model = get_peft_model(model, peft_config)
+
+    # Enable gradient computation for LoRA parameters
+    for name, param in model.named_parameters():
+        if 'lora' in name:
+            param.requires_grad = True
+    return model
+
+
+# ── CPU profile ───────────────────────────────────────────────────────────────
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_supports_bf16():
+    """True when the CPU has native bf16 matmuls (AVX512-BF16 or AMX); elsewhere bf16 autocast is slower than fp32."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def configure_cpu(args):
+    """Apply the CPU profile's torch threading; returns (bf16, dataloader workers)."""
+    cpus = available_cpus()
+    # rows are pre-tokenized, so workers only collate; a few are enough on big boxes,
+    # and one keeps collation off the training thread on small ones
+    if args.workers is not None:
+        workers = args.workers
+    else:
+        workers = max(1, min(4, cpus // 8)) if cpus > 1 else 0
+    threads = args.threads or cpus
+    # inter-op threads must be set before torch starts any parallel work
+    torch.set_num_interop_threads(args.interop_threads)
+    torch.set_num_threads(threads)
+    bf16 = cpu_supports_bf16() if args.bf16 == "auto" else args.bf16 == "on"
+    print(f"CPU profile: {threads} intra-op / {args.interop_threads} inter-op threads, "
+          f"{workers} dataloader workers, bf16={'on' if bf16 else 'off'}")
+    return bf16, workers
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the flan-t5 LoRA prompt rewriter.")
+    parser.add_argument("--data", nargs="+", default=DATA_FILES, help="training CSVs (input/target or Input/Actual)")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--cache-dir", default=TOKENIZED_CACHE_DIR, help="tokenized dataset store")
+    parser.add_argument("--output-dir", default="./flan-t5-math-lora-enhanced", help="checkpoints")
+    parser.add_argument("--adapter-dir", default="./flan-t5-math-lora-final", help="final LoRA adapter")
+    parser.add_argument("--profile", choices=["auto", "cpu", "gpu"], default="auto",
+                        help="auto picks gpu when CUDA is available")
+    parser.add_argument("--epochs", type=float, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--grad-accum", type=int, default=1, help="gradient accumulation steps")
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--warmup-steps", type=int, default=500)
+    parser.add_argument("--logging-steps", type=int, default=100)
+    parser.add_argument("--eval-steps", type=int, default=300)
+    parser.add_argument("--save-steps", type=int, default=900)
+    parser.add_argument("--save-total-limit", type=int, default=3)
+    parser.add_argument("--resume", nargs="?", const="auto", default=None,
+                        help="resume from a checkpoint path, or the latest one in --output-dir")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (cpu profile)")
+    parser.add_argument("--interop-threads", type=int, default=1, help="torch inter-op threads (cpu profile)")
+    parser.add_argument("--workers", type=int, default=None, help="dataloader workers (cpu profile)")
+    parser.add_argument("--bf16", choices=["auto", "on", "off"], default="auto",
+                        help="bf16 autocast on CPU; auto enables it on AVX512-BF16/AMX hardware")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-gradient-analysis", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    use_cpu = args.profile == "cpu" or (args.profile == "auto" and not torch.cuda.is_available())
+    bf16, workers = configure_cpu(args) if use_cpu else (False, 0)
+
+    # Model and tokenizer
+    tokenizer = T5Tokenizer.from_pretrained(args.model)
+    model = build_lora_model(args.model)
+    print_trainable_parameters(model)
+
+    # Datasets: tokenized once, then read from the memory-mapped store every epoch
+    dataset = build_tokenized_dataset(tokenizer, args.data, cache_dir=args.cache_dir)
+    train_dataset, val_dataset = split_dataset(dataset, seed=args.seed)
+
+    # Enhanced training arguments
+    training_args = TrainingArguments(
+        output_dir=args.output_dir,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        gradient_accumulation_steps=args.grad_accum,
+        num_train_epochs=args.epochs,
+        learning_rate=args.lr,
+        warmup_steps=args.warmup_steps,
+        logging_dir=os.path.join(args.output_dir, "logs"),
+        logging_steps=args.logging_steps,
+        eval_steps=args.eval_steps,
+        save_steps=args.save_steps,
+        save_total_limit=args.save_total_limit,
+        eval_strategy="steps",  # Changed from evaluation_strategy
+        save_strategy="steps",
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        report_to="none",
+        seed=args.seed,
+        gradient_checkpointing=False,  # Disabled to avoid conflicts with LoRA
+        use_cpu=use_cpu,
+        bf16=bf16,
+        dataloader_num_workers=workers,
+        dataloader_persistent_workers=workers > 0,
+        dataloader_pin_memory=not use_cpu,  # pinning only helps host->GPU copies
+        remove_unused_columns=False,
+        label_names=["labels"],
+        group_by_length=True,  # batches of similar length -> little padding
+        length_column_name=LENGTH_COLUMN,
+    )
+
+    # Trainer with validation
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=val_dataset,
+        data_collator=make_collator(tokenizer),
+        callbacks=[ThroughputCallback(), ResourceCallback()],
+    )
+
+    # Resume from an explicit checkpoint or the latest one in output_dir
+    resume = args.resume
+    if resume == "auto":
+        resume = get_last_checkpoint(args.output_dir) if os.path.isdir(args.output_dir) else None
+        print(f"Resuming from {resume}" if resume else "No checkpoint found, starting fresh")
+
+    # Training with progress tracking
+    print("Starting training...")
+    trainer.train(resume_from_checkpoint=resume)
+
+    # Save the LoRA adapter
+    model.save_pretrained(args.adapter_dir)
+
+    if args.skip_gradient_analysis:
+        return
+
+    # Example gradient analysis
+    print("\n=== Gradient Analysis ===")
+    sample_batch = next(iter(DataLoader(train_dataset, batch_size=2, collate_fn=make_collator(tokenizer))))
+    sample_batch = {k: v.to(model.device) if isinstance(v, torch.Tensor) else v
+                    for k, v in sample_batch.items()}
+
+    gradients = analyze_gradients(model, sample_batch)
+    for name, stats in gradients.items():
+        print(f"{name}: mean={stats['mean']:.6f}, std={stats['std']:.6f}")
+
+
+if __name__ == "__main__":
+    main()
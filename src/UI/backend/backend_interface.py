@@ -1,11 +1,57 @@
 import requests
+import contextlib
 import logging
+import time
+import uuid
 
 
+class _Trace:
+    """Client side of one chat turn's trace: a root span plus one span per backend call.
+
+    Each call sends a W3C ``traceparent`` header so the backend's spans nest
+    under it; the spans recorded here (the Streamlit-side round trips) are
+    posted to ``/traces`` when the turn ends.
+    """
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.root = self._open(name, None)
+
+    def _open(self, name, parent_id):
+        return {"traceId": self.trace_id, "spanId": uuid.uuid4().hex[:16], "parentSpanId": parent_id,
+                "name": name, "startTimeUnixNano": time.time_ns(), "endTimeUnixNano": None,
+                "attributes": {"side": "ui"}, "status": "ok"}
+
+    def _close(self, span):
+        span["endTimeUnixNano"] = time.time_ns()
+        self.spans.append(span)
+
+    @contextlib.contextmanager
+    def call(self, name: str):
+        """Span around one request; yields the headers to send with it."""
+        span = self._open(f"ui {name}", self.root["spanId"])
+        try:
+            yield {"traceparent": f"00-{self.trace_id}-{span['spanId']}-01"}
+        except Exception:
+            span["status"] = "error"
+            raise
+        finally:
+            self._close(span)
+
+    def finish(self, backend_url: str):
+        self._close(self.root)
+        try:
+            requests.post(f"{backend_url}/traces", json={"spans": self.spans}, timeout=2)
+        except requests.RequestException:
+            pass  # tracing never fails a chat turn
+
 
 class BackendInterface:
     def __init__(self, backend_url: str):
         self.backend_url = backend_url
+        # one instance per Streamlit session, so this keys the server-side scratchpad
+        self.session_id = uuid.uuid4().hex
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(level=logging.INFO)
 
@@ -19,19 +65,40 @@ class BackendInterface:
         return response.json()
 
 
+    def upload_document(self, file_name: str, file):
+        # file: bytes or a file object (read by requests, no extra copy);
+        # indexed server-side, the agent retrieves the relevant chunks with search_documents
+        files = {'file': (file_name, file)}
+        response = requests.post(f"{self.backend_url}/documents", files=files)
+        return response.json()
+
     def calculate(self,query: str):
         response = requests.post(f"{self.backend_url}/calculator", params={"query": query})
         return response.json()
 
-    def json_format(self,query: str = None):
-        response = requests.post(f"{self.backend_url}/json_formatter", params={"query": query})
+    def json_format(self,query: str = None, mode: str = "pretty"):
+        # sent as the body: the query string limits the payload to a few KB
+        response = requests.post(f"{self.backend_url}/json_formatter", params={"mode": mode},
+                                 data=(query or "").encode("utf-8"), headers={"Content-Type": "application/json"})
+        if response.ok and mode != "validate":
+            return {"response": response.text}
         return response.json()
 
     def translator(self, text: str):
-        response = requests.post(f"{self.backend_url}/translator", params={"text": text})
+        response = requests.post(f"{self.backend_url}/translator", json={"text": text})
         return response.json()
 
-    def infer(self, input_text: str):
+    def toggle_scratchpad(self, status: bool):
+        response = requests.post(f"{self.backend_url}/scratchpad/toggle",
+                                 json={"session_id": self.session_id, "enabled": status})
+        return response.json()
+
+    def add_scratchpad_note(self, text: str):
+        response = requests.post(f"{self.backend_url}/scratchpad/note",
+                                 json={"session_id": self.session_id, "text": text})
+        return response.json()
+
+    def infer(self, input_text: str, headers: dict = None):
          # MOCKED: Randomly return a classify label
         # random_class = random.choice([ "translate", "calculator", "json_formatter"])
         # return {
@@ -40,14 +107,15 @@ class BackendInterface:
         # }
         try:
             payload = {"input_text": input_text}
-            response = requests.post(f"{self.backend_url}/infer_t5", json=payload)
+            response = requests.post(f"{self.backend_url}/infer_t5", json=payload, headers=headers)
             return response.json()
         except Exception as e:
             return {"error": str(e)}    
-    def infer_slam(self, input_text: str):
+    def infer_slam(self, input_text: str, raw_text: str = None, rewritten_text: str = None, headers: dict = None):
         try:
-            payload = {"input_text": input_text}
-            response = requests.post(f"{self.backend_url}/slam", json=payload)
+            # raw / rewritten text let the backend router skip the LLM for simple queries
+            payload = {"input_text": input_text, "raw_text": raw_text, "rewritten_text": rewritten_text}
+            response = requests.post(f"{self.backend_url}/slam", json=payload, headers=headers)
             return response.json()
         except Exception as e:
             return {"error": str(e)}
@@ -68,8 +136,18 @@ class BackendInterface:
         if user_input.lower() == "ping":
             response=self.ping()
             return response.get("response","")
+        # one trace per turn; the backend writes its spans under the same id
+        trace = _Trace("ui chat_turn")
+        self.logger.info(f"Trace id: {trace.trace_id}")
+        try:
+            return self._agent_turn(user_input, trace)
+        finally:
+            trace.finish(self.backend_url)
+
+    def _agent_turn(self, user_input: str, trace: _Trace):
         # call the infer endpoint to classify the user input
-        classify_response = self.infer(user_input)
+        with trace.call("POST /infer_t5") as headers:
+            classify_response = self.infer(user_input, headers=headers)
         self.logger.info(f"Classify Response: {classify_response}")
         response=classify_response.get("response", "")
         self.logger.info(f"Response from classify: {response}")
@@ -81,7 +159,8 @@ class BackendInterface:
 
         # phi4--> response 
         query= "{} simplified to {}".format(user_input,response)
-        phi_response=self.infer_slam(query)
+        with trace.call("POST /slam") as headers:
+            phi_response=self.infer_slam(query, raw_text=user_input, rewritten_text=response, headers=headers)
         self.logger.info(f"Response from SLAM: {phi_response}")
 
         # response
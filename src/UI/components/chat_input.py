@@ -12,7 +12,6 @@ def render_chat_input(agent_api, uploaded_file, file_content, file_name):
 
     if scratchpad_just_disabled:
         with st.chat_message("assistant"):
-            st.markdown("🧠 Summarizing your notes...")
             result = agent_api.toggle_scratchpad(False)
             st.markdown(result["response"])
             st.session_state.chat_history.append({"role": "assistant", "content": result["response"]})
@@ -32,7 +31,7 @@ def render_chat_input(agent_api, uploaded_file, file_content, file_name):
             st.markdown(user_input)
 
         if current_state:
-            agent_api.get_agent_response(user_input, file_content, file_name)
+            agent_api.add_scratchpad_note(user_input)
         else:
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
@@ -1,6 +1,6 @@
 import streamlit as st
 
-def render_sidebar():
+def render_sidebar(agent_api):
     with st.sidebar:
         st.markdown("### ⚙️ SLAM Controls")
         uploaded_file = st.file_uploader("Attach a file (optional):", type=["txt", "pdf", "docx"])
@@ -25,10 +25,22 @@ def render_sidebar():
 
         if uploaded_file is not None:
             file_name = uploaded_file.name
-            try:
-                file_content = uploaded_file.read().decode("utf-8")
-            except Exception as e:
-                st.error(f"Error reading file: {e}")
+            # index each upload once; the agent searches it instead of receiving the whole text
+            indexed = st.session_state.setdefault("indexed_files", {})
+            key = (file_name, uploaded_file.size)
+            if key not in indexed:
+                try:
+                    with st.spinner("Indexing document..."):
+                        uploaded_file.seek(0)
+                        result = agent_api.upload_document(file_name, uploaded_file)
+                    if "response" in result:
+                        indexed[key] = result["response"]["chunks"]
+                    else:
+                        st.error(result.get("detail", "Error indexing file"))
+                except Exception as e:
+                    st.error(f"Error indexing file: {e}")
+            if indexed.get(key) is not None:
+                st.caption(f"📚 {file_name}: {indexed[key]} chunks indexed")
 
         if st.button("🔄 New Chat"):
             for key in st.session_state.keys():
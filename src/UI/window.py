@@ -31,7 +31,7 @@ class SLAMAppWindow:
         )
 
         # Sidebar
-        uploaded_file, file_content, file_name = render_sidebar()
+        uploaded_file, file_content, file_name = render_sidebar(self.agent_api)
 
         # Title
         render_title()